@@ -0,0 +1,197 @@
+import hashlib
+import json
+import sys
+import time
+from settings import *
+
+# Converts assets/*.png once into a texture pack: a raw binary with every texture already
+# decoded, flipped, split into layers and mipmapped, so the game maps it and uploads it as is.
+# Texture arrays keep only level 0: moderngl 5.8's TextureArray.write has no level argument, so
+# their mips are built on the GPU.
+#   python -m asset_pipeline            # rebuild the pack if any source changed
+#   python -m asset_pipeline --force    # rebuild it anyway
+#   python -m asset_pipeline --compare  # startup cost of the pack against decoding the pngs
+#
+# Pack layout: MAGIC, uint32 header size, JSON header, zero padding to DATA_ALIGNMENT, raw data.
+# The header stores the mtime, size and sha1 of every source png, and per texture the offset
+# and size of each mip level (RGBA8, layers stacked for texture arrays) relative to the data.
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+PACK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'assets', 'textures.pack')
+PACK_MAGIC = b'VXTP'
+PACK_VERSION = 1
+DATA_ALIGNMENT = 64
+
+# file name -> is texture array (3 faces side by side per layer, layers stacked vertically)
+TEXTURE_ASSETS = {
+    'frame.png': False,
+    'water.png': False,
+    'tex_array_0.png': True,
+}
+
+
+def decode_png(path):
+    # the same pixels the old loader uploaded: flipped horizontally, rows top to bottom
+    import pygame as pg
+    surface = pg.image.load(path)
+    width, height = surface.get_size()
+    pixels = np.frombuffer(pg.image.tostring(surface, 'RGBA'), dtype='uint8').reshape(height, width, 4)
+    return pixels[:, ::-1]
+
+
+def get_mip_chain(layers):
+    # (num_layers, height, width, 4) -> list of levels down to 1x1, 2x2 box filter,
+    # odd sizes drop their last row or column like the GL size rule floor(size / 2)
+    levels = [np.ascontiguousarray(layers)]
+    while max(levels[-1].shape[1:3]) > 1:
+        level = levels[-1].astype('uint16')
+        num_layers, height, width, _ = level.shape
+        if height > 1:
+            level = level[:, :height // 2 * 2]
+            level = (level[:, 0::2] + level[:, 1::2]) // 2
+        if width > 1:
+            level = level[:, :, :width // 2 * 2]
+            level = (level[:, :, 0::2] + level[:, :, 1::2]) // 2
+        levels.append(np.ascontiguousarray(level.astype('uint8')))
+    return levels
+
+
+def get_source_info(path, with_hash=True):
+    stat = os.stat(path)
+    info = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    if with_hash:
+        with open(path, 'rb') as file:
+            info['sha1'] = hashlib.sha1(file.read()).hexdigest()
+    return info
+
+
+def build_pack(path=PACK_PATH, assets_dir=ASSETS_DIR):
+    header = {'version': PACK_VERSION, 'sources': {}, 'textures': {}}
+    chunks, offset = [], 0
+
+    for name, is_tex_array in TEXTURE_ASSETS.items():
+        source = os.path.join(assets_dir, name)
+        header['sources'][name] = get_source_info(source)
+        pixels = decode_png(source)
+
+        height, width = pixels.shape[:2]
+        num_layers = 3 * height // width if is_tex_array else 1
+        layers = pixels.reshape(num_layers, height // num_layers, width, 4)
+
+        levels = []
+        for level in (get_mip_chain(layers) if not is_tex_array else [np.ascontiguousarray(layers)]):
+            levels.append({'offset': offset, 'width': level.shape[2], 'height': level.shape[1],
+                           'nbytes': level.nbytes})
+            chunks.append(level)
+            offset += level.nbytes
+        header['textures'][name] = {'is_tex_array': is_tex_array, 'layers': num_layers, 'levels': levels}
+
+    header_bytes = json.dumps(header).encode()
+    data_offset = len(PACK_MAGIC) + 4 + len(header_bytes)
+    padding = -data_offset % DATA_ALIGNMENT
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(PACK_MAGIC)
+        file.write(np.uint32(len(header_bytes)).tobytes())
+        file.write(header_bytes)
+        file.write(bytes(padding))
+        for chunk in chunks:
+            file.write(chunk.data)
+    # readers never see a half written pack
+    os.replace(temp_path, path)
+
+
+def read_header(path):
+    # -> header, offset of the data; None if the file is missing or not a pack
+    try:
+        with open(path, 'rb') as file:
+            if file.read(len(PACK_MAGIC)) != PACK_MAGIC:
+                return None
+            header_size = int(np.frombuffer(file.read(4), dtype='uint32')[0])
+            header = json.loads(file.read(header_size))
+    except (OSError, ValueError, IndexError):
+        return None
+    data_offset = len(PACK_MAGIC) + 4 + header_size
+    return header, data_offset + (-data_offset % DATA_ALIGNMENT)
+
+
+def is_pack_valid(header, assets_dir=ASSETS_DIR):
+    if header.get('version') != PACK_VERSION or set(header['sources']) != set(TEXTURE_ASSETS):
+        return False
+    for name, stored in header['sources'].items():
+        source = os.path.join(assets_dir, name)
+        if not os.path.exists(source):
+            return False
+        info = get_source_info(source, with_hash=False)
+        if info['mtime_ns'] == stored['mtime_ns'] and info['size'] == stored['size']:
+            continue
+        # touched but maybe unchanged (checkouts, copies): fall back to the content hash
+        if get_source_info(source)['sha1'] != stored['sha1']:
+            return False
+    return True
+
+
+class TexturePack:
+    def __init__(self, path=PACK_PATH, assets_dir=ASSETS_DIR):
+        result = read_header(path)
+        if result is None or not is_pack_valid(result[0], assets_dir):
+            build_pack(path, assets_dir)
+            result = read_header(path)
+
+        self.header, data_offset = result
+        self.textures = self.header['textures']
+        # mapped, not read: pages are only touched when the driver copies them
+        self.data = np.memmap(path, dtype='uint8', mode='r', offset=data_offset)
+
+    def get_levels(self, name):
+        # -> [(width, height, pixels)], pixels is a view into the mapped file
+        return [
+            (level['width'], level['height'], self.data[level['offset']:level['offset'] + level['nbytes']])
+            for level in self.textures[name]['levels']
+        ]
+
+
+def compare(repeat=10):
+    # decoding is what the old loader did at every launch; the pack is mapped and read
+    # once through, as the driver does when uploading it
+    def decode_all():
+        for name in TEXTURE_ASSETS:
+            decode_png(os.path.join(ASSETS_DIR, name)).copy()
+
+    def load_pack():
+        TexturePack().data.max()
+
+    for name, func in (('decode png', decode_all), ('load pack', load_pack)):
+        func()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        print(f'{name:<12} median {np.median(times) * 1e3:8.3f} ms  min {min(times) * 1e3:8.3f} ms')
+
+
+def main(argv=()):
+    start = time.perf_counter()
+    header = read_header(PACK_PATH)
+    if '--force' in argv or header is None or not is_pack_valid(header[0]):
+        build_pack()
+        print(f'built {PACK_PATH} in {time.perf_counter() - start:.3f} s')
+    else:
+        print(f'{PACK_PATH} is up to date')
+
+    pack = TexturePack()
+    for name, texture in pack.textures.items():
+        nbytes = sum(level['nbytes'] for level in texture['levels'])
+        base = texture['levels'][0]
+        print(f'{name:<20} {base["width"]}x{base["height"]}x{texture["layers"]}'
+              f'  {len(texture["levels"])} levels  {nbytes / 1024:.0f} KiB')
+
+    if '--compare' in argv:
+        compare()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
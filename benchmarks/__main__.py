@@ -0,0 +1,17 @@
+import sys
+from benchmarks.harness import main
+import benchmarks.bench_world
+import benchmarks.bench_clouds
+import benchmarks.bench_light
+import benchmarks.bench_edit
+import benchmarks.bench_journal
+import benchmarks.bench_hash
+import benchmarks.bench_water
+import benchmarks.bench_entities
+import benchmarks.bench_navigation
+import benchmarks.bench_voxel_tree
+import benchmarks.bench_scheduler
+import benchmarks.bench_residency
+
+# python -m benchmarks [-k 'mesh.*'] [-o results.json] [-b baseline.json]
+sys.exit(main())
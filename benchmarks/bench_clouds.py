@@ -0,0 +1,61 @@
+from settings import *
+from headless import HeadlessPlayer
+from meshes.cloud_mesh import CloudMesh
+from world_objects.clouds import set_tile_center
+from benchmarks.harness import benchmark
+
+NUM_TILES = CLOUD_TILES_W * CLOUD_TILES_W
+
+
+def build_tiles():
+    # tile origin -> number of vertices, built the same way Clouds does but without GL
+    cloud_data = np.zeros(CLOUD_TILE_AREA, dtype='uint8')
+    visited = np.zeros(CLOUD_TILE_AREA, dtype='uint8')
+    mesh = np.empty(CLOUD_TILE_AREA * 6 * 2, dtype='uint8')
+
+    tiles = {}
+    for tile_x in range(CLOUD_TILES_W):
+        for tile_z in range(CLOUD_TILES_W):
+            origin = glm.ivec2(tile_x, tile_z) * CLOUD_TILE_SIZE
+            CloudMesh.gen_clouds(cloud_data, origin.x, origin.y)
+            num_vertices = CloudMesh.build_mesh(cloud_data, visited, mesh) // 2
+            if num_vertices:
+                tiles[tuple(origin)] = num_vertices
+    return tiles
+
+
+@benchmark('clouds.build', repeat=5, items=NUM_TILES, unit='tile')
+def build_clouds():
+    return build_tiles
+
+
+@benchmark('clouds.cull', repeat=20, items=64, unit='frame')
+def cull_clouds():
+    # 64 camera headings at the spawn point; the untiled mesh drew every vertex in one call
+    tiles = build_tiles()
+    player = HeadlessPlayer()
+    centers = {origin: glm.vec3(0) for origin in tiles}
+    visible = {'tiles': 0, 'vertices': 0}
+
+    def run():
+        visible['tiles'] = visible['vertices'] = 0
+        for i in range(64):
+            player.yaw = 2 * math.pi * i / 64
+            player.pitch = glm.radians(20)
+            player.update()
+            offset = 300 * math.sin(0.01 * i)
+
+            for origin, num_vertices in tiles.items():
+                center = centers[origin]
+                set_tile_center(center, glm.ivec2(origin), offset)
+                if player.frustum.is_sphere_on_frustum(center, CLOUD_TILE_RADIUS):
+                    visible['tiles'] += 1
+                    visible['vertices'] += num_vertices
+
+    run.metrics = lambda: {
+        'tiles': len(tiles),
+        'total_vertices': sum(tiles.values()),
+        'draw_calls_per_frame': visible['tiles'] / 64,
+        'vertices_per_frame': visible['vertices'] / 64,
+    }
+    return run
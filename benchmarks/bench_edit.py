@@ -0,0 +1,40 @@
+import time
+from settings import *
+from terrain_gen import get_height
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import get_world
+
+SPHERE_RADIUS = 32
+
+
+@benchmark('edit.carve_sphere', repeat=5, items=2, unit='region')
+def carve_sphere():
+    # carves a 64^3 sphere at the surface of the spawn and pastes the region back,
+    # each including the summary, light and remesh bookkeeping of World.apply_edits
+    world = get_world()
+    center = (CENTER_XZ, int(get_height(CENTER_XZ, CENTER_XZ)), CENTER_XZ)
+    min_pos = [value - SPHERE_RADIUS for value in center]
+    region = np.empty([2 * SPHERE_RADIUS + 1] * 3, dtype='uint8')
+    for x in range(region.shape[0]):
+        for y in range(region.shape[1]):
+            for z in range(region.shape[2]):
+                region[x, y, z] = world.get_voxel_id(glm.vec3(min_pos[0] + x, min_pos[1] + y, min_pos[2] + z))
+    stats = {'carved': 0, 'carve_time': 0.0, 'chunks': 0}
+
+    def run():
+        start = time.perf_counter()
+        stats['carved'] = world.carve_sphere(center, SPHERE_RADIUS)
+        stats['carve_time'] = time.perf_counter() - start
+        stats['chunks'] = len(world.dirty_chunks)
+        world.rebuild_dirty_chunks()
+
+        world.paste_voxels(min_pos, region, skip_air=False)
+        world.rebuild_dirty_chunks()
+
+    run.metrics = lambda: {
+        'carved_voxels': stats['carved'],
+        'remeshed_chunks': stats['chunks'],
+        'carve_ms': stats['carve_time'] * 1e3,
+        'carve_edits_per_sec': stats['carved'] / stats['carve_time'],
+    }
+    return run
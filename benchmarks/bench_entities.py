@@ -0,0 +1,53 @@
+from settings import *
+from terrain_gen import get_height
+from entities import EntitySystem, ENTITY_MOB, ENTITY_ITEM
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import get_world
+
+SPAWN_HALF_SIZE = 256
+SETTLE_STEPS = 40
+# mobs walk at player speed in a random direction that turns a little every step
+WALK_SPEED = PLAYER_SPEED
+TURN_RATE = 0.3
+
+
+def get_crowd(world, num, seed=SEED):
+    # half mobs, half items, dropped over a 512x512 area around the spawn and left to land;
+    # an entity system of its own keeps world.entities untouched
+    rng = np.random.default_rng(seed)
+    entities = EntitySystem(world, capacity=num)
+    xz = rng.uniform(CENTER_XZ - SPAWN_HALF_SIZE, CENTER_XZ + SPAWN_HALF_SIZE, (num, 2))
+    heights = np.array([get_height(x, z) for x, z in xz], dtype='float32')
+    positions = np.column_stack([xz[:, 0], heights + rng.uniform(2, 16, num), xz[:, 1]])
+    entities.spawn(ENTITY_MOB, positions[:num // 2])
+    entities.spawn(ENTITY_ITEM, positions[num // 2:], rng.uniform(-0.01, 0.01, (num - num // 2, 3)))
+    for _ in range(SETTLE_STEPS):
+        entities.step()
+    return entities, rng
+
+
+def step_crowd(num):
+    # one physics step of the crowd: grid sort, contacts and the voxel sweep of every entity
+    entities, rng = get_crowd(get_world(), num)
+    angles = rng.uniform(0, 2 * np.pi, num)
+    is_mob = np.zeros(num, dtype='bool')
+
+    def run():
+        # the walking mobs keep moving, pushing and bumping into terrain at every step
+        is_mob[:entities.num] = entities.kinds[:entities.num] == ENTITY_MOB
+        angles[:] += rng.uniform(-TURN_RATE, TURN_RATE, num)
+        mobs = np.flatnonzero(is_mob[:entities.num])
+        entities.velocities[mobs, 0] = np.cos(angles[mobs]) * WALK_SPEED
+        entities.velocities[mobs, 2] = np.sin(angles[mobs]) * WALK_SPEED
+        entities.step()
+
+    run.metrics = lambda: {
+        'contacts': len(entities.contacts),
+        'on_ground': float(entities.on_ground[:entities.num].mean()),
+    }
+    return run
+
+
+for num in (1000, 10000, 100000):
+    benchmark(f'entities.step_{num // 1000}k', repeat=10, items=num, unit='entity')(
+        lambda num=num: step_crowd(num))
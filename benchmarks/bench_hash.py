@@ -0,0 +1,63 @@
+import time
+from settings import *
+from chunk_hash import WorldHashes
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import get_world
+
+NUM_CHANGED = 8
+
+
+@benchmark('hash.world', repeat=10, items=WORLD_VOL, unit='chunk')
+def hash_world():
+    # every chunk hash plus the whole column tree, as after generating or loading a world
+    hashes = WorldHashes(get_world().voxels)
+
+    def run():
+        hashes.build()
+
+    run.metrics = lambda: {'gb_per_sec': WORLD_VOL * CHUNK_VOL / 1e9 / run_time(hashes.build)}
+    return run
+
+
+@benchmark('hash.update', repeat=100, items=1, unit='edit')
+def update():
+    # one edited chunk: its hash, its column leaf and the path to the root
+    hashes = get_world().hashes
+    chunk_index = np.array([WORLD_AREA // 2])
+
+    def run():
+        hashes.update(chunk_index)
+    return run
+
+
+@benchmark('hash.diff', repeat=100, items=NUM_CHANGED, unit='chunk')
+def diff():
+    # finds NUM_CHANGED changed chunks between two trees, against comparing the voxel arrays
+    world = get_world()
+    rng = np.random.default_rng(SEED)
+    other_voxels = world.voxels.copy()
+    changed = rng.choice(WORLD_VOL, NUM_CHANGED, replace=False)
+    other_voxels[changed, rng.integers(0, CHUNK_VOL, NUM_CHANGED)] += 1
+    hashes, other = world.hashes, WorldHashes(other_voxels)
+    found = {}
+
+    def run():
+        found['chunks'] = hashes.diff(other)
+
+    def compare_arrays():
+        return np.flatnonzero((world.voxels != other_voxels).any(axis=1))
+
+    run.metrics = lambda: {
+        'found': len(found['chunks']),
+        'array_compare_ms': run_time(compare_arrays) * 1e3,
+    }
+    return run
+
+
+def run_time(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
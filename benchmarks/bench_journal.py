@@ -0,0 +1,76 @@
+from settings import *
+from lighting import encode
+from journal import EditJournal
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import get_world
+
+NUM_OPS, OP_SIZE = 1000, 10
+NUM_EDITS = NUM_OPS * OP_SIZE ** 3
+
+
+def get_ops(seed=SEED):
+    # 1000 edits of a 10^3 box each at random places; only the recorded old ids are made up,
+    # so undoing and redoing everything leaves the world as it was
+    world = get_world()
+    rng = np.random.default_rng(seed)
+    box = np.arange(OP_SIZE)
+    ops = []
+    for _ in range(NUM_OPS):
+        x0, z0 = rng.integers(0, WORLD_X - OP_SIZE, 2)
+        y0 = rng.integers(0, WORLD_Y - OP_SIZE)
+        y, z, x = np.meshgrid(box + y0, box + z0, box + x0, indexing='ij')
+        changed = encode(x, y, z).ravel().astype('int64')
+        old_ids = rng.integers(0, 16, len(changed)).astype('uint8')
+        ops.append((changed, old_ids))
+    return world, ops
+
+
+def record_ops(world, ops):
+    journal = EditJournal(world, max_undo_steps=2 * NUM_OPS)
+    for changed, old_ids in ops:
+        journal.record(changed, old_ids)
+    return journal
+
+
+@benchmark('journal.record', repeat=5, items=NUM_EDITS, unit='edit')
+def record():
+    world, ops = get_ops()
+    journal = {}
+
+    def run():
+        journal['last'] = record_ops(world, ops)
+
+    run.metrics = lambda: {'bytes_per_million_edits': journal['last'].get_nbytes() / NUM_EDITS * 1e6}
+    return run
+
+
+@benchmark('journal.undo_redo', repeat=5, items=2 * NUM_EDITS, unit='edit')
+def undo_redo():
+    # raw revert and re-apply of the voxels, without the light and summary refresh of World.undo
+    world, ops = get_ops()
+    journal = record_ops(world, ops)
+
+    def run():
+        for _ in range(NUM_OPS):
+            journal.undo()
+        for _ in range(NUM_OPS):
+            journal.redo()
+    return run
+
+
+@benchmark('journal.export', repeat=5, items=NUM_EDITS, unit='edit')
+def export():
+    # folds every edit into per-chunk XOR/RLE deltas, as compaction and the export do
+    world, ops = get_ops()
+    journal = record_ops(world, ops)
+    changes = {}
+
+    def run():
+        changes['last'] = journal.get_changes()
+
+    run.metrics = lambda: {
+        'chunks': len(changes['last']),
+        'delta_bytes': sum(runs.nbytes for runs in changes['last'].values()),
+        'whole_chunk_bytes': len(changes['last']) * CHUNK_VOL,
+    }
+    return run
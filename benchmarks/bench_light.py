@@ -0,0 +1,47 @@
+from settings import *
+from terrain_gen import get_height
+from lighting import get_location
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import get_world
+
+NUM_EDITS = 64
+
+
+def get_surface_voxels(world, num=NUM_EDITS, seed=SEED):
+    # top solid voxel of random columns around the spawn, where edits change the sunlight
+    rng = np.random.default_rng(seed)
+    positions = []
+    for x, z in rng.integers(CENTER_XZ - 64, CENTER_XZ + 64, (num, 2)):
+        y = min(int(get_height(int(x), int(z))), WORLD_Y) - 1
+        while y > 0 and not world.voxels[get_location(int(x), y, int(z))]:
+            y -= 1
+        positions.append((int(x), y, int(z)))
+    return positions
+
+
+@benchmark('light.build_world', repeat=5, items=WORLD_VOL, unit='chunk')
+def build_world_light():
+    world = get_world()
+    return world.light_engine.build_light
+
+
+@benchmark('light.update_voxel', repeat=10, items=2 * NUM_EDITS, unit='edit')
+def update_voxel_light():
+    # digs out and restores each surface voxel, so the world ends up unchanged
+    world = get_world()
+    light_engine = world.light_engine
+    positions = get_surface_voxels(world)
+    stats = {'dirty_chunks': 0}
+
+    def run():
+        stats['dirty_chunks'] = 0
+        for pos in positions:
+            location = get_location(*pos)
+            voxel_id = world.voxels[location]
+            world.voxels[location] = 0
+            stats['dirty_chunks'] += len(light_engine.update_voxel(pos))
+            world.voxels[location] = voxel_id
+            stats['dirty_chunks'] += len(light_engine.update_voxel(pos))
+
+    run.metrics = lambda: {'dirty_chunks_per_edit': stats['dirty_chunks'] / (2 * NUM_EDITS)}
+    return run
@@ -0,0 +1,97 @@
+from settings import *
+from navigation import Navigator
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import get_world
+
+NUM_SHORT = 256
+NUM_CROSS_ISLAND = 32
+SHORT_RANGE = (16, 48)
+CROSS_ISLAND_DISTANCE = 600
+EDIT_RADIUS = 4
+
+
+def get_navigator():
+    # the world's own navigator, edits keep it current
+    navigator = get_world().navigation
+    navigator.update()
+    return navigator
+
+
+def get_floor(navigator, x, z):
+    return navigator.get_floor((x, WORLD_Y - 1, z), max_drop=WORLD_Y)
+
+
+def get_queries(navigator, num, min_distance, max_distance, seed=SEED):
+    # (start, goal) pairs of walkable surface cells whose xz distance is in the range
+    rng = np.random.default_rng(seed)
+    queries = []
+    while len(queries) < num:
+        x, z = rng.integers(0, [WORLD_X, WORLD_Z])
+        angle, distance = rng.uniform(0, 2 * np.pi), rng.uniform(min_distance, max_distance)
+        gx, gz = int(x + np.cos(angle) * distance), int(z + np.sin(angle) * distance)
+        if not (0 <= gx < WORLD_X and 0 <= gz < WORLD_Z):
+            continue
+        start, goal = get_floor(navigator, x, z), get_floor(navigator, gx, gz)
+        if start is not None and goal is not None:
+            queries.append((start, goal))
+    return queries
+
+
+def find_paths(num, min_distance, max_distance):
+    navigator = get_navigator()
+    queries = get_queries(navigator, num, min_distance, max_distance)
+    paths = []
+
+    def run():
+        paths[:] = navigator.find_paths(queries)
+
+    run.metrics = lambda: {
+        'found': sum(path is not None for path in paths),
+        'mean_length': float(np.mean([len(path) for path in paths if path is not None] or [0])),
+    }
+    return run, num
+
+
+@benchmark('nav.short', repeat=5, unit='path')
+def bench_short():
+    # queries within NAV_LOCAL_RANGE, mostly a single A* over the voxels
+    return find_paths(NUM_SHORT, *SHORT_RANGE)
+
+
+@benchmark('nav.cross_island', repeat=5, unit='path')
+def bench_cross_island():
+    # the portal graph, then A* inside every chunk along the way
+    return find_paths(NUM_CROSS_ISLAND, CROSS_ISLAND_DISTANCE, WORLD_X)
+
+
+@benchmark('nav.build', repeat=3, items=WORLD_VOL, unit='chunk')
+def bench_build():
+    # portals and in-chunk costs of every chunk, then the graph; a navigator of its own
+    # keeps world.navigation untouched
+    navigator = Navigator(get_world())
+
+    def run():
+        navigator.is_dirty[:] = True
+        navigator.update()
+
+    run.metrics = lambda: {'nodes': len(navigator.node_positions), 'edges': len(navigator.indices)}
+    return run
+
+
+@benchmark('nav.edit_update', repeat=5, unit='edit')
+def bench_edit_update():
+    # a crater near the spawn, then the clusters around it rebuilt, undone and rebuilt again
+    world = get_world()
+    navigator = get_navigator()
+    x, z = CENTER_XZ, CENTER_XZ
+    _, y, _ = get_floor(navigator, x, z)
+    rebuilt = []
+
+    def run():
+        world.carve_sphere((x, y, z), EDIT_RADIUS)
+        rebuilt.append(navigator.update())
+        world.undo()
+        rebuilt.append(navigator.update())
+
+    run.metrics = lambda: {'chunks_per_update': float(np.mean(rebuilt))}
+    return run, 2
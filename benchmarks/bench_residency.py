@@ -0,0 +1,35 @@
+import zlib
+from settings import *
+from meshes.chunk_mesh import build_vertex_data
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import get_world, get_surface_chunks
+
+# the CPU side of evicting meshes to compressed blobs and restoring them, against meshing the
+# chunks again (mesh.build_world); the GPU read back and upload need a GL context
+
+
+def get_meshes():
+    world = get_world()
+    return [build_vertex_data(chunk).tobytes() for chunk in get_surface_chunks(world)]
+
+
+@benchmark('residency.compress_blobs', repeat=5, unit='mesh')
+def compress_blobs():
+    meshes = get_meshes()
+    blobs = []
+
+    def run():
+        blobs[:] = [zlib.compress(mesh, MESH_BLOB_LEVEL) for mesh in meshes]
+
+    run.metrics = lambda: {'ratio': sum(map(len, meshes)) / sum(map(len, blobs))}
+    return run, len(meshes)
+
+
+@benchmark('residency.restore_blobs', repeat=5, unit='mesh')
+def restore_blobs():
+    blobs = [zlib.compress(mesh, MESH_BLOB_LEVEL) for mesh in get_meshes()]
+
+    def run():
+        for blob in blobs:
+            np.frombuffer(zlib.decompress(blob), dtype='uint32')
+    return run, len(blobs)
@@ -0,0 +1,76 @@
+from settings import *
+from scheduler import ChunkScheduler, MESH
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import get_world
+
+
+def get_scheduler(world):
+    # light and mesh jobs over the generated world; headless, so the meshes are built but
+    # never uploaded
+    scheduler = ChunkScheduler(world)
+    scheduler.mesh = True
+    return scheduler
+
+
+@benchmark('scheduler.light_mesh_world', repeat=3, items=WORLD_VOL, unit='chunk')
+def light_mesh_world():
+    # the light is rebuilt to the same levels, so the world ends up unchanged
+    world = get_world()
+    state = {}
+
+    def run():
+        world.light[:] = 0
+        state['scheduler'] = scheduler = get_scheduler(world)
+        scheduler.run()
+
+    def metrics():
+        stages = state['scheduler'].get_metrics()
+        return {f'{name}_latency_ms_{p}': stages[name][f'latency_ms_{p}']
+                for name in ('light', 'mesh') for p in ('p50', 'p99')}
+
+    run.metrics = metrics
+    return run
+
+
+@benchmark('scheduler.reprioritize', repeat=20, unit='job')
+def reprioritize():
+    # the whole world's mesh jobs queued, reordered after the player turned around
+    world = get_world()
+    player = world.app.player
+    scheduler = get_scheduler(world)
+    scheduler.is_lit[:] = True
+    scheduler.start()
+    forward = glm.vec3(player.forward)
+
+    def run():
+        player.forward = -player.forward
+        scheduler.reprioritize()
+        player.forward = forward
+
+    return run, scheduler.depths[MESH]
+
+
+@benchmark('scheduler.walk_to_corner', repeat=20, unit='job')
+def walk_to_corner():
+    # the whole world's mesh jobs queued from the center, reordered with the player at a corner,
+    # where the jobs of the columns beyond SCHEDULER_LOAD_RADIUS are cancelled, and back again
+    world = get_world()
+    player = world.app.player
+    scheduler = get_scheduler(world)
+    scheduler.is_lit[:] = True
+    scheduler.start()
+    center = glm.vec3(player.position)
+    corner = glm.vec3(0.5 * CHUNK_SIZE, center.y, 0.5 * CHUNK_SIZE)
+    stats = {}
+
+    def run():
+        cancelled = sum(scheduler.cancelled)
+        player.position = glm.vec3(corner)
+        scheduler.reprioritize()
+        stats.update(cancelled=sum(scheduler.cancelled) - cancelled, queued_at_corner=len(scheduler.jobs))
+        player.position = glm.vec3(center)
+        scheduler.reprioritize()
+        stats.update(queued_back=len(scheduler.jobs))
+
+    run.metrics = lambda: stats
+    return run, scheduler.depths[MESH]
@@ -0,0 +1,103 @@
+from functools import lru_cache
+from settings import *
+from terrain_gen import get_height
+from voxel_tree import VoxelTree, DenseVoxels
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import get_world
+
+# the dense chunk array against the sparse 64-tree, on today's world and on one 8x taller:
+# the generator puts nothing above today's terrain, so the taller world is the generated
+# chunks under seven more layers of air chunks
+SCALES = (1, 8)
+NUM_POINTS = 1 << 20
+NUM_RAYS = 4096
+RAY_LENGTH = 256.0
+NUM_BOXES = 1 << 16
+
+
+@lru_cache(maxsize=None)
+def get_stores(scale):
+    world = get_world()
+    if scale == 1:
+        voxels = world.voxels
+    else:
+        voxels = np.zeros([WORLD_VOL * scale, CHUNK_VOL], dtype='uint8')
+        voxels[:WORLD_VOL] = world.voxels
+    return {'dense': DenseVoxels(voxels, WORLD_H * scale), 'tree': VoxelTree.from_dense(voxels, WORLD_H * scale)}
+
+
+@lru_cache(maxsize=None)
+def get_queries(scale):
+    rng = np.random.default_rng(SEED)
+    height = WORLD_Y * scale
+    points = np.column_stack([rng.integers(0, WORLD_X, NUM_POINTS), rng.integers(0, height, NUM_POINTS),
+                              rng.integers(0, WORLD_Z, NUM_POINTS)])
+    # rays from up to 64 voxels above the island, towards the ground at any angle
+    xz = rng.uniform(CENTER_XZ - 256, CENTER_XZ + 256, (NUM_RAYS, 2))
+    origins = np.column_stack([xz[:, 0], [get_height(int(x), int(z)) + rng.uniform(2, 64) for x, z in xz], xz[:, 1]])
+    directions = rng.normal(size=(NUM_RAYS, 3))
+    directions[:, 1] = -np.abs(directions[:, 1])
+    directions /= np.linalg.norm(directions, axis=1)[:, None]
+    # player sized boxes around the terrain surface
+    xz = rng.integers(CENTER_XZ - 256, CENTER_XZ + 256, (NUM_BOXES, 2))
+    box_min = np.column_stack([xz[:, 0], [get_height(x, z) + rng.integers(-2, 3) for x, z in xz], xz[:, 1]])
+    box_min = box_min.astype('int64')
+    return points, (origins, directions), (box_min, box_min + (1, 2, 1))
+
+
+def get_metrics(store, scale):
+    return lambda: {'bytes': store.nbytes, 'dense_ratio': get_stores(scale)['dense'].nbytes / store.nbytes}
+
+
+def query_points(name, scale):
+    store = get_stores(scale)[name]
+    points = get_queries(scale)[0]
+
+    def run():
+        store.get_voxels(points)
+
+    run.metrics = get_metrics(store, scale)
+    return run
+
+
+def cast_rays(name, scale):
+    store = get_stores(scale)[name]
+    origins, directions = get_queries(scale)[1]
+    hits = []
+
+    def run():
+        hits[:] = store.cast_rays(origins, directions, RAY_LENGTH)[0]
+
+    run.metrics = lambda: {**get_metrics(store, scale)(), 'hits': int(sum(hits))}
+    return run
+
+
+def check_boxes(name, scale):
+    store = get_stores(scale)[name]
+    box_min, box_max = get_queries(scale)[2]
+    solid = []
+
+    def run():
+        solid[:] = store.are_boxes_solid(box_min, box_max)
+
+    run.metrics = lambda: {**get_metrics(store, scale)(), 'solid': int(sum(solid))}
+    return run
+
+
+for scale in SCALES:
+    for name in ('dense', 'tree'):
+        benchmark(f'voxel_store.{name}_{scale}x.points', repeat=10, items=NUM_POINTS, unit='query')(
+            lambda name=name, scale=scale: query_points(name, scale))
+        benchmark(f'voxel_store.{name}_{scale}x.rays', repeat=10, items=NUM_RAYS, unit='ray')(
+            lambda name=name, scale=scale: cast_rays(name, scale))
+        benchmark(f'voxel_store.{name}_{scale}x.boxes', repeat=10, items=NUM_BOXES, unit='query')(
+            lambda name=name, scale=scale: check_boxes(name, scale))
+
+
+@benchmark('voxel_store.tree_8x.build', repeat=3, items=WORLD_VOL * 8, unit='chunk')
+def build_tree():
+    voxels = get_stores(8)['dense'].voxels
+
+    def run():
+        VoxelTree.from_dense(voxels, WORLD_H * 8)
+    return run
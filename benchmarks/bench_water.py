@@ -0,0 +1,60 @@
+import time
+from settings import *
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import get_world
+
+# a walled polder in the sea at the world corner, drained, then breached
+POLDER_MIN = (32, 32)
+POLDER_SIZE = (160, 128)
+BREACH_WIDTH = 10
+
+
+@benchmark('water.dam_break', repeat=5, items=1, unit='flood')
+def dam_break():
+    # times the flood through the breach until no cell is active, one WATER_TICK_BUDGET
+    # step at a time like the frames would; building and draining the polder and restoring
+    # the world afterwards are part of run() but not of flood_ms
+    world = get_world()
+    engine = world.water_engine
+    (x0, z0), (size_x, size_z) = POLDER_MIN, POLDER_SIZE
+    x1, z1 = x0 + size_x, z0 + size_z
+    walls = (((x0, 0, z0), (x1, WATER_SEA_TOP + 1, z0)), ((x0, 0, z1), (x1, WATER_SEA_TOP + 1, z1)),
+             ((x0, 0, z0), (x0, WATER_SEA_TOP + 1, z1)), ((x1, 0, z0), (x1, WATER_SEA_TOP + 1, z1)))
+    breach_z = z0 + size_z // 2
+    stats = {}
+
+    def run():
+        for min_pos, max_pos in walls:
+            world.fill_box(min_pos, max_pos, STONE)
+        engine.fill_water((x0 + 1, 0, z0 + 1), (x1 - 1, WATER_SEA_TOP, z1 - 1), 0)
+        engine.settle()
+
+        world.fill_box((x0, 0, breach_z), (x0, WATER_SEA_TOP + 1, breach_z + BREACH_WIDTH - 1), 0)
+        num_updates, num_ticks = engine.num_updates, engine.num_ticks
+        step_times = []
+        start = time.perf_counter()
+        while engine.is_active:
+            step_start = time.perf_counter()
+            engine.step()
+            step_times.append(time.perf_counter() - step_start)
+        flood_time = time.perf_counter() - start
+
+        stats.update(
+            flood_ms=flood_time * 1e3,
+            ticks=engine.num_ticks - num_ticks,
+            cell_updates=engine.num_updates - num_updates,
+            max_step_ms=max(step_times) * 1e3,
+            is_flooded=engine.get_level((x1 - 1, WATER_SEA_TOP, z1 - 1)) == WATER_SOURCE,
+        )
+
+        # walls and breach undone, the sea refilled
+        for _ in range(len(walls) + 1):
+            world.undo()
+        engine.build_water()
+        world.rebuild_dirty_chunks()
+
+    run.metrics = lambda: {
+        **stats,
+        'cell_updates_per_sec': stats['cell_updates'] / stats['flood_ms'] * 1e3,
+    }
+    return run
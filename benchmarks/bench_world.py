@@ -0,0 +1,157 @@
+from itertools import cycle
+from settings import *
+from terrain_gen import get_height
+from world_objects.chunk import Chunk
+from meshes.chunk_mesh_builder import build_chunk_mesh
+from meshes.binary_mesh_builder import build_chunk_mesh_binary
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import get_world, get_surface_chunks, get_ray_directions
+
+
+@benchmark('terrain.generate_chunk', repeat=50, unit='chunk')
+def generate_chunk():
+    world = get_world()
+    positions = cycle(chunk.position for chunk in get_surface_chunks(world))
+
+    def run():
+        Chunk(world, position=next(positions)).build_voxels()
+    return run
+
+
+@benchmark('terrain.build_chunks', repeat=3, items=WORLD_VOL, unit='chunk')
+def build_chunks():
+    world = get_world()
+
+    def run():
+        # generation is seeded per chunk, so the shared world is rebuilt identically
+        for chunk in world.chunks:
+            world.generate_chunk(chunk)
+    return run
+
+
+@benchmark('mesh.build_chunk', repeat=50, unit='chunk')
+def mesh_chunk():
+    world = get_world()
+    chunks = cycle(get_surface_chunks(world))
+
+    def run():
+        chunk = next(chunks)
+        build_chunk_mesh(chunk_voxels=chunk.voxels, format_size=1,
+                         chunk_pos=chunk.position, world_voxels=world.voxels, world_light=world.light)
+    return run
+
+
+@benchmark('mesh.build_world', repeat=3, unit='chunk')
+def mesh_world():
+    world = get_world()
+    chunks = get_surface_chunks(world)
+
+    def run():
+        for chunk in chunks:
+            build_chunk_mesh(chunk_voxels=chunk.voxels, format_size=1,
+                             chunk_pos=chunk.position, world_voxels=world.voxels, world_light=world.light)
+    return run, len(chunks)
+
+
+def mesh_faces(mesher):
+    # the surface chunks through one mesher, in faces per second
+    world = get_world()
+    chunks = get_surface_chunks(world)
+    meshes = []
+
+    def run():
+        meshes[:] = [mesher(chunk_voxels=chunk.voxels, format_size=1, chunk_pos=chunk.position,
+                            world_voxels=world.voxels, world_light=world.light) for chunk in chunks]
+    run()
+    reference = [build_chunk_mesh(chunk_voxels=chunk.voxels, format_size=1, chunk_pos=chunk.position,
+                                  world_voxels=world.voxels, world_light=world.light) for chunk in chunks]
+    run.metrics = lambda: {'identical': all(np.array_equal(mesh, ref) for mesh, ref in zip(meshes, reference))}
+    return run, sum(len(mesh) for mesh in meshes) // 6
+
+
+@benchmark('mesh.faces_scalar', repeat=3, unit='face')
+def mesh_faces_scalar():
+    return mesh_faces(build_chunk_mesh)
+
+
+@benchmark('mesh.faces_binary', repeat=3, unit='face')
+def mesh_faces_binary():
+    return mesh_faces(build_chunk_mesh_binary)
+
+
+@benchmark('voxel_handler.ray_cast', repeat=20, items=256, unit='ray')
+def ray_cast():
+    world = get_world()
+    player = world.app.player
+    handler = world.voxel_handler
+    directions = get_ray_directions(256)
+
+    def run():
+        for direction in directions:
+            player.forward = direction
+            handler.ray_cast()
+    return run
+
+
+NUM_QUERIES = 4096
+
+
+def get_query_positions(num=NUM_QUERIES, seed=SEED):
+    # voxels within a few voxels of the terrain surface around the island center, as [n, 3]
+    rng = np.random.default_rng(seed)
+    xz = rng.integers(CENTER_XZ - 128, CENTER_XZ + 128, (num, 2))
+    y = [get_height(int(x), int(z)) + int(dy) for (x, z), dy in zip(xz, rng.integers(-4, 4, num))]
+    return np.column_stack([xz[:, 0], y, xz[:, 1]]).astype('int64')
+
+
+@benchmark('world.get_voxel_id', repeat=10, items=NUM_QUERIES, unit='voxel')
+def get_voxel_id():
+    world = get_world()
+    positions = [glm.vec3(*position) for position in get_query_positions().tolist()]
+
+    def run():
+        for position in positions:
+            world.get_voxel_id(position)
+    return run
+
+
+@benchmark('world.get_voxel_ids', repeat=50, items=NUM_QUERIES, unit='voxel')
+def get_voxel_ids():
+    world = get_world()
+    positions = get_query_positions()
+    reference = [world.get_voxel_id(glm.vec3(*position)) for position in positions.tolist()]
+
+    def run():
+        world.get_voxel_ids(positions)
+
+    run.metrics = lambda: {'identical': bool(np.array_equal(world.get_voxel_ids(positions), reference))}
+    return run
+
+
+@benchmark('world.check_collision', repeat=20, items=1024, unit='query')
+def check_collision():
+    world = get_world()
+    rng = np.random.default_rng(SEED)
+    positions = []
+    # feet positions around the terrain surface near the island center
+    for x, z in rng.uniform(CENTER_XZ - 64, CENTER_XZ + 64, (1024, 2)):
+        y = get_height(int(x), int(z)) + rng.uniform(-1.0, 1.0)
+        positions.append(glm.vec3(x, y, z))
+
+    def run():
+        for position in positions:
+            world.check_collision(position)
+    return run
+
+
+@benchmark('frustum.is_on_frustum', repeat=50, items=WORLD_VOL, unit='chunk')
+def frustum_culling():
+    world = get_world()
+    player = world.app.player
+    player.update()
+    is_on_frustum = player.frustum.is_on_frustum
+
+    def run():
+        for chunk in world.chunks:
+            is_on_frustum(chunk)
+    return run
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from settings import *
+from headless import HeadlessApp
+from terrain_gen import get_height
+from meshes.binary_mesh_builder import build_chunk_mesh_binary
+from benchmarks.harness import get_meta
+
+# CHUNK_SIZE sweep: larger chunks mean fewer draw calls but more to remesh after every edit.
+# The size is baked into every kernel, so each one runs in its own process with
+# VOXEL_CHUNK_SIZE set (settings keys the numba cache by it) over the same ~960 x 96 x 960 world.
+#   python -m benchmarks.chunk_size                        # 16, 32, 48 and 64
+#   python -m benchmarks.chunk_size --sizes 32,64 -o sizes.json
+# Frame time needs moderngl and a GL 3.3 standalone context; without one it is left out.
+
+CHUNK_SIZES = (16, 32, 48, 64)
+NUM_EDITS = 32
+NUM_VIEWS = 8  # yaws around the spawn the draw calls and frame time are averaged over
+FRAME_REPEAT = 5
+
+
+def time_call(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def build_meshes(world, chunk_indices):
+    # what ChunkMesh.get_vertex_data builds for each chunk, empty and sealed chunks skipped
+    meshes = {}
+    for chunk_index in chunk_indices:
+        chunk = world.chunks[chunk_index]
+        if chunk.is_empty or chunk.is_sealed():
+            continue
+        mesh = build_chunk_mesh_binary(chunk_voxels=chunk.voxels, format_size=1, chunk_pos=chunk.position,
+                                       world_voxels=world.voxels, world_light=world.light)
+        if len(mesh):
+            meshes[chunk_index] = mesh
+    return meshes
+
+
+def get_edit_sites(num, seed=SEED):
+    # surface columns on the island, where players dig
+    rng = np.random.default_rng(seed)
+    sites = []
+    while len(sites) < num:
+        x, z = (int(value) for value in rng.integers(CENTER_XZ - 128, CENTER_XZ + 128, 2))
+        height = get_height(x, z)
+        if height > WATER_LINE:
+            sites.append((x, height, z))
+    return sites
+
+
+def measure_remesh(world, sites):
+    # VoxelHandler.remove_voxel on the voxel under a player looking straight down, then the
+    # remesh of the chunks it dirtied; each edit is undone afterwards
+    player, handler = world.app.player, world.voxel_handler
+    latencies, remeshed = [], []
+    for x, height, z in sites:
+        player.position = glm.vec3(x + 0.5, height + 2.5, z + 0.5)
+        player.forward = glm.vec3(0, -1, 0)
+        handler.ray_cast()
+        if not handler.voxel_id:
+            continue
+        start = time.perf_counter()
+        handler.remove_voxel()
+        build_meshes(world, world.dirty_chunks)
+        latencies.append(time.perf_counter() - start)
+        remeshed.append(len(world.dirty_chunks))
+        world.undo()
+        world.dirty_chunks.clear()
+        world.water_engine.pop_dirty_chunks()
+    return latencies, remeshed
+
+
+def get_views(world):
+    player = world.app.player
+    for i in range(NUM_VIEWS):
+        player.yaw = 2 * math.pi * i / NUM_VIEWS
+        player.pitch = glm.radians(-15)
+        player.update()
+        yield [chunk for chunk in world.chunks if player.frustum.is_on_frustum(chunk)]
+
+
+def measure_frame(world, meshes):
+    # GPU time of the chunk pass from the spawn, or None without a GL context
+    try:
+        import moderngl as mgl
+        ctx = mgl.create_standalone_context(require=MAJOR_VER * 100 + MINOR_VER * 10)
+    except Exception:
+        return None
+    from shader_program import ShaderProgram
+
+    app = world.app
+    app.ctx = ctx
+    shader_program = ShaderProgram(app)
+    program = shader_program.chunk
+    vaos = {chunk_index: ctx.vertex_array(program, [(ctx.buffer(mesh), '1u4', 'packed_data')],
+                                          skip_errors=True)
+            for chunk_index, mesh in meshes.items()}
+    framebuffer = ctx.simple_framebuffer((int(WIN_RES.x), int(WIN_RES.y)))
+    framebuffer.use()
+    ctx.enable(flags=mgl.DEPTH_TEST | mgl.CULL_FACE)
+
+    frame_times = []
+    for visible in get_views(world):
+        shader_program.update()
+        for repeat in range(FRAME_REPEAT + 1):
+            start = time.perf_counter()
+            framebuffer.clear(color=BG_COLOR)
+            for chunk in visible:
+                if chunk.index in vaos:
+                    shader_program.uniforms.set(program, 'm_model', chunk.m_model)
+                    vaos[chunk.index].render()
+            ctx.finish()
+            # the first frame of a view pays for uploads and state changes
+            if repeat:
+                frame_times.append(time.perf_counter() - start)
+    app.ctx = None
+    ctx.release()
+    return float(np.median(frame_times))
+
+
+def measure_size():
+    # runs in the process of one CHUNK_SIZE, see main()
+    from precompile import precompile
+    from world import World
+
+    compile_seconds = precompile(verbose=False)['total']
+    world, generate_seconds = time_call(World, HeadlessApp())
+    meshes, mesh_seconds = time_call(build_meshes, world, range(WORLD_VOL))
+    spawn = glm.vec3(world.app.player.position)
+
+    sites = get_edit_sites(NUM_EDITS)
+    measure_remesh(world, sites[:1])
+    latencies, remeshed = measure_remesh(world, sites)
+
+    world.app.player.position = spawn
+    draw_calls = [sum(chunk.index in meshes for chunk in visible) for visible in get_views(world)]
+    frame_seconds = measure_frame(world, meshes)
+
+    return {
+        'chunk_size': CHUNK_SIZE,
+        'world_size': [WORLD_W, WORLD_H, WORLD_D],
+        'compile_seconds': compile_seconds,
+        'generate_seconds': generate_seconds,
+        'mesh_seconds': mesh_seconds,
+        'meshed_chunks': len(meshes),
+        'vertices': int(sum(len(mesh) for mesh in meshes.values())),
+        'remesh_ms_median': float(np.median(latencies)) * 1e3,
+        'remesh_ms_p99': float(np.percentile(latencies, 99)) * 1e3,
+        'remeshed_chunks': float(np.mean(remeshed)),
+        'draw_calls': float(np.mean(draw_calls)),
+        'frame_ms': None if frame_seconds is None else frame_seconds * 1e3,
+    }
+
+
+def run_size(chunk_size):
+    env = dict(os.environ, VOXEL_CHUNK_SIZE=str(chunk_size))
+    # a shared NUMBA_CACHE_DIR would hand one size's machine code to another
+    env.pop('NUMBA_CACHE_DIR', None)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'result.json')
+        subprocess.run([sys.executable, '-m', 'benchmarks.chunk_size', '--measure', path], env=env,
+                       check=True, stdout=subprocess.DEVNULL)
+        with open(path) as file:
+            return json.load(file)
+
+
+def print_results(results):
+    print(f'{"size":>4} {"world":>10} {"generate":>10} {"mesh":>10} {"remesh p50":>11} {"p99":>9} '
+          f'{"chunks/edit":>11} {"draw calls":>10} {"frame":>10}')
+    for result in results:
+        world_size = 'x'.join(str(value) for value in result['world_size'])
+        frame = 'n/a' if result['frame_ms'] is None else f'{result["frame_ms"]:7.2f} ms'
+        print(f'{result["chunk_size"]:>4} {world_size:>10} {result["generate_seconds"]:8.2f} s '
+              f'{result["mesh_seconds"]:8.2f} s {result["remesh_ms_median"]:8.2f} ms '
+              f'{result["remesh_ms_p99"]:6.2f} ms {result["remeshed_chunks"]:11.2f} '
+              f'{result["draw_calls"]:10.1f} {frame:>10}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare chunk sizes on the same world')
+    parser.add_argument('--sizes', default=','.join(map(str, CHUNK_SIZES)),
+                        help='comma separated chunk sizes, up to 64')
+    parser.add_argument('-o', '--output', help='write the results as JSON to this path')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        with open(args.measure, 'w') as file:
+            json.dump(measure_size(), file)
+        return 0
+
+    results = []
+    for chunk_size in (int(size) for size in args.sizes.split(',')):
+        print(f'chunk size {chunk_size}...', file=sys.stderr)
+        results.append(run_size(chunk_size))
+    print_results(results)
+    if args.output:
+        meta = get_meta()
+        del meta['chunk_size'], meta['world_size']
+        with open(args.output, 'w') as file:
+            json.dump({'meta': meta, 'results': results}, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,30 @@
+from functools import lru_cache
+from settings import *
+from headless import HeadlessApp
+from world import World
+
+# shared, lazily built state - generating the world takes seconds, so every
+# benchmark reuses the same one and must leave its voxels unchanged
+
+
+@lru_cache(maxsize=None)
+def get_world():
+    app = HeadlessApp()
+    world = World(app)
+    return world
+
+
+def get_surface_chunks(world):
+    # non-empty chunks the mesher actually has to process
+    return [chunk for chunk in world.chunks if not chunk.is_empty and not chunk.is_sealed()]
+
+
+def get_ray_directions(num=256, seed=SEED):
+    # unit vectors spread over the lower hemisphere, where rays hit terrain
+    rng = np.random.default_rng(seed)
+    yaw = rng.uniform(0, 2 * math.pi, num)
+    pitch = rng.uniform(-math.pi / 2, 0.2, num)
+    return [
+        glm.normalize(glm.vec3(math.cos(y) * math.cos(p), math.sin(p), math.sin(y) * math.cos(p)))
+        for y, p in zip(yaw, pitch)
+    ]
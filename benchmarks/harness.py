@@ -0,0 +1,142 @@
+import argparse
+import fnmatch
+import json
+import platform
+import sys
+import time
+import numba
+import numpy as np
+from settings import *
+
+# name -> Benchmark, in registration order
+BENCHMARKS = {}
+
+
+class Benchmark:
+    def __init__(self, name, setup, repeat, items, unit):
+        self.name = name
+        # setup() -> run or (run, items); only run() is timed, run.metrics() may
+        # return extra numbers (counts, bytes) to store with the timings
+        self.setup = setup
+        self.repeat = repeat
+        self.items = items
+        self.unit = unit
+
+    def measure(self, repeat=None):
+        run = self.setup()
+        items = self.items
+        if isinstance(run, tuple):
+            run, items = run
+
+        # warm-up call: pays numba compilation and first-touch costs outside the timings
+        run()
+
+        times = []
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+
+        stats = get_stats(times, items, self.unit)
+        if hasattr(run, 'metrics'):
+            stats['metrics'] = run.metrics()
+        return stats
+
+
+def benchmark(name, repeat=10, items=1, unit='op'):
+    def decorator(setup):
+        BENCHMARKS[name] = Benchmark(name, setup, repeat, items, unit)
+        return setup
+    return decorator
+
+
+def get_stats(times, items, unit):
+    times = np.asarray(times, dtype='float64')
+    median = float(np.median(times))
+    return {
+        'repeat': len(times),
+        'items': items,
+        'unit': unit,
+        'min': float(times.min()),
+        'median': median,
+        'mean': float(times.mean()),
+        'p99': float(np.percentile(times, 99)),
+        'max': float(times.max()),
+        'items_per_sec': items / median if median > 0 else float('inf'),
+    }
+
+
+def get_meta():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'numba': numba.__version__,
+        'machine': platform.machine(),
+        'chunk_size': CHUNK_SIZE,
+        'world_size': [WORLD_W, WORLD_H, WORLD_D],
+        'seed': SEED,
+    }
+
+
+def compare(results, baseline, tolerance):
+    # median time ratio against the baseline; > 1 means slower
+    comparison = {}
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        ratio = result['median'] / base['median'] if base['median'] > 0 else float('inf')
+        if ratio > 1 + tolerance:
+            status = 'regression'
+        elif ratio < 1 - tolerance:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        comparison[name] = {'baseline_median': base['median'], 'ratio': ratio, 'status': status}
+    return comparison
+
+
+def print_results(results, comparison):
+    print(f'{"benchmark":<32} {"median":>12} {"p99":>12} {"throughput":>20} {"vs baseline":>16}')
+    for name, result in results.items():
+        throughput = f'{result["items_per_sec"]:.1f} {result["unit"]}/s'
+        line = f'{name:<32} {result["median"] * 1e3:9.3f} ms {result["p99"] * 1e3:9.3f} ms {throughput:>20}'
+        if name in comparison:
+            line += f' {comparison[name]["ratio"]:7.2f}x {comparison[name]["status"]}'
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless benchmarks of the engine hot paths')
+    parser.add_argument('-k', '--filter', default='*', help='glob over benchmark names')
+    parser.add_argument('-o', '--output', help='write the results as JSON to this path')
+    parser.add_argument('-b', '--baseline', help='JSON results of a previous run to compare against')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.15,
+                        help='allowed median slowdown before a benchmark counts as a regression')
+    parser.add_argument('-r', '--repeat', type=int, help='override the repeat count of every benchmark')
+    parser.add_argument('-l', '--list', action='store_true', help='list benchmark names and exit')
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if fnmatch.fnmatch(name, args.filter)]
+    if args.list:
+        print('\n'.join(names))
+        return 0
+
+    results = {}
+    for name in names:
+        results[name] = BENCHMARKS[name].measure(args.repeat)
+        print(f'{name}: {results[name]["median"] * 1e3:.3f} ms', file=sys.stderr)
+
+    comparison = {}
+    if args.baseline:
+        with open(args.baseline) as file:
+            comparison = compare(results, json.load(file)['results'], args.tolerance)
+
+    print_results(results, comparison)
+    report = {'meta': get_meta(), 'results': results, 'comparison': comparison}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    regressions = [name for name, entry in comparison.items() if entry['status'] == 'regression']
+    return 1 if regressions else 0
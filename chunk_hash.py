@@ -0,0 +1,209 @@
+from settings import *
+
+# Content hashes of World.voxels: an XXH64 hash per chunk and a Merkle tree over the chunk
+# columns. A leaf hashes the chunk hashes of one column (bottom to top), an inner node the
+# hashes of its two children; the tree is a heap (root at 1, children of n at 2n and 2n + 1)
+# padded with zero leaves up to a power of two. Two trees are diffed from the root down,
+# only into subtrees whose hashes differ, so k changed chunks cost O(k log N) comparisons.
+
+NUM_COLUMNS = WORLD_AREA
+NUM_LEAVES = 1 << (NUM_COLUMNS - 1).bit_length()
+
+PRIME64_1 = np.uint64(0x9E3779B185EBCA87)
+PRIME64_2 = np.uint64(0xC2B2AE3D27D4EB4F)
+PRIME64_3 = np.uint64(0x165667B19E3779F9)
+PRIME64_4 = np.uint64(0x85EBCA77C2B2AE63)
+PRIME64_5 = np.uint64(0x27D4EB2F165667C5)
+
+
+@njit(cache=True)
+def rotl(x, r):
+    return (x << np.uint64(r)) | (x >> np.uint64(64 - r))
+
+
+@njit(cache=True)
+def xxh_round(acc, lane):
+    acc += lane * PRIME64_2
+    return rotl(acc, 31) * PRIME64_1
+
+
+@njit(cache=True)
+def xxh_merge(acc, value):
+    acc ^= xxh_round(np.uint64(0), value)
+    return acc * PRIME64_1 + PRIME64_4
+
+
+@njit(cache=True)
+def xxh64(data, seed=0):
+    # XXH64 of a uint8 array
+    seed = np.uint64(seed)
+    size = len(data)
+    # little endian uint64 lanes of the whole 8 byte words
+    lanes = data[:size // 8 * 8].view(np.uint64)
+    i = 0
+    if size >= 32:
+        v1 = seed + PRIME64_1 + PRIME64_2
+        v2 = seed + PRIME64_2
+        v3 = seed
+        v4 = seed - PRIME64_1
+        while i + 32 <= size:
+            v1 = xxh_round(v1, lanes[i // 8])
+            v2 = xxh_round(v2, lanes[i // 8 + 1])
+            v3 = xxh_round(v3, lanes[i // 8 + 2])
+            v4 = xxh_round(v4, lanes[i // 8 + 3])
+            i += 32
+        h = rotl(v1, 1) + rotl(v2, 7) + rotl(v3, 12) + rotl(v4, 18)
+        h = xxh_merge(h, v1)
+        h = xxh_merge(h, v2)
+        h = xxh_merge(h, v3)
+        h = xxh_merge(h, v4)
+    else:
+        h = seed + PRIME64_5
+    h += np.uint64(size)
+
+    while i + 8 <= size:
+        h ^= xxh_round(np.uint64(0), lanes[i // 8])
+        h = rotl(h, 27) * PRIME64_1 + PRIME64_4
+        i += 8
+    if i + 4 <= size:
+        word = np.uint64(0)
+        for j in range(4):
+            word |= np.uint64(data[i + j]) << np.uint64(8 * j)
+        h ^= word * PRIME64_1
+        h = rotl(h, 23) * PRIME64_2 + PRIME64_3
+        i += 4
+    while i < size:
+        h ^= np.uint64(data[i]) * PRIME64_5
+        h = rotl(h, 11) * PRIME64_1
+        i += 1
+
+    h ^= h >> np.uint64(33)
+    h *= PRIME64_2
+    h ^= h >> np.uint64(29)
+    h *= PRIME64_3
+    h ^= h >> np.uint64(32)
+    return h
+
+
+@njit(cache=True)
+def hash_chunks(voxels, chunk_hashes, chunk_indices):
+    for chunk_index in chunk_indices:
+        chunk_hashes[chunk_index] = xxh64(voxels[chunk_index])
+
+
+@njit(cache=True)
+def hash_column(chunk_hashes, column):
+    column_hashes = np.empty(WORLD_H, dtype='uint64')
+    for y in range(WORLD_H):
+        column_hashes[y] = chunk_hashes[column + WORLD_AREA * y]
+    return xxh64(column_hashes.view(np.uint8))
+
+
+@njit(cache=True)
+def hash_node(nodes, node):
+    return xxh64(nodes[2 * node:2 * node + 2].view(np.uint8))
+
+
+@njit(cache=True)
+def build_tree(chunk_hashes, nodes):
+    for column in range(NUM_COLUMNS):
+        nodes[NUM_LEAVES + column] = hash_column(chunk_hashes, column)
+    for node in range(NUM_LEAVES - 1, 0, -1):
+        nodes[node] = hash_node(nodes, node)
+
+
+@njit(cache=True)
+def update_tree(chunk_hashes, nodes, chunk_indices):
+    # rehashes the leaves of the columns of the chunks, then their paths up to the root,
+    # one level at a time so shared ancestors are hashed once
+    is_dirty = np.zeros(2 * NUM_LEAVES, dtype='uint8')
+    for chunk_index in chunk_indices:
+        column = chunk_index % WORLD_AREA
+        if not is_dirty[NUM_LEAVES + column]:
+            is_dirty[NUM_LEAVES + column] = 1
+            nodes[NUM_LEAVES + column] = hash_column(chunk_hashes, column)
+
+    level_start = NUM_LEAVES
+    while level_start > 1:
+        for node in range(level_start, 2 * level_start):
+            if is_dirty[node] and not is_dirty[node // 2]:
+                is_dirty[node // 2] = 1
+                nodes[node // 2] = hash_node(nodes, node // 2)
+        level_start //= 2
+
+
+@njit(cache=True)
+def diff_trees(nodes_a, nodes_b):
+    # -> columns whose leaves differ, descending only into differing subtrees
+    columns = np.empty(NUM_COLUMNS, dtype='int64')
+    num_columns = 0
+    stack = np.empty(2 * NUM_LEAVES, dtype='int64')
+    stack[0] = 1
+    top = 1
+    while top:
+        top -= 1
+        node = stack[top]
+        if nodes_a[node] == nodes_b[node]:
+            continue
+        if node >= NUM_LEAVES:
+            columns[num_columns] = node - NUM_LEAVES
+            num_columns += 1
+        else:
+            stack[top] = 2 * node
+            stack[top + 1] = 2 * node + 1
+            top += 2
+    return np.sort(columns[:num_columns])
+
+
+@njit(cache=True)
+def diff_columns(hashes_a, hashes_b, columns):
+    # -> chunk indices within the columns whose hashes differ
+    chunk_indices = np.empty(len(columns) * WORLD_H, dtype='int64')
+    num_chunks = 0
+    for column in columns:
+        for y in range(WORLD_H):
+            chunk_index = column + WORLD_AREA * y
+            if hashes_a[chunk_index] != hashes_b[chunk_index]:
+                chunk_indices[num_chunks] = chunk_index
+                num_chunks += 1
+    return chunk_indices[:num_chunks]
+
+
+class WorldHashes:
+    def __init__(self, voxels):
+        self.voxels = voxels
+        self.chunk_hashes = np.zeros(WORLD_VOL, dtype='uint64')
+        self.nodes = np.zeros(2 * NUM_LEAVES, dtype='uint64')
+        self.build()
+        # hashes of the freshly generated world, to find the chunks edits have touched since
+        self.generated = self.copy()
+
+    def build(self):
+        hash_chunks(self.voxels, self.chunk_hashes, np.arange(WORLD_VOL))
+        build_tree(self.chunk_hashes, self.nodes)
+
+    def update(self, chunk_indices):
+        # after chunk_indices were edited: rehashes those chunks and their tree paths
+        chunk_indices = np.asarray(chunk_indices, dtype='int64')
+        hash_chunks(self.voxels, self.chunk_hashes, chunk_indices)
+        update_tree(self.chunk_hashes, self.nodes, chunk_indices)
+
+    @property
+    def root(self):
+        return int(self.nodes[1])
+
+    def copy(self):
+        # a detached snapshot (no voxels), enough to diff against later
+        snapshot = WorldHashes.__new__(WorldHashes)
+        snapshot.voxels = None
+        snapshot.chunk_hashes = self.chunk_hashes.copy()
+        snapshot.nodes = self.nodes.copy()
+        return snapshot
+
+    def diff(self, other):
+        # -> chunk indices whose content differs from other (a snapshot or a peer's tree)
+        return diff_columns(self.chunk_hashes, other.chunk_hashes, diff_trees(self.nodes, other.nodes))
+
+    def get_modified_chunks(self):
+        # chunks whose voxels differ from the generated ones; an undone edit leaves none
+        return self.diff(self.generated)
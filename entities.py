@@ -0,0 +1,323 @@
+from settings import *
+from lighting import get_location
+from world_edit import place_voxels
+
+# Entities as a struct of arrays: row i of every array is entity i, rows [0, num) are alive.
+# A step integrates all of them against World.voxels in one kernel; before it, a counting sort
+# of the rows by grid column (x, z) over the columns the entities span finds the overlapping
+# pairs, which are kept as contacts and push mobs apart. Positions are box centers, velocities
+# are in voxels per ms like the player's, and everything below the world is solid ground.
+
+ENTITY_MOB, ENTITY_ITEM, ENTITY_FALLING_BLOCK = 0, 1, 2
+# per kind: half extents of the box and whether it pushes (and is pushed by) other entities
+KIND_HALF_EXTENTS = np.array([(0.3, 0.9, 0.3), (0.125, 0.125, 0.125), (0.49, 0.49, 0.49)], dtype='float32')
+KIND_PUSHES = np.array([True, False, False])
+# keeps boxes that touch a voxel face from counting as inside it
+EPSILON = 1e-4
+# voxels per ms; slower sideways motion on the ground stops, resting entities only check below
+REST_SPEED = 1e-5
+
+
+@njit(cache=True)
+def is_solid(voxels, wx, wy, wz):
+    if wy < 0:
+        return True
+    if not (0 <= wx < WORLD_X and wy < WORLD_Y and 0 <= wz < WORLD_Z):
+        return False
+    chunk_index, voxel_index = get_location(wx, wy, wz)
+    return voxels[chunk_index, voxel_index] != 0
+
+
+@njit(cache=True)
+def get_voxel_range(lo, hi):
+    # half-open range of the voxels a box side [lo, hi] overlaps
+    return int(math.floor(lo + EPSILON)), int(math.ceil(hi - EPSILON))
+
+
+@njit(cache=True)
+def is_box_solid(voxels, x0, y0, z0, x1, y1, z1):
+    # any solid voxel in the half-open voxel box
+    for wy in range(y0, y1):
+        for wz in range(z0, z1):
+            for wx in range(x0, x1):
+                if is_solid(voxels, wx, wy, wz):
+                    return True
+    return False
+
+
+@njit(cache=True)
+def is_layer_solid(voxels, axis, layer, x0, y0, z0, x1, y1, z1):
+    # the voxel box with the range along the axis replaced by one layer
+    if axis == 0:
+        return is_box_solid(voxels, layer, y0, z0, layer + 1, y1, z1)
+    if axis == 1:
+        return is_box_solid(voxels, x0, layer, z0, x1, layer + 1, z1)
+    return is_box_solid(voxels, x0, y0, layer, x1, y1, layer + 1)
+
+
+@njit(cache=True)
+def sweep_axis(voxels, position, half_extents, axis, move):
+    # -> the part of move along the axis the box makes before touching a solid voxel
+    x0, x1 = get_voxel_range(position[0] - half_extents[0], position[0] + half_extents[0])
+    y0, y1 = get_voxel_range(position[1] - half_extents[1], position[1] + half_extents[1])
+    z0, z1 = get_voxel_range(position[2] - half_extents[2], position[2] + half_extents[2])
+    lo, hi = position[axis] - half_extents[axis], position[axis] + half_extents[axis]
+    if move > 0:
+        for layer in range(int(math.ceil(hi - EPSILON)), int(math.ceil(hi + move - EPSILON))):
+            if is_layer_solid(voxels, axis, layer, x0, y0, z0, x1, y1, z1):
+                return max(layer - hi, 0.0)
+    elif move < 0:
+        for layer in range(int(math.floor(lo + EPSILON)) - 1, int(math.floor(lo + move + EPSILON)) - 1, -1):
+            if is_layer_solid(voxels, axis, layer, x0, y0, z0, x1, y1, z1):
+                return min(layer + 1 - lo, 0.0)
+    return move
+
+
+@njit(cache=True)
+def integrate_entities(voxels, positions, velocities, half_extents, pushes, on_ground, num, dt):
+    # gravity, then the move along y, x and z in turn, each stopped by the voxels it runs into
+    for i in range(num):
+        velocities[i, 1] = max(velocities[i, 1] - GRAVITY * dt, -TERMINAL_VELOCITY)
+        is_grounded = False
+        for axis in (1, 0, 2):
+            # pushes are capped so a crowd can't shove an entity through a wall
+            push = min(max(pushes[i, axis], -half_extents[i, axis]), half_extents[i, axis])
+            move = velocities[i, axis] * dt + push
+            if move == 0:
+                continue
+            moved = sweep_axis(voxels, positions[i], half_extents[i], axis, move)
+            positions[i, axis] += moved
+            if moved != move:
+                if axis == 1 and move < 0:
+                    is_grounded = True
+                velocities[i, axis] = 0
+        on_ground[i] = is_grounded
+        if is_grounded:
+            for axis in (0, 2):
+                velocities[i, axis] *= ENTITY_GROUND_FRICTION
+                if abs(velocities[i, axis]) < REST_SPEED:
+                    velocities[i, axis] = 0
+
+
+@njit(cache=True)
+def get_column(positions, i, cell_size, num_x, num_z):
+    # grid column (x, z) of an entity, those outside the world share the border columns
+    cx = min(max(int(math.floor(positions[i, 0] / cell_size)), 0), num_x - 1)
+    cz = min(max(int(math.floor(positions[i, 2] / cell_size)), 0), num_z - 1)
+    return cx, cz
+
+
+@njit(cache=True)
+def sort_by_column(positions, num, cell_size, num_x, num_z):
+    # counting sort by column over the columns the entities span, x fastest like the voxels;
+    # -> the order of the rows and the grid (x0, z0, size_x, size_z, column_start), where
+    # column (x0 + x, z0 + z) holds the sorted rows column_start[c]:column_start[c + 1], c = x + size_x * z
+    columns = np.empty((num, 2), dtype='int64')
+    x0, z0, x1, z1 = num_x, num_z, -1, -1
+    for i in range(num):
+        cx, cz = get_column(positions, i, cell_size, num_x, num_z)
+        columns[i, 0], columns[i, 1] = cx, cz
+        x0, z0, x1, z1 = min(x0, cx), min(z0, cz), max(x1, cx), max(z1, cz)
+    size_x, size_z = x1 - x0 + 1, z1 - z0 + 1
+
+    keys = np.empty(num, dtype='int64')
+    column_start = np.zeros(size_x * size_z + 1, dtype='int64')
+    for i in range(num):
+        keys[i] = columns[i, 0] - x0 + size_x * (columns[i, 1] - z0)
+        column_start[keys[i] + 1] += 1
+    for c in range(size_x * size_z):
+        column_start[c + 1] += column_start[c]
+
+    order = np.empty(num, dtype='int64')
+    fill = column_start[:-1].copy()
+    for i in range(num):
+        order[fill[keys[i]]] = i
+        fill[keys[i]] += 1
+    return order, (x0, z0, size_x, size_z, column_start)
+
+
+@njit(cache=True)
+def collide_entities(positions, half_extents, kinds, num, cell_size, num_x, num_z, grid, pairs, pushes):
+    # rows sorted by column: overlapping pairs (i < j) among the 3x3 columns around each entity,
+    # written to pairs while they fit; pushing pairs get half the overlap each, along the
+    # shallower horizontal axis. -> number of contacts
+    x0, z0, size_x, size_z, column_start = grid
+    pushes[:num] = 0
+    num_contacts = 0
+    overlap = np.empty(3)
+    for i in range(num):
+        cx, cz = get_column(positions, i, cell_size, num_x, num_z)
+        cx, cz = cx - x0, cz - z0
+        for nz in range(max(cz - 1, 0), min(cz + 2, size_z)):
+            # the 3 columns along x are consecutive rows, and rows before i were paired already
+            first = max(column_start[max(cx - 1, 0) + size_x * nz], i + 1)
+            last = column_start[min(cx + 2, size_x) + size_x * nz]
+            for j in range(first, last):
+                is_overlapping = True
+                for k in range(3):
+                    overlap[k] = half_extents[i, k] + half_extents[j, k] - abs(positions[i, k] - positions[j, k])
+                    if overlap[k] <= 0:
+                        is_overlapping = False
+                        break
+                if not is_overlapping:
+                    continue
+
+                if num_contacts < len(pairs):
+                    pairs[num_contacts, 0] = i
+                    pairs[num_contacts, 1] = j
+                num_contacts += 1
+
+                if KIND_PUSHES[kinds[i]] and KIND_PUSHES[kinds[j]]:
+                    axis = 0 if overlap[0] < overlap[2] else 2
+                    # coincident centers are split by row
+                    sign = 1.0 if positions[i, axis] > positions[j, axis] or (
+                        positions[i, axis] == positions[j, axis] and i % 2) else -1.0
+                    push = 0.5 * ENTITY_PUSH * overlap[axis] * sign
+                    pushes[i, axis] += push
+                    pushes[j, axis] -= push
+    return num_contacts
+
+
+class EntitySystem:
+    # per-entity arrays, rows are reordered by every step
+    ROW_ARRAYS = ('ids', 'kinds', 'positions', 'velocities', 'half_extents', 'on_ground', 'voxel_ids')
+
+    def __init__(self, world, capacity=1024):
+        self.world = world
+        self.num = 0
+        # stable ids for gameplay code, rows move with the grid order and with removals
+        self.ids = np.empty(capacity, dtype='int64')
+        self.kinds = np.empty(capacity, dtype='uint8')
+        self.positions = np.empty([capacity, 3], dtype='float32')
+        self.velocities = np.empty([capacity, 3], dtype='float32')
+        self.half_extents = np.empty([capacity, 3], dtype='float32')
+        self.on_ground = np.empty(capacity, dtype='bool')
+        # voxel id a falling block places or an item stands for
+        self.voxel_ids = np.empty(capacity, dtype='uint8')
+        self.pushes = np.empty([capacity, 3], dtype='float32')
+        self.next_id = 0
+
+        # overlapping (i, j) rows found by a step, grown when a step finds more
+        self.pairs = np.empty([capacity, 2], dtype='int64')
+        # ids of the entities in contact at the last step, [n, 2]
+        self.contacts = np.empty([0, 2], dtype='int64')
+        self.time_since_step = 0.0
+        self.num_steps = 0
+
+    @property
+    def capacity(self):
+        return len(self.ids)
+
+    def reserve(self, capacity):
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, 2 * self.capacity)
+        for name in self.ROW_ARRAYS + ('pushes',):
+            array = getattr(self, name)
+            grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.num] = array[:self.num]
+            setattr(self, name, grown)
+
+    def spawn(self, kind, positions, velocities=None, voxel_ids=None):
+        # positions ([n, 3] box centers) of n entities of a kind; -> their ids
+        positions = np.asarray(positions, dtype='float32').reshape(-1, 3)
+        count = len(positions)
+        if kind == ENTITY_FALLING_BLOCK and (voxel_ids is None or not np.all(voxel_ids)):
+            raise ValueError('falling blocks need the (non-air) voxel ids they place')
+        self.reserve(self.num + count)
+        rows = slice(self.num, self.num + count)
+
+        ids = np.arange(self.next_id, self.next_id + count)
+        self.ids[rows] = ids
+        self.kinds[rows] = kind
+        self.positions[rows] = positions
+        self.velocities[rows] = 0 if velocities is None else np.asarray(velocities, dtype='float32').reshape(-1, 3)
+        self.half_extents[rows] = KIND_HALF_EXTENTS[kind]
+        self.on_ground[rows] = False
+        self.voxel_ids[rows] = 0 if voxel_ids is None else voxel_ids
+        self.next_id += count
+        self.num += count
+        return ids
+
+    def remove(self, rows):
+        # drops the entities at the rows, the rest keep their order
+        keep = np.ones(self.num, dtype='bool')
+        keep[rows] = False
+        self.reorder(np.flatnonzero(keep))
+
+    def reorder(self, rows):
+        # the entities at rows become rows 0..len(rows) - 1, the others are dropped
+        for name in self.ROW_ARRAYS:
+            array = getattr(self, name)
+            array[:len(rows)] = array[rows]
+        self.num = len(rows)
+
+    def get_rows(self, ids):
+        # current rows of the entities with the ids, -1 for removed ones
+        ids = np.asarray(ids, dtype='int64')
+        if not self.num:
+            return np.full(len(ids), -1)
+        by_id = np.argsort(self.ids[:self.num])
+        found = np.minimum(np.searchsorted(self.ids[:self.num], ids, sorter=by_id), self.num - 1)
+        rows = by_id[found]
+        return np.where(self.ids[rows] == ids, rows, -1)
+
+    def update(self, delta_time):
+        # delta_time in ms; steps at ENTITY_TICK_INTERVAL, so the result doesn't depend on the frame rate
+        self.time_since_step += delta_time
+        steps = 0
+        while self.time_since_step >= ENTITY_TICK_INTERVAL and steps < ENTITY_MAX_STEPS:
+            self.time_since_step -= ENTITY_TICK_INTERVAL
+            self.step()
+            steps += 1
+        if steps == ENTITY_MAX_STEPS:
+            self.time_since_step = min(self.time_since_step, ENTITY_TICK_INTERVAL)
+        return steps
+
+    def step(self, dt=ENTITY_TICK_INTERVAL):
+        self.num_steps += 1
+        if not self.num:
+            return
+        self.find_contacts()
+        integrate_entities(self.world.voxels, self.positions, self.velocities, self.half_extents, self.pushes,
+                           self.on_ground, self.num, float(dt))
+        self.land_blocks()
+
+    def find_contacts(self):
+        # sorts the rows by grid column, which also keeps the voxel reads of the
+        # integration close together, then finds the pairs and pushes
+        num = self.num
+        # a cell at least as large as every entity keeps overlapping pairs in neighbouring columns
+        cell_size = max(ENTITY_GRID_CELL, 2 * float(self.half_extents[:num].max()))
+        num_x, num_z = math.ceil(WORLD_X / cell_size), math.ceil(WORLD_Z / cell_size)
+        order, grid = sort_by_column(self.positions, num, cell_size, num_x, num_z)
+        self.reorder(order)
+
+        num_contacts = collide_entities(self.positions, self.half_extents, self.kinds, num, cell_size,
+                                        num_x, num_z, grid, self.pairs, self.pushes)
+        if num_contacts > len(self.pairs):
+            # the pushes are complete already, only the list was cut short: redo it with room
+            self.pairs = np.empty([2 * num_contacts, 2], dtype='int64')
+            collide_entities(self.positions, self.half_extents, self.kinds, num, cell_size,
+                             num_x, num_z, grid, self.pairs, self.pushes)
+        self.contacts = self.ids[self.pairs[:num_contacts]]
+
+    def land_blocks(self):
+        # falling blocks that touched the ground become voxels, as part of the last undo step;
+        # where the voxel was taken by another block in the same step they are lifted onto it
+        # and land on the next one, outside the world they drop as items
+        rows = np.flatnonzero((self.kinds[:self.num] == ENTITY_FALLING_BLOCK) & self.on_ground[:self.num])
+        if not len(rows):
+            return
+        cells = np.floor(self.positions[rows]).astype('int64')
+        changed, old_ids, is_placed = place_voxels(self.world.voxels, cells, self.voxel_ids[rows])
+        self.world.merge_edits(changed, old_ids)
+
+        is_inside = np.all((cells >= 0) & (cells < (WORLD_X, WORLD_Y, WORLD_Z)), axis=1)
+        lifted = rows[~is_placed & is_inside]
+        self.positions[lifted, 1] = cells[~is_placed & is_inside, 1] + 1 + KIND_HALF_EXTENTS[ENTITY_FALLING_BLOCK, 1]
+        dropped = rows[~is_placed & ~is_inside]
+        self.kinds[dropped] = ENTITY_ITEM
+        self.half_extents[dropped] = KIND_HALF_EXTENTS[ENTITY_ITEM]
+        self.positions[dropped, 1] += KIND_HALF_EXTENTS[ENTITY_ITEM, 1] - KIND_HALF_EXTENTS[ENTITY_FALLING_BLOCK, 1]
+        self.remove(rows[is_placed])
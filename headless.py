@@ -0,0 +1,38 @@
+from settings import *
+from camera import Camera
+from world import World
+from profiler import frame_profiler
+
+
+class HeadlessPlayer(Camera):
+    # the Player state the world relies on, without pygame input
+    def __init__(self, position=PLAYER_POS, yaw=-90, pitch=0):
+        self.velocity = glm.vec3(0.0)
+        self.on_ground = True
+        self.can_jump = True
+        self.creative_mode = False
+
+        self.feet_position = glm.vec3(position)
+        eye_position = glm.vec3(position.x, position.y + PLAYER_EYE_HEIGHT, position.z)
+        super().__init__(eye_position, yaw, pitch)
+
+
+class HeadlessApp:
+    # stands in for VoxelEngine in tools and benchmarks: no window and no GL context,
+    # so the world generates voxels but never uploads meshes
+    def __init__(self, player=None):
+        self.ctx = None
+        self.player = player or HeadlessPlayer()
+        self.delta_time = 0
+        self.time = 0
+
+
+class HeadlessScene:
+    # the simulation half of Scene: the world, without the marker, water and clouds it draws
+    def __init__(self, app):
+        self.app = app
+        self.world = World(app)
+
+    def update(self):
+        with frame_profiler.section('world'):
+            self.world.update()
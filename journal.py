@@ -0,0 +1,256 @@
+from settings import *
+from lighting import decode, get_location, encode_location
+
+# Edit journal: every changed voxel is recorded as (chunk index, voxel index, old id, new id)
+# in flat typed arrays, grouped into undoable operations (one per World edit call).
+# Past the undo horizon the oldest operations are compacted into per-chunk deltas: the XOR
+# of the generated voxels and the edited ones, run-length encoded. XOR deltas compose, so
+# folding more edits into a delta never needs the generated voxels themselves.
+#
+# A run is one uint32: run length << 8 | voxel value.
+
+# chunks decoded at once while folding edits into deltas
+FOLD_BATCH = 64
+
+
+@njit(cache=True)
+def record_edits(voxels, changed, old_ids, chunk_indices, voxel_indices, olds, news, start):
+    for i in range(len(changed)):
+        chunk_index, voxel_index = get_location(*decode(changed[i]))
+        chunk_indices[start + i] = chunk_index
+        voxel_indices[start + i] = voxel_index
+        olds[start + i] = old_ids[i]
+        news[start + i] = voxels[chunk_index, voxel_index]
+
+
+@njit(cache=True)
+def replay_edits(voxels, chunk_indices, voxel_indices, ids, start, end, reverse):
+    # writes ids[start:end] back into the world, last edit first when reverting;
+    # returns the encoded positions of the written voxels
+    changed = np.empty(end - start, dtype='int64')
+    for i in range(end - start):
+        j = end - 1 - i if reverse else start + i
+        voxels[chunk_indices[j], voxel_indices[j]] = ids[j]
+        changed[i] = encode_location(chunk_indices[j], voxel_indices[j])
+    return changed
+
+
+@njit(cache=True)
+def xor_edits(dense, slots, chunk_indices, voxel_indices, olds, news, start, end):
+    # folds the edits of the chunks that have a slot (row in dense) into their deltas
+    for i in range(start, end):
+        slot = slots[chunk_indices[i]]
+        if slot != -1:
+            dense[slot, voxel_indices[i]] ^= olds[i] ^ news[i]
+
+
+@njit(cache=True)
+def rle_encode(values):
+    runs = np.empty(len(values), dtype='uint32')
+    num_runs = 0
+    i = 0
+    while i < len(values):
+        value = values[i]
+        j = i + 1
+        while j < len(values) and values[j] == value:
+            j += 1
+        runs[num_runs] = ((j - i) << 8) | value
+        num_runs += 1
+        i = j
+    return runs[:num_runs].copy()
+
+
+@njit(cache=True)
+def rle_decode(runs, values):
+    i = 0
+    for run in runs:
+        length = run >> 8
+        values[i:i + length] = run & 0xFF
+        i += length
+
+
+@njit(cache=True)
+def rle_xor(runs, voxels, chunk_index):
+    # applies a delta to the voxels of one chunk; returns the encoded positions it changed
+    changed = np.empty(len(voxels), dtype='int64')
+    count = 0
+    i = 0
+    for run in runs:
+        length, value = run >> 8, run & 0xFF
+        if value:
+            for voxel_index in range(i, i + length):
+                voxels[voxel_index] ^= value
+                changed[count] = encode_location(chunk_index, voxel_index)
+                count += 1
+        i += length
+    return changed[:count]
+
+
+class EditJournal:
+    def __init__(self, world, capacity=JOURNAL_CAPACITY, max_undo_steps=MAX_UNDO_STEPS):
+        self.world = world
+        self.capacity = capacity
+        self.max_undo_steps = max_undo_steps
+
+        # one entry per changed voxel, in edit order; uint16 chunk indices cap the world at 65536 chunks
+        self.chunk_indices = np.empty(capacity, dtype='uint16')
+        self.voxel_indices = np.empty(capacity, dtype='uint32')
+        self.old_ids = np.empty(capacity, dtype='uint8')
+        self.new_ids = np.empty(capacity, dtype='uint8')
+        self.num_edits = 0
+
+        # operation i covers the entries [op_ends[i - 1], op_ends[i]); the first `cursor`
+        # operations are applied, the rest can be redone
+        self.op_ends = []
+        self.cursor = 0
+
+        # chunk index -> RLE runs of the XOR delta of the compacted operations
+        self.deltas = {}
+
+    def get_op_bounds(self, op_index):
+        start = self.op_ends[op_index - 1] if op_index else 0
+        return start, self.op_ends[op_index]
+
+    def get_applied_end(self):
+        return self.op_ends[self.cursor - 1] if self.cursor else 0
+
+    def get_nbytes(self):
+        # memory held by the journal: entry arrays and compacted deltas
+        arrays = self.chunk_indices, self.voxel_indices, self.old_ids, self.new_ids
+        return sum(array.nbytes for array in arrays) + sum(runs.nbytes for runs in self.deltas.values())
+
+    def reserve(self, num_edits):
+        if num_edits <= len(self.old_ids):
+            return
+        size = max(num_edits, 2 * len(self.old_ids))
+        for name in ('chunk_indices', 'voxel_indices', 'old_ids', 'new_ids'):
+            array = getattr(self, name)
+            grown = np.empty(size, dtype=array.dtype)
+            grown[:self.num_edits] = array[:self.num_edits]
+            setattr(self, name, grown)
+
+    def record(self, changed, old_ids, merge=False):
+        # call right after the voxels at the encoded positions changed from old_ids;
+        # a new operation drops the redo history, merge adds the edits to the last applied
+        # one instead of making them an undo step of their own
+        del self.op_ends[self.cursor:]
+        start = self.get_applied_end()
+        self.num_edits = start + len(changed)
+        self.reserve(self.num_edits)
+        record_edits(self.world.voxels, changed, old_ids, self.chunk_indices, self.voxel_indices,
+                     self.old_ids, self.new_ids, start)
+        if merge and self.cursor:
+            self.op_ends[-1] = self.num_edits
+        else:
+            self.op_ends.append(self.num_edits)
+            self.cursor += 1
+
+        if self.num_edits > self.capacity or len(self.op_ends) > self.max_undo_steps:
+            self.compact()
+
+    def compact(self):
+        # folds the oldest operations into the deltas until half the capacity and undo steps are left
+        num_ops = 0
+        while num_ops < self.cursor and (
+                self.num_edits - self.get_op_bounds(num_ops)[0] > self.capacity // 2 or
+                len(self.op_ends) - num_ops > self.max_undo_steps // 2):
+            num_ops += 1
+        if not num_ops:
+            return
+
+        end = self.op_ends[num_ops - 1]
+        self.deltas = self.fold(self.deltas, end)
+
+        remaining = self.num_edits - end
+        for array in (self.chunk_indices, self.voxel_indices, self.old_ids, self.new_ids):
+            array[:remaining] = array[end:self.num_edits]
+        self.num_edits = remaining
+        self.op_ends = [op_end - end for op_end in self.op_ends[num_ops:]]
+        self.cursor -= num_ops
+
+    def fold(self, deltas, end):
+        # deltas with the entries [0, end) folded in, as a new dict
+        chunks = np.union1d(np.fromiter(deltas, dtype='int64', count=len(deltas)), self.chunk_indices[:end])
+        slots = np.full(WORLD_VOL, -1, dtype='int32')
+        folded = {}
+
+        for i in range(0, len(chunks), FOLD_BATCH):
+            batch = chunks[i:i + FOLD_BATCH]
+            dense = np.zeros([len(batch), CHUNK_VOL], dtype='uint8')
+            for slot, chunk_index in enumerate(batch):
+                if chunk_index in deltas:
+                    rle_decode(deltas[chunk_index], dense[slot])
+            slots[:] = -1
+            slots[batch] = np.arange(len(batch))
+
+            xor_edits(dense, slots, self.chunk_indices, self.voxel_indices, self.old_ids, self.new_ids, 0, end)
+            for slot, chunk_index in enumerate(batch):
+                # edits that cancel out leave no delta
+                if dense[slot].any():
+                    folded[int(chunk_index)] = rle_encode(dense[slot])
+        return folded
+
+    def undo(self):
+        # reverts the last applied operation; returns the encoded positions it changed
+        if not self.cursor:
+            return np.empty(0, dtype='int64')
+        self.cursor -= 1
+        start, end = self.get_op_bounds(self.cursor)
+        return replay_edits(self.world.voxels, self.chunk_indices, self.voxel_indices, self.old_ids,
+                            start, end, True)
+
+    def redo(self):
+        if self.cursor == len(self.op_ends):
+            return np.empty(0, dtype='int64')
+        start, end = self.get_op_bounds(self.cursor)
+        self.cursor += 1
+        return replay_edits(self.world.voxels, self.chunk_indices, self.voxel_indices, self.new_ids,
+                            start, end, False)
+
+    def get_changes(self):
+        # changes since generation: chunk index -> RLE runs of the XOR delta, undone operations excluded
+        return self.fold(self.deltas, self.get_applied_end())
+
+    def merge_deltas(self, changes):
+        # adds loaded changes to the compacted base, so later exports keep them
+        for chunk_index, runs in changes.items():
+            if chunk_index in self.deltas:
+                dense, other = np.zeros(CHUNK_VOL, dtype='uint8'), np.zeros(CHUNK_VOL, dtype='uint8')
+                rle_decode(self.deltas[chunk_index], dense)
+                rle_decode(runs, other)
+                dense ^= other
+                if dense.any():
+                    self.deltas[chunk_index] = rle_encode(dense)
+                else:
+                    del self.deltas[chunk_index]
+            else:
+                self.deltas[chunk_index] = runs
+
+    def save_changes(self, path):
+        changes = self.get_changes()
+        chunk_indices = np.array(sorted(changes), dtype='int64')
+        runs = [changes[chunk_index] for chunk_index in chunk_indices]
+        np.savez(
+            path,
+            world_key=get_world_key(),
+            chunk_indices=chunk_indices,
+            offsets=np.cumsum([0] + [len(chunk_runs) for chunk_runs in runs]),
+            runs=np.concatenate(runs) if runs else np.empty(0, dtype='uint32'),
+        )
+        return changes
+
+
+def get_world_key():
+    # deltas only make sense on top of the same generated world
+    return np.array([SEED, CHUNK_SIZE, WORLD_W, WORLD_H, WORLD_D], dtype='int64')
+
+
+def load_changes(path):
+    with np.load(path) as data:
+        if not np.array_equal(data['world_key'], get_world_key()):
+            raise ValueError(f'{path} was saved for a different seed or world size')
+        offsets, runs = data['offsets'], data['runs']
+        return {
+            int(chunk_index): runs[offsets[i]:offsets[i + 1]]
+            for i, chunk_index in enumerate(data['chunk_indices'])
+        }
@@ -0,0 +1,345 @@
+from settings import *
+
+# Light is stored per voxel in World.light, parallel to World.voxels: one byte per voxel
+# holding two 4-bit channels, sunlight in the high nibble and block light in the low one.
+# Both channels spread with BFS flood fills over world voxel coordinates, so they cross
+# chunk borders freely; edits un-propagate and re-propagate only the affected region.
+
+# voxel id -> block light it emits, no block emits light yet
+LIGHT_EMISSION = np.zeros(256, dtype='uint8')
+
+
+@njit(cache=True)
+def get_location(wx, wy, wz):
+    # world voxel -> chunk index, voxel index; chunk index is -1 outside the world
+    if not (0 <= wx < WORLD_X and 0 <= wy < WORLD_Y and 0 <= wz < WORLD_Z):
+        return -1, 0
+    chunk_index = wx // CHUNK_SIZE + WORLD_W * (wz // CHUNK_SIZE) + WORLD_AREA * (wy // CHUNK_SIZE)
+    voxel_index = wx % CHUNK_SIZE + CHUNK_SIZE * (wz % CHUNK_SIZE) + CHUNK_AREA * (wy % CHUNK_SIZE)
+    return chunk_index, voxel_index
+
+
+@njit(cache=True)
+def encode(wx, wy, wz):
+    return wx + WORLD_X * (wz + WORLD_Z * wy)
+
+
+@njit(cache=True)
+def encode_location(chunk_index, voxel_index):
+    # chunk index, voxel index -> encoded world voxel position
+    wx = chunk_index % WORLD_W * CHUNK_SIZE + voxel_index % CHUNK_SIZE
+    wz = chunk_index // WORLD_W % WORLD_D * CHUNK_SIZE + voxel_index // CHUNK_SIZE % CHUNK_SIZE
+    wy = chunk_index // WORLD_AREA * CHUNK_SIZE + voxel_index // CHUNK_AREA
+    return encode(wx, wy, wz)
+
+
+@njit(cache=True)
+def decode(pos):
+    return pos % WORLD_X, pos // (WORLD_X * WORLD_Z), pos // WORLD_X % WORLD_Z
+
+
+@njit(cache=True)
+def push(queue, head, tail, value):
+    # FIFO in a flat array: compacts or doubles it when the end is reached
+    if tail == len(queue):
+        size = tail - head
+        if head < size:
+            grown = np.empty(2 * len(queue), dtype=queue.dtype)
+            grown[:size] = queue[head:tail]
+            queue = grown
+        else:
+            queue[:size] = queue[head:tail]
+        head, tail = 0, size
+    queue[tail] = value
+    return queue, head, tail + 1
+
+
+@njit(cache=True)
+def mark_dirty(dirty, wx, wy, wz):
+    # faces sample the light of the voxel in front of them, so a changed voxel on
+    # a chunk border also affects the mesh of the neighbouring chunk
+    cx, cy, cz = wx // CHUNK_SIZE, wy // CHUNK_SIZE, wz // CHUNK_SIZE
+    lx, ly, lz = wx % CHUNK_SIZE, wy % CHUNK_SIZE, wz % CHUNK_SIZE
+    chunk_index = cx + WORLD_W * cz + WORLD_AREA * cy
+    dirty[chunk_index] = 1
+
+    if lx == 0 and cx > 0:
+        dirty[chunk_index - 1] = 1
+    elif lx == CHUNK_SIZE - 1 and cx < WORLD_W - 1:
+        dirty[chunk_index + 1] = 1
+    if lz == 0 and cz > 0:
+        dirty[chunk_index - WORLD_W] = 1
+    elif lz == CHUNK_SIZE - 1 and cz < WORLD_D - 1:
+        dirty[chunk_index + WORLD_W] = 1
+    if ly == 0 and cy > 0:
+        dirty[chunk_index - WORLD_AREA] = 1
+    elif ly == CHUNK_SIZE - 1 and cy < WORLD_H - 1:
+        dirty[chunk_index + WORLD_AREA] = 1
+
+
+@njit(cache=True)
+def get_level(light, chunk_index, voxel_index, shift):
+    return (np.int64(light[chunk_index, voxel_index]) >> shift) & MAX_LIGHT
+
+
+@njit(cache=True)
+def set_level(light, chunk_index, voxel_index, shift, level):
+    keep = 0xFF ^ (MAX_LIGHT << shift)
+    light[chunk_index, voxel_index] = (np.int64(light[chunk_index, voxel_index]) & keep) | (level << shift)
+
+
+@njit(cache=True)
+def propagate(voxels, light, queue, head, tail, shift, dirty):
+    # spreads light from the queued voxels into transparent neighbours, one level less per step;
+    # full sunlight travels straight down without losing strength
+    while head < tail:
+        wx, wy, wz = decode(queue[head])
+        head += 1
+        chunk_index, voxel_index = get_location(wx, wy, wz)
+        level = get_level(light, chunk_index, voxel_index, shift)
+        if level <= 1:
+            continue
+
+        for face_id in range(6):
+            dx, dy, dz = FACE_NORMALS[face_id]
+            nx, ny, nz = wx + dx, wy + dy, wz + dz
+            n_chunk_index, n_voxel_index = get_location(nx, ny, nz)
+            if n_chunk_index == -1 or voxels[n_chunk_index, n_voxel_index]:
+                continue
+
+            new_level = level - 1
+            if shift == SUN_SHIFT and face_id == 1 and level == MAX_LIGHT:
+                new_level = MAX_LIGHT
+            if get_level(light, n_chunk_index, n_voxel_index, shift) >= new_level:
+                continue
+
+            set_level(light, n_chunk_index, n_voxel_index, shift, new_level)
+            mark_dirty(dirty, nx, ny, nz)
+            queue, head, tail = push(queue, head, tail, encode(nx, ny, nz))
+    return queue
+
+
+@njit(cache=True)
+def unpropagate(voxels, light, removal, removal_tail, shift, emission, dirty):
+    # clears the light that depended on the queued (position << 4 | old level) entries and
+    # returns the queue of surviving boundary voxels that must propagate again
+    queue = np.empty(1024, dtype='int64')
+    head, tail = 0, 0
+    removal_head = 0
+
+    while removal_head < removal_tail:
+        entry = removal[removal_head]
+        removal_head += 1
+        wx, wy, wz = decode(entry >> 4)
+        level = entry & MAX_LIGHT
+
+        for face_id in range(6):
+            dx, dy, dz = FACE_NORMALS[face_id]
+            nx, ny, nz = wx + dx, wy + dy, wz + dz
+            n_chunk_index, n_voxel_index = get_location(nx, ny, nz)
+            if n_chunk_index == -1:
+                continue
+            n_level = get_level(light, n_chunk_index, n_voxel_index, shift)
+            if not n_level:
+                continue
+
+            is_source = shift == BLOCK_SHIFT and emission[voxels[n_chunk_index, n_voxel_index]] > 0
+            is_sun_column = shift == SUN_SHIFT and face_id == 1 and level == MAX_LIGHT
+            if not is_source and (n_level < level or is_sun_column):
+                set_level(light, n_chunk_index, n_voxel_index, shift, 0)
+                mark_dirty(dirty, nx, ny, nz)
+                removal, removal_head, removal_tail = push(
+                    removal, removal_head, removal_tail, (encode(nx, ny, nz) << 4) | n_level
+                )
+            else:
+                queue, head, tail = push(queue, head, tail, encode(nx, ny, nz))
+    return queue, head, tail
+
+
+@njit(cache=True)
+def update_channel(voxels, light, changed, shift, emission, dirty):
+    # changed holds the encoded positions of voxels that were just placed or removed
+    removal = np.empty(max(256, 2 * len(changed)), dtype='int64')
+    removal_tail = 0
+    for pos in changed:
+        wx, wy, wz = decode(pos)
+        chunk_index, voxel_index = get_location(wx, wy, wz)
+        # the faces around an edited voxel change even if its light does not
+        mark_dirty(dirty, wx, wy, wz)
+        old_level = get_level(light, chunk_index, voxel_index, shift)
+        if old_level:
+            set_level(light, chunk_index, voxel_index, shift, 0)
+            removal[removal_tail] = (pos << 4) | old_level
+            removal_tail += 1
+
+    queue, head, tail = unpropagate(voxels, light, removal, removal_tail, shift, emission, dirty)
+
+    for pos in changed:
+        wx, wy, wz = decode(pos)
+        chunk_index, voxel_index = get_location(wx, wy, wz)
+        new_id = voxels[chunk_index, voxel_index]
+        if new_id:
+            # placed a block: it blocks light, and may emit its own
+            source_level = emission[new_id] if shift == BLOCK_SHIFT else 0
+            if source_level:
+                set_level(light, chunk_index, voxel_index, shift, source_level)
+                queue, head, tail = push(queue, head, tail, pos)
+        else:
+            # removed a block: lit neighbours flow into the new gap
+            for face_id in range(6):
+                dx, dy, dz = FACE_NORMALS[face_id]
+                n_chunk_index, n_voxel_index = get_location(wx + dx, wy + dy, wz + dz)
+                if n_chunk_index != -1 and get_level(light, n_chunk_index, n_voxel_index, shift):
+                    queue, head, tail = push(queue, head, tail, encode(wx + dx, wy + dy, wz + dz))
+
+    propagate(voxels, light, queue, head, tail, shift, dirty)
+
+
+@njit(cache=True)
+def update_light(voxels, light, changed, emission, dirty):
+    update_channel(voxels, light, changed, SUN_SHIFT, emission, dirty)
+    update_channel(voxels, light, changed, BLOCK_SHIFT, emission, dirty)
+
+
+@njit(cache=True)
+def build_sunlight(voxels, light, dirty):
+    # full sunlight down every column to the first solid voxel
+    heights = np.zeros((WORLD_X, WORLD_Z), dtype='int32')
+    for x in range(WORLD_X):
+        for z in range(WORLD_Z):
+            y = WORLD_Y - 1
+            while y >= 0:
+                chunk_index, voxel_index = get_location(x, y, z)
+                if voxels[chunk_index, voxel_index]:
+                    break
+                set_level(light, chunk_index, voxel_index, SUN_SHIFT, MAX_LIGHT)
+                y -= 1
+            heights[x, z] = y + 1
+
+    # only the lit voxels facing a taller neighbour column can spread light sideways
+    queue = np.empty(1 << 16, dtype='int64')
+    head, tail = 0, 0
+    for x in range(WORLD_X):
+        for z in range(WORLD_Z):
+            top = heights[x, z]
+            if x > 0:
+                top = max(top, heights[x - 1, z])
+            if x < WORLD_X - 1:
+                top = max(top, heights[x + 1, z])
+            if z > 0:
+                top = max(top, heights[x, z - 1])
+            if z < WORLD_Z - 1:
+                top = max(top, heights[x, z + 1])
+
+            for y in range(heights[x, z], top):
+                queue, head, tail = push(queue, head, tail, encode(x, y, z))
+
+    propagate(voxels, light, queue, head, tail, SUN_SHIFT, dirty)
+
+
+@njit(cache=True)
+def build_block_light(voxels, light, emission, dirty):
+    queue = np.empty(1024, dtype='int64')
+    head, tail = 0, 0
+    for chunk_index in range(WORLD_VOL):
+        cx = chunk_index % WORLD_W
+        cz = chunk_index // WORLD_W % WORLD_D
+        cy = chunk_index // WORLD_AREA
+        for voxel_index in range(CHUNK_VOL):
+            level = emission[voxels[chunk_index, voxel_index]]
+            if not level:
+                continue
+            set_level(light, chunk_index, voxel_index, BLOCK_SHIFT, level)
+            x = voxel_index % CHUNK_SIZE + cx * CHUNK_SIZE
+            z = voxel_index // CHUNK_SIZE % CHUNK_SIZE + cz * CHUNK_SIZE
+            y = voxel_index // CHUNK_AREA + cy * CHUNK_SIZE
+            queue, head, tail = push(queue, head, tail, encode(x, y, z))
+
+    propagate(voxels, light, queue, head, tail, BLOCK_SHIFT, dirty)
+
+
+@njit(cache=True)
+def build_column_light(voxels, light, column, emission, dirty):
+    # build_sunlight and build_block_light for one column of chunks (x + WORLD_W * z), once it
+    # and its neighbouring columns are generated. Light spreads from every column in turn and
+    # the flood fills keep the brightest level whatever the order, so lighting all columns
+    # ends where build_light does
+    ox, oz = column % WORLD_W * CHUNK_SIZE, column // WORLD_W * CHUNK_SIZE
+    # heights of the column's voxel columns and the ring around them, 0 outside the world
+    heights = np.zeros((CHUNK_SIZE + 2, CHUNK_SIZE + 2), dtype='int32')
+    for px in range(CHUNK_SIZE + 2):
+        for pz in range(CHUNK_SIZE + 2):
+            x, z = ox + px - 1, oz + pz - 1
+            if not (0 <= x < WORLD_X and 0 <= z < WORLD_Z):
+                continue
+            is_inside = 0 < px <= CHUNK_SIZE and 0 < pz <= CHUNK_SIZE
+            y = WORLD_Y - 1
+            while y >= 0:
+                chunk_index, voxel_index = get_location(x, y, z)
+                if voxels[chunk_index, voxel_index]:
+                    break
+                # no mesh has sampled this column yet, so the fill marks nothing dirty
+                if is_inside:
+                    set_level(light, chunk_index, voxel_index, SUN_SHIFT, MAX_LIGHT)
+                y -= 1
+            heights[px, pz] = y + 1
+
+    queue = np.empty(1 << 12, dtype='int64')
+    head, tail = 0, 0
+    for px in range(1, CHUNK_SIZE + 1):
+        for pz in range(1, CHUNK_SIZE + 1):
+            top = max(heights[px, pz], heights[px - 1, pz], heights[px + 1, pz],
+                      heights[px, pz - 1], heights[px, pz + 1])
+            for y in range(heights[px, pz], top):
+                queue, head, tail = push(queue, head, tail, encode(ox + px - 1, y, oz + pz - 1))
+    queue = propagate(voxels, light, queue, head, tail, SUN_SHIFT, dirty)
+
+    head, tail = 0, 0
+    for cy in range(WORLD_H):
+        chunk_index = column + WORLD_AREA * cy
+        for voxel_index in range(CHUNK_VOL):
+            level = emission[voxels[chunk_index, voxel_index]]
+            if not level:
+                continue
+            set_level(light, chunk_index, voxel_index, BLOCK_SHIFT, level)
+            x = voxel_index % CHUNK_SIZE + ox
+            z = voxel_index // CHUNK_SIZE % CHUNK_SIZE + oz
+            y = voxel_index // CHUNK_AREA + cy * CHUNK_SIZE
+            queue, head, tail = push(queue, head, tail, encode(x, y, z))
+    propagate(voxels, light, queue, head, tail, BLOCK_SHIFT, dirty)
+
+
+class LightEngine:
+    def __init__(self, world):
+        self.world = world
+        self.emission = LIGHT_EMISSION
+        # chunks whose light changed since the last call, their meshes need a rebuild
+        self.dirty = np.zeros(WORLD_VOL, dtype='uint8')
+
+    def build_light(self):
+        light = self.world.light
+        light[:] = 0
+        build_sunlight(self.world.voxels, light, self.dirty)
+        build_block_light(self.world.voxels, light, self.emission, self.dirty)
+        self.dirty[:] = 0
+
+    def build_column(self, column):
+        # lights one column of chunks, see build_column_light; returns the indices of the
+        # chunks whose light changed
+        build_column_light(self.world.voxels, self.world.light, column, self.emission, self.dirty)
+        return self.pop_dirty_chunks()
+
+    def update_voxel(self, world_pos):
+        wx, wy, wz = (int(value) for value in world_pos)
+        return self.update_voxels(np.array([encode(wx, wy, wz)], dtype='int64'))
+
+    def update_voxels(self, changed):
+        # call after the voxels at the encoded positions changed; returns the indices of the
+        # chunks to remesh: the edited ones, their border neighbours and those with changed light
+        update_light(self.world.voxels, self.world.light, changed, self.emission, self.dirty)
+        return self.pop_dirty_chunks()
+
+    def pop_dirty_chunks(self):
+        indices = np.flatnonzero(self.dirty)
+        self.dirty[indices] = 0
+        return indices.tolist()
@@ -5,7 +5,13 @@ import sys
 from shader_program import ShaderProgram
 from scene import Scene
 from player import Player
-# from textures import Textures  # COMMENTED OUT - Texture system disabled
+from profiler import startup_profiler, frame_profiler
+from textures import Textures
+from replay import LiveInput, get_record_path
+from pregen import pregenerated_world
+from mesh_residency import residency_config
+from scheduler import loading_config
+from replica import replica_config
 
 
 class VoxelEngine:
@@ -23,30 +29,43 @@ class VoxelEngine:
         self.ctx.enable(flags=mgl.DEPTH_TEST | mgl.CULL_FACE | mgl.BLEND)
         self.ctx.gc_mode = 'auto'
 
+        # pygame input, recorded with --record=session.npz (see replay.py)
+        self.input = LiveInput()
         self.clock = pg.time.Clock()
         self.delta_time = 0
         self.time = 0
+        self.hud_update_time = 0
 
         pg.event.set_grab(True)
         pg.mouse.set_visible(False)
 
         self.is_running = True
+        self.is_loading = True
         self.on_init()
 
+    @startup_profiler.phase('engine.on_init')
     def on_init(self):
-        # self.textures = Textures(self)  # COMMENTED OUT - Texture system disabled
+        self.textures = Textures(self)
         self.player = Player(self)
         self.shader_program = ShaderProgram(self)
         self.scene = Scene(self)
 
     def update(self):
-        self.player.update()
+        with frame_profiler.section('player'):
+            self.player.update()
         self.shader_program.update()
         self.scene.update()
 
         self.delta_time = self.clock.tick()
-        self.time = pg.time.get_ticks() * 0.001
-        
+        ticks = pg.time.get_ticks()
+        self.time = ticks * 0.001
+
+        # el caption se reconstruye solo unas veces por segundo
+        if ticks - self.hud_update_time >= HUD_UPDATE_INTERVAL:
+            self.hud_update_time = ticks
+            self.update_hud()
+
+    def update_hud(self):
         # Mostrar FPS y información del jugador
         fps = self.clock.get_fps()
         mode = "Creative" if self.player.creative_mode else "Survival"
@@ -54,33 +73,74 @@ class VoxelEngine:
         feet_y = f"{self.player.feet_position.y:.1f}"
         velocity_y = f"{self.player.velocity.y:.3f}"
         max_jump = f"{self.player.max_jump_height:.2f}"
-        
-        # Detectar si está corriendo
-        key_state = pg.key.get_pressed()
-        sprint_status = " [Sprint]" if key_state[pg.K_LCTRL] else ""
-        
-        pg.display.set_caption(f'FPS: {fps:.0f} | {mode}{sprint_status} | {on_ground} | Y: {feet_y} | Vel Y: {velocity_y} | Max Jump: {max_jump}')
+        sprint_status = " [Sprint]" if self.player.is_sprinting else ""
+        profiler_status = ''
+        if frame_profiler.show_overlay:
+            profiler_status = (frame_profiler.get_overlay_text() + self.shader_program.uniforms.get_overlay_text()
+                               + self.scene.world.scheduler.get_overlay_text()
+                               + self.scene.world.mesh_residency.get_overlay_text())
+            if self.scene.world.replica is not None:
+                profiler_status += self.scene.world.replica.get_overlay_text()
+
+        pg.display.set_caption(f'FPS: {fps:.0f} | {mode}{sprint_status} | {on_ground} | Y: {feet_y} | Vel Y: {velocity_y} | Max Jump: {max_jump}{profiler_status}')
 
     def render(self):
         self.ctx.clear(color=BG_COLOR)
         self.scene.render()
-        pg.display.flip()
+        with frame_profiler.section('flip'):
+            pg.display.flip()
+
+    def report_loading(self):
+        # time to first frame and to interactive (the player spawned), reported with the startup
+        # profile once the whole world is loaded
+        world = self.scene.world
+        startup_profiler.mark('first_frame')
+        if world.is_spawned:
+            startup_profiler.mark('interactive')
+        if world.is_loaded:
+            startup_profiler.mark('world_loaded')
+            print(f'Startup: {startup_profiler.get_milestone_text()}')
+            startup_profiler.report()
+            self.is_loading = False
 
     def handle_events(self):
-        for event in pg.event.get():
+        for event in self.input.get_events():
             if event.type == pg.QUIT or (event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE):
                 self.is_running = False
+            # F3: overlay del perfilador de frames en el caption
+            if event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                frame_profiler.toggle_overlay()
             self.player.handle_event(event=event)
 
     def run(self):
         while self.is_running:
-            self.handle_events()
+            frame_profiler.begin_frame()
+            self.input.begin_frame(self)
+            with frame_profiler.section('events'):
+                self.handle_events()
             self.update()
             self.render()
+            frame_profiler.end_frame()
+            if self.is_loading:
+                self.report_loading()
+            self.shader_program.uniforms.end_frame()
+        self.input.save(self)
+        self.scene.world.close()
         pg.quit()
         sys.exit()
 
 
 if __name__ == '__main__':
+    startup_profiler.configure(sys.argv[1:])
+    frame_profiler.configure(sys.argv[1:])
+    pregenerated_world.configure(sys.argv[1:])
+    residency_config.configure(sys.argv[1:])
+    loading_config.configure(sys.argv[1:])
+    replica_config.configure(sys.argv[1:])
+    # replays load the world before the first frame, a session that spawned later can't be replayed
+    if get_record_path(sys.argv[1:]) and (loading_config.progressive or replica_config.address):
+        sys.exit('--record needs the blocking startup of a local world, '
+                 'drop --progressive-startup and --server to record')
     app = VoxelEngine()
+    app.input.configure(sys.argv[1:])
     app.run()
@@ -0,0 +1,132 @@
+from settings import *
+from collections import OrderedDict
+import zlib
+from scheduler import MESH
+
+# Chunk meshes on the GPU within a byte budget. Every rendered chunk marks its mesh as seen;
+# after the frame the meshes seen longest ago are evicted until the uploaded bytes fit the
+# budget again, never one drawn this frame. An evicted mesh's vertices are read back and kept
+# as a zlib blob, so it is uploaded again as soon as it is in view; without blobs (or once an
+# edit made the blob stale) the chunk is meshed again through the scheduler. Water meshes count
+# against the budget but are never evicted: the flow rebuilds them every few ticks, so a blob
+# would be stale before it was read back.
+#   python main.py --vram-budget=64      # MiB, or VOXEL_VRAM_BUDGET=64
+#   python main.py --discard-evicted     # or VOXEL_DISCARD_EVICTED=1
+VRAM_BUDGET_ENV = 'VOXEL_VRAM_BUDGET'
+VRAM_BUDGET_FLAG = '--vram-budget'
+DISCARD_EVICTED_ENV = 'VOXEL_DISCARD_EVICTED'
+DISCARD_EVICTED_FLAG = '--discard-evicted'
+
+
+class ResidencyConfig:
+    def __init__(self):
+        self.budget = MESH_VRAM_BUDGET
+        self.keep_evicted = MESH_KEEP_EVICTED
+
+    def configure(self, argv=()):
+        budget = os.environ.get(VRAM_BUDGET_ENV)
+        discard = os.environ.get(DISCARD_EVICTED_ENV, '0') != '0'
+        for arg in argv:
+            if arg.startswith(VRAM_BUDGET_FLAG + '='):
+                budget = arg.split('=', 1)[1]
+            elif arg == DISCARD_EVICTED_FLAG:
+                discard = True
+        if budget:
+            self.budget = int(float(budget) * (1 << 20))
+        self.keep_evicted = self.keep_evicted and not discard
+
+
+class MeshResidency:
+    def __init__(self, world, budget=None, keep_evicted=None):
+        self.world = world
+        self.budget = residency_config.budget if budget is None else budget
+        self.keep_evicted = residency_config.keep_evicted if keep_evicted is None else keep_evicted
+        # chunk index -> uploaded ChunkMesh, least recently seen first
+        self.resident = OrderedDict()
+        self.frame = 0
+
+        self.resident_bytes = 0
+        self.water_bytes = 0
+        self.blob_bytes = 0
+        self.evictions = 0
+        self.reuploads = 0
+        self.remeshes = 0
+
+    def add(self, mesh):
+        # call after the mesh uploaded new vertices; meshes not seen yet go first in line,
+        # the scheduler uploads the farthest ones last
+        self.remove(mesh)
+        if mesh.vbo is None:
+            return
+        mesh.nbytes = mesh.vbo.size
+        self.resident_bytes += mesh.nbytes
+        self.resident[mesh.chunk.index] = mesh
+        self.resident.move_to_end(mesh.chunk.index, last=False)
+
+    def remove(self, mesh):
+        if self.resident.pop(mesh.chunk.index, None) is not None:
+            self.resident_bytes -= mesh.nbytes
+        if mesh.blob is not None:
+            self.blob_bytes -= len(mesh.blob)
+            mesh.blob = None
+
+    def add_water(self, mesh):
+        # call after a WaterMesh uploaded new vertices
+        self.water_bytes -= mesh.nbytes
+        mesh.nbytes = 0 if mesh.vbo is None else mesh.vbo.size
+        self.water_bytes += mesh.nbytes
+
+    def touch(self, mesh):
+        # the mesh is drawn this frame
+        mesh.last_seen = self.frame
+        self.resident.move_to_end(mesh.chunk.index)
+
+    def restore(self, mesh):
+        # an evicted mesh came into view
+        if mesh.blob is not None:
+            vertex_data = np.frombuffer(zlib.decompress(mesh.blob), dtype='uint32')
+            mesh.upload(vertex_data)
+            self.reuploads += 1
+        else:
+            # the scheduler's upload job brings it back
+            self.world.scheduler.add(MESH, mesh.chunk.index)
+            self.remeshes += 1
+            mesh.is_evicted = False
+
+    def evict(self, mesh):
+        blob = zlib.compress(mesh.vbo.read(), MESH_BLOB_LEVEL) if self.keep_evicted else None
+        self.remove(mesh)
+        mesh.release()
+        mesh.blob, mesh.is_evicted = blob, True
+        if blob is not None:
+            self.blob_bytes += len(blob)
+        self.evictions += 1
+
+    def end_frame(self):
+        # call after the chunks are drawn
+        while self.resident and self.resident_bytes + self.water_bytes > self.budget:
+            mesh = next(iter(self.resident.values()))
+            if mesh.last_seen == self.frame:
+                break
+            self.evict(mesh)
+        self.frame += 1
+
+    def get_metrics(self):
+        return {
+            'budget_bytes': self.budget,
+            'resident_bytes': self.resident_bytes,
+            'resident_meshes': len(self.resident),
+            'water_bytes': self.water_bytes,
+            'blob_bytes': self.blob_bytes,
+            'evictions': self.evictions,
+            'reuploads': self.reuploads,
+            'remeshes': self.remeshes,
+        }
+
+    def get_overlay_text(self):
+        return (f' | meshes {(self.resident_bytes + self.water_bytes) / (1 << 20):.0f}/{self.budget / (1 << 20):.0f} MiB'
+                f' {self.evictions} evicted {self.reuploads} reuploaded')
+
+
+residency_config = ResidencyConfig()
+residency_config.configure()
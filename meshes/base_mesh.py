@@ -11,18 +11,36 @@ class BaseMesh:
         self.vbo_format = None
         # attribute names according to the format: ("in_position", "in_color")
         self.attrs: tuple[str, ...] = None
-        # vertex array object
+        # vertex buffer and vertex array object
+        self.vbo = None
         self.vao = None
 
     def get_vertex_data(self) -> np.array: ...
 
-    def get_vao(self):
-        vertex_data = self.get_vertex_data()
-        vbo = self.ctx.buffer(vertex_data)
+    def get_vao(self, vertex_data=None):
+        # vertex_data built ahead of time (e.g. by a mesh job) is uploaded as it is
+        if vertex_data is None:
+            vertex_data = self.get_vertex_data()
+        # no faces - skip the buffer allocation entirely
+        if not len(vertex_data):
+            self.vbo = None
+            return None
+
+        # kept so release() can free it, the vao doesn't own it
+        self.vbo = self.ctx.buffer(vertex_data)
         vao = self.ctx.vertex_array(
-            self.program, [(vbo, self.vbo_format, *self.attrs)], skip_errors=True
+            self.program, [(self.vbo, self.vbo_format, *self.attrs)], skip_errors=True
         )
         return vao
 
+    def release(self):
+        # frees the GPU buffers now instead of whenever the garbage collector gets to them
+        if self.vao is not None:
+            self.vao.release()
+            self.vao = None
+        if self.vbo is not None:
+            self.vbo.release()
+            self.vbo = None
+
     def render(self):
         self.vao.render()
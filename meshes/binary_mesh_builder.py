@@ -0,0 +1,162 @@
+from settings import *
+from voxel_tree import popcount
+from meshes.chunk_mesh_builder import PLANE_X, PLANE_Y, PLANE_Z, pack_data
+
+# Binary meshing: the chunk's solidity as one uint64 per (x, z) column, bit y set for a solid
+# voxel, padded by the columns of the neighbouring chunks (the world outside counts as solid,
+# as in is_void). The voxels right above and below the chunk are kept in layers of their own,
+# so 64-voxel chunks still fit in a column. A column's exposed faces are a shift and an and-not
+# against its own bits or its neighbour's; vertices are only built for the set bits, with
+# ambient occlusion read from the same masks. The output is build_chunk_mesh's, vertex for vertex.
+# The lookups are inlined: a call that takes arrays pays for reference counting, which cost
+# more than the lookups themselves.
+
+ONE = np.uint64(1)
+FULL_COLUMN = np.uint64((1 << CHUNK_SIZE) - 1)
+PADDED_SIZE = CHUNK_SIZE + 2
+# get_column_masks layers
+COLUMNS, ABOVE, BELOW = 0, 1, 2
+
+# v0..v3 of each face in build_chunk_mesh's emission order, even then flipped
+FACE_ORDERS = np.array((
+    ((0, 3, 2, 0, 2, 1), (1, 0, 3, 1, 3, 2)),  # top
+    ((0, 2, 3, 0, 1, 2), (1, 3, 0, 1, 2, 3)),  # bottom
+    ((0, 1, 2, 0, 2, 3), (3, 0, 1, 3, 1, 2)),  # right
+    ((0, 2, 1, 0, 3, 2), (3, 1, 0, 3, 2, 1)),  # left
+    ((0, 1, 2, 0, 2, 3), (3, 0, 1, 3, 1, 2)),  # back
+    ((0, 2, 1, 0, 3, 2), (3, 1, 0, 3, 2, 1)),  # front
+), dtype='int64')
+FACE_PLANES = (PLANE_Y, PLANE_Y, PLANE_X, PLANE_X, PLANE_Z, PLANE_Z)
+# get_ao's samples a..h per plane, as offsets from the voxel in front of the face
+AO_SAMPLES = np.zeros((3, 8, 3), dtype='int64')
+AO_SAMPLES[PLANE_X] = ((0, 0, -1), (0, -1, -1), (0, -1, 0), (0, -1, 1), (0, 0, 1), (0, 1, 1), (0, 1, 0), (0, 1, -1))
+AO_SAMPLES[PLANE_Y] = ((0, 0, -1), (-1, 0, -1), (-1, 0, 0), (-1, 0, 1), (0, 0, 1), (1, 0, 1), (1, 0, 0), (1, 0, -1))
+AO_SAMPLES[PLANE_Z] = ((-1, 0, 0), (-1, -1, 0), (0, -1, 0), (1, -1, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (-1, 1, 0))
+
+
+@njit(cache=True, inline='always')
+def is_solid(world_voxels, wx, wy, wz):
+    if not (0 <= wx < WORLD_X and 0 <= wy < WORLD_Y and 0 <= wz < WORLD_Z):
+        return True
+    chunk_index = wx // CHUNK_SIZE + WORLD_W * (wz // CHUNK_SIZE) + WORLD_AREA * (wy // CHUNK_SIZE)
+    voxel_index = wx % CHUNK_SIZE + CHUNK_SIZE * (wz % CHUNK_SIZE) + CHUNK_AREA * (wy % CHUNK_SIZE)
+    return world_voxels[chunk_index, voxel_index] != 0
+
+
+@njit(cache=True, inline='always')
+def get_light(world_light, wx, wy, wz):
+    # chunk_mesh_builder.get_light, inlined into the emission loop
+    if not (0 <= wx < WORLD_X and 0 <= wy < WORLD_Y and 0 <= wz < WORLD_Z):
+        return MAX_LIGHT
+    chunk_index = wx // CHUNK_SIZE + WORLD_W * (wz // CHUNK_SIZE) + WORLD_AREA * (wy // CHUNK_SIZE)
+    voxel_index = wx % CHUNK_SIZE + CHUNK_SIZE * (wz % CHUNK_SIZE) + CHUNK_AREA * (wy % CHUNK_SIZE)
+    light = np.int64(world_light[chunk_index, voxel_index])
+    return max(light >> SUN_SHIFT, light & MAX_LIGHT)
+
+
+@njit(cache=True)
+def get_column_masks(chunk_voxels, chunk_pos, world_voxels):
+    # -> masks [layer, x + 1, z + 1] for x and z in -1..CHUNK_SIZE: the column's bits (COLUMNS)
+    # and whether the voxel right above (ABOVE) and below (BELOW) the chunk is solid
+    cx, cy, cz = chunk_pos
+    ox, oy, oz = cx * CHUNK_SIZE, cy * CHUNK_SIZE, cz * CHUNK_SIZE
+    masks = np.zeros((3, PADDED_SIZE, PADDED_SIZE), dtype=np.uint64)
+
+    # the chunk itself, a column at a time
+    for z in range(CHUNK_SIZE):
+        for x in range(CHUNK_SIZE):
+            column = np.uint64(0)
+            for y in range(CHUNK_SIZE):
+                column |= np.uint64(chunk_voxels[x + CHUNK_SIZE * z + CHUNK_AREA * y] != 0) << np.uint64(y)
+            masks[COLUMNS, x + 1, z + 1] = column
+
+    # the ring of neighbouring columns, and the layers above and below everything
+    for px in range(PADDED_SIZE):
+        for pz in range(PADDED_SIZE):
+            wx, wz = ox + px - 1, oz + pz - 1
+            if px == 0 or pz == 0 or px == PADDED_SIZE - 1 or pz == PADDED_SIZE - 1:
+                column = np.uint64(0)
+                for y in range(CHUNK_SIZE):
+                    if is_solid(world_voxels, wx, oy + y, wz):
+                        column |= ONE << np.uint64(y)
+                masks[COLUMNS, px, pz] = column
+            masks[ABOVE, px, pz] = is_solid(world_voxels, wx, oy + CHUNK_SIZE, wz)
+            masks[BELOW, px, pz] = is_solid(world_voxels, wx, oy - 1, wz)
+    return masks
+
+
+@njit(cache=True, inline='always')
+def is_masked_void(masks, x, y, z):
+    # x, y, z local to the chunk, each in -1..CHUNK_SIZE; one load whatever the layer
+    layer, shift = COLUMNS, y
+    if y == CHUNK_SIZE:
+        layer, shift = ABOVE, 0
+    elif y < 0:
+        layer, shift = BELOW, 0
+    return not masks[layer, x + 1, z + 1] >> np.uint64(shift) & ONE
+
+
+@njit(cache=True)
+def get_face_masks(masks, x, faces):
+    # faces [face_id, z]: bit y set where the voxel at (x, y, z) shows that face
+    columns = masks[COLUMNS]
+    for z in range(CHUNK_SIZE):
+        column = columns[x + 1, z + 1]
+        top = masks[ABOVE, x + 1, z + 1] << np.uint64(CHUNK_SIZE - 1)
+        faces[0, z] = column & ~(column >> ONE | top)
+        faces[1, z] = column & ~(column << ONE | masks[BELOW, x + 1, z + 1]) & FULL_COLUMN
+        faces[2, z] = column & ~columns[x + 2, z + 1]
+        faces[3, z] = column & ~columns[x, z + 1]
+        faces[4, z] = column & ~columns[x + 1, z]
+        faces[5, z] = column & ~columns[x + 1, z + 2]
+
+
+@njit(cache=True)
+def build_chunk_mesh_binary(chunk_voxels, format_size, chunk_pos, world_voxels, world_light):
+    masks = get_column_masks(chunk_voxels, chunk_pos, world_voxels)
+    cx, cy, cz = chunk_pos
+    faces = np.empty((6, CHUNK_SIZE), dtype=np.uint64)
+    vertices = np.empty(4, dtype='uint32')
+    voids = np.empty(8, dtype='int64')
+
+    # exact size from the face counts, build_chunk_mesh allocates for the worst case
+    num_faces = 0
+    for x in range(CHUNK_SIZE):
+        get_face_masks(masks, x, faces)
+        for face_id in range(6):
+            for z in range(CHUNK_SIZE):
+                num_faces += popcount(faces[face_id, z])
+    vertex_data = np.empty(num_faces * 6 * format_size, dtype='uint32')
+    index = 0
+
+    # x, y, z order like build_chunk_mesh, visiting only the rows with a visible face
+    for x in range(CHUNK_SIZE):
+        get_face_masks(masks, x, faces)
+        rows = np.uint64(0)
+        for z in range(CHUNK_SIZE):
+            for face_id in range(6):
+                rows |= faces[face_id, z]
+        for y in range(CHUNK_SIZE):
+            bit = ONE << np.uint64(y)
+            if not rows & bit:
+                continue
+            for z in range(CHUNK_SIZE):
+                for face_id in range(6):
+                    if not faces[face_id, z] & bit:
+                        continue
+                    voxel_id = chunk_voxels[x + CHUNK_SIZE * z + CHUNK_AREA * y]
+                    dx, dy, dz = FACE_NORMALS[face_id]
+                    nx, ny, nz = x + dx, y + dy, z + dz
+                    light = get_light(world_light, nx + cx * CHUNK_SIZE, ny + cy * CHUNK_SIZE, nz + cz * CHUNK_SIZE)
+                    samples = AO_SAMPLES[FACE_PLANES[face_id]]
+                    for i in range(8):
+                        voids[i] = is_masked_void(masks, nx + samples[i, 0], ny + samples[i, 1], nz + samples[i, 2])
+                    a, b, c, d, e, f, g, h = voids
+                    ao = (a + b + c), (g + h + a), (e + f + g), (c + d + e)
+                    flip_id = np.int64(ao[1] + ao[3] > ao[0] + ao[2])
+                    for corner in range(4):
+                        vertices[corner] = pack_data(x, y, z, voxel_id, light, face_id, ao[corner], flip_id)
+                    for corner in FACE_ORDERS[face_id, flip_id]:
+                        vertex_data[index] = vertices[corner]
+                        index += 1
+    return vertex_data
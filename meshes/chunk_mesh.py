@@ -1,28 +1,65 @@
+from settings import *
 from meshes.base_mesh import BaseMesh
-from meshes.chunk_mesh_builder import build_chunk_mesh
+from meshes.binary_mesh_builder import build_chunk_mesh_binary
+
+VBO_FORMAT = '1u4'
+FORMAT_SIZE = sum(int(fmt[:1]) for fmt in VBO_FORMAT.split())
+
+
+def build_vertex_data(chunk):
+    # needs no GL context, so mesh jobs build it ahead of the upload (see scheduler.py)
+    if chunk.stored_mesh is not None:
+        mesh, chunk.stored_mesh = chunk.stored_mesh, None
+        return mesh
+
+    # nothing to mesh for empty chunks or solid chunks enclosed by solid neighbours
+    if chunk.is_empty or chunk.is_sealed():
+        return np.empty(0, dtype='uint32')
+
+    mesh = build_chunk_mesh_binary(
+        chunk_voxels=chunk.voxels,
+        format_size=FORMAT_SIZE,
+        chunk_pos=chunk.position,
+        world_voxels=chunk.world.voxels,
+        world_light=chunk.world.light
+    )
+    return mesh
 
 
 class ChunkMesh(BaseMesh):
-    def __init__(self, chunk):
+    def __init__(self, chunk, vertex_data=None):
         super().__init__()
         self.app = chunk.app
         self.chunk = chunk
         self.ctx = self.app.ctx
         self.program = self.app.shader_program.chunk
 
-        self.vbo_format = '1u4'
-        self.format_size = sum(int(fmt[:1]) for fmt in self.vbo_format.split())
+        self.vbo_format = VBO_FORMAT
+        self.format_size = FORMAT_SIZE
         self.attrs = ('packed_data',)
-        self.vao = self.get_vao()
 
-    def rebuild(self):
-        self.vao = self.get_vao()
+        # GPU budget bookkeeping, see mesh_residency.py
+        self.residency = chunk.world.mesh_residency
+        self.nbytes = 0
+        self.last_seen = -1
+        self.is_evicted = False
+        # the vertices of an evicted mesh, zlib compressed
+        self.blob = None
+        self.upload(vertex_data)
+
+    def rebuild(self, vertex_data=None):
+        # an edit makes an evicted mesh's blob stale, the chunk is meshed again once it is in view
+        if self.is_evicted and vertex_data is None:
+            self.residency.remove(self)
+            return
+        self.upload(vertex_data)
+
+    def upload(self, vertex_data=None):
+        # the previous buffers are freed first, they used to linger until garbage collection
+        self.release()
+        self.is_evicted = False
+        self.vao = self.get_vao(vertex_data)
+        self.residency.add(self)
 
     def get_vertex_data(self):
-        mesh = build_chunk_mesh(
-            chunk_voxels=self.chunk.voxels,
-            format_size=self.format_size,
-            chunk_pos=self.chunk.position,
-            world_voxels=self.chunk.world.voxels
-        )
-        return mesh
+        return build_vertex_data(self.chunk)
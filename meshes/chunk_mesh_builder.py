@@ -1,13 +1,16 @@
 from settings import *
 from numba import uint8
 
+# get_ao planes, passed as ints so the kernels don't depend on unicode types
+PLANE_X, PLANE_Y, PLANE_Z = 0, 1, 2
 
-@njit
+
+@njit(cache=True)
 def get_ao(local_pos, world_pos, world_voxels, plane):
     x, y, z = local_pos
     wx, wy, wz = world_pos
 
-    if plane == 'Y':
+    if plane == PLANE_Y:
         a = is_void((x    , y, z - 1), (wx    , wy, wz - 1), world_voxels)
         b = is_void((x - 1, y, z - 1), (wx - 1, wy, wz - 1), world_voxels)
         c = is_void((x - 1, y, z    ), (wx - 1, wy, wz    ), world_voxels)
@@ -17,7 +20,7 @@ def get_ao(local_pos, world_pos, world_voxels, plane):
         g = is_void((x + 1, y, z    ), (wx + 1, wy, wz    ), world_voxels)
         h = is_void((x + 1, y, z - 1), (wx + 1, wy, wz - 1), world_voxels)
 
-    elif plane == 'X':
+    elif plane == PLANE_X:
         a = is_void((x, y    , z - 1), (wx, wy    , wz - 1), world_voxels)
         b = is_void((x, y - 1, z - 1), (wx, wy - 1, wz - 1), world_voxels)
         c = is_void((x, y - 1, z    ), (wx, wy - 1, wz    ), world_voxels)
@@ -41,30 +44,35 @@ def get_ao(local_pos, world_pos, world_voxels, plane):
     return ao
 
 
-@njit
-def pack_data(x, y, z, voxel_id, face_id, ao_id, flip_id):
-    # x: 6bit  y: 6bit  z: 6bit  voxel_id: 8bit  face_id: 3bit  ao_id: 2bit  flip_id: 1bit
-    a, b, c, d, e, f, g = x, y, z, voxel_id, face_id, ao_id, flip_id
+@njit(cache=True)
+def pack_data(x, y, z, voxel_id, light, face_id, ao_id, flip_id):
+    # x: 6bit  y: 6bit  z: 6bit  voxel_id: 4bit  light: 4bit  face_id: 3bit  ao_id: 2bit  flip_id: 1bit
+    # x, y, z are the voxel's position in the chunk rather than the vertex corner, which would
+    # need CHUNK_SIZE + 1 values: chunk.vert adds the corner from face_id, flip_id and the
+    # vertex's place in its face, so 6 bits cover chunks of up to 64 voxels
+    a, b, c, d, l, e, f, g = x, y, z, voxel_id, light, face_id, ao_id, flip_id
 
-    b_bit, c_bit, d_bit, e_bit, f_bit, g_bit = 6, 6, 8, 3, 2, 1
+    b_bit, c_bit, d_bit, l_bit, e_bit, f_bit, g_bit = 6, 6, 4, 4, 3, 2, 1
     fg_bit = f_bit + g_bit
     efg_bit = e_bit + fg_bit
-    defg_bit = d_bit + efg_bit
-    cdefg_bit = c_bit + defg_bit
-    bcdefg_bit = b_bit + cdefg_bit
+    lefg_bit = l_bit + efg_bit
+    dlefg_bit = d_bit + lefg_bit
+    cdlefg_bit = c_bit + dlefg_bit
+    bcdlefg_bit = b_bit + cdlefg_bit
 
     packed_data = (
-        a << bcdefg_bit |
-        b << cdefg_bit |
-        c << defg_bit |
-        d << efg_bit |
+        a << bcdlefg_bit |
+        b << cdlefg_bit |
+        c << dlefg_bit |
+        d << lefg_bit |
+        l << efg_bit |
         e << fg_bit |
         f << g_bit | g
     )
     return packed_data
 
 
-@njit
+@njit(cache=True)
 def get_chunk_index(world_voxel_pos):
     wx, wy, wz = world_voxel_pos
     cx = wx // CHUNK_SIZE
@@ -77,7 +85,7 @@ def get_chunk_index(world_voxel_pos):
     return index
 
 
-@njit
+@njit(cache=True)
 def is_void(local_voxel_pos, world_voxel_pos, world_voxels):
     chunk_index = get_chunk_index(world_voxel_pos)
     if chunk_index == -1:
@@ -92,7 +100,19 @@ def is_void(local_voxel_pos, world_voxel_pos, world_voxels):
     return True
 
 
-@njit
+@njit(cache=True)
+def get_light(world_voxel_pos, world_light):
+    # light level of a transparent voxel: the brighter of sunlight and block light
+    chunk_index = get_chunk_index(world_voxel_pos)
+    if chunk_index == -1:
+        return MAX_LIGHT
+
+    wx, wy, wz = world_voxel_pos
+    light = np.int64(world_light[chunk_index][wx % CHUNK_SIZE + wz % CHUNK_SIZE * CHUNK_SIZE + wy % CHUNK_SIZE * CHUNK_AREA])
+    return max(light >> SUN_SHIFT, light & MAX_LIGHT)
+
+
+@njit(cache=True)
 def add_data(vertex_data, index, *vertices):
     for vertex in vertices:
         vertex_data[index] = vertex
@@ -100,8 +120,8 @@ def add_data(vertex_data, index, *vertices):
     return index
 
 
-@njit
-def build_chunk_mesh(chunk_voxels, format_size, chunk_pos, world_voxels):
+@njit(cache=True)
+def build_chunk_mesh(chunk_voxels, format_size, chunk_pos, world_voxels, world_light):
     vertex_data = np.empty(CHUNK_VOL * 18 * format_size, dtype='uint32')
     index = 0
 
@@ -121,15 +141,17 @@ def build_chunk_mesh(chunk_voxels, format_size, chunk_pos, world_voxels):
 
                 # top face
                 if is_void((x, y + 1, z), (wx, wy + 1, wz), world_voxels):
+                    light = get_light((wx, wy + 1, wz), world_light)
                     # get ao values
-                    ao = get_ao((x, y + 1, z), (wx, wy + 1, wz), world_voxels, plane='Y')
+                    ao = get_ao((x, y + 1, z), (wx, wy + 1, wz), world_voxels, plane=PLANE_Y)
                     flip_id = ao[1] + ao[3] > ao[0] + ao[2]
 
-                    # format: x, y, z, voxel_id, face_id, ao_id, flip_id
-                    v0 = pack_data(x    , y + 1, z    , voxel_id, 0, ao[0], flip_id)
-                    v1 = pack_data(x + 1, y + 1, z    , voxel_id, 0, ao[1], flip_id)
-                    v2 = pack_data(x + 1, y + 1, z + 1, voxel_id, 0, ao[2], flip_id)
-                    v3 = pack_data(x    , y + 1, z + 1, voxel_id, 0, ao[3], flip_id)
+                    # format: x, y, z, voxel_id, light, face_id, ao_id, flip_id - the vertices differ
+                    # only in ao, the shader places each on its corner from the emission order below
+                    v0 = pack_data(x, y, z, voxel_id, light, 0, ao[0], flip_id)
+                    v1 = pack_data(x, y, z, voxel_id, light, 0, ao[1], flip_id)
+                    v2 = pack_data(x, y, z, voxel_id, light, 0, ao[2], flip_id)
+                    v3 = pack_data(x, y, z, voxel_id, light, 0, ao[3], flip_id)
 
                     if flip_id:
                         index = add_data(vertex_data, index, v1, v0, v3, v1, v3, v2)
@@ -138,13 +160,14 @@ def build_chunk_mesh(chunk_voxels, format_size, chunk_pos, world_voxels):
 
                 # bottom face
                 if is_void((x, y - 1, z), (wx, wy - 1, wz), world_voxels):
-                    ao = get_ao((x, y - 1, z), (wx, wy - 1, wz), world_voxels, plane='Y')
+                    light = get_light((wx, wy - 1, wz), world_light)
+                    ao = get_ao((x, y - 1, z), (wx, wy - 1, wz), world_voxels, plane=PLANE_Y)
                     flip_id = ao[1] + ao[3] > ao[0] + ao[2]
 
-                    v0 = pack_data(x    , y, z    , voxel_id, 1, ao[0], flip_id)
-                    v1 = pack_data(x + 1, y, z    , voxel_id, 1, ao[1], flip_id)
-                    v2 = pack_data(x + 1, y, z + 1, voxel_id, 1, ao[2], flip_id)
-                    v3 = pack_data(x    , y, z + 1, voxel_id, 1, ao[3], flip_id)
+                    v0 = pack_data(x, y, z, voxel_id, light, 1, ao[0], flip_id)
+                    v1 = pack_data(x, y, z, voxel_id, light, 1, ao[1], flip_id)
+                    v2 = pack_data(x, y, z, voxel_id, light, 1, ao[2], flip_id)
+                    v3 = pack_data(x, y, z, voxel_id, light, 1, ao[3], flip_id)
 
                     if flip_id:
                         index = add_data(vertex_data, index, v1, v3, v0, v1, v2, v3)
@@ -153,13 +176,14 @@ def build_chunk_mesh(chunk_voxels, format_size, chunk_pos, world_voxels):
 
                 # right face
                 if is_void((x + 1, y, z), (wx + 1, wy, wz), world_voxels):
-                    ao = get_ao((x + 1, y, z), (wx + 1, wy, wz), world_voxels, plane='X')
+                    light = get_light((wx + 1, wy, wz), world_light)
+                    ao = get_ao((x + 1, y, z), (wx + 1, wy, wz), world_voxels, plane=PLANE_X)
                     flip_id = ao[1] + ao[3] > ao[0] + ao[2]
 
-                    v0 = pack_data(x + 1, y    , z    , voxel_id, 2, ao[0], flip_id)
-                    v1 = pack_data(x + 1, y + 1, z    , voxel_id, 2, ao[1], flip_id)
-                    v2 = pack_data(x + 1, y + 1, z + 1, voxel_id, 2, ao[2], flip_id)
-                    v3 = pack_data(x + 1, y    , z + 1, voxel_id, 2, ao[3], flip_id)
+                    v0 = pack_data(x, y, z, voxel_id, light, 2, ao[0], flip_id)
+                    v1 = pack_data(x, y, z, voxel_id, light, 2, ao[1], flip_id)
+                    v2 = pack_data(x, y, z, voxel_id, light, 2, ao[2], flip_id)
+                    v3 = pack_data(x, y, z, voxel_id, light, 2, ao[3], flip_id)
 
                     if flip_id:
                         index = add_data(vertex_data, index, v3, v0, v1, v3, v1, v2)
@@ -168,13 +192,14 @@ def build_chunk_mesh(chunk_voxels, format_size, chunk_pos, world_voxels):
 
                 # left face
                 if is_void((x - 1, y, z), (wx - 1, wy, wz), world_voxels):
-                    ao = get_ao((x - 1, y, z), (wx - 1, wy, wz), world_voxels, plane='X')
+                    light = get_light((wx - 1, wy, wz), world_light)
+                    ao = get_ao((x - 1, y, z), (wx - 1, wy, wz), world_voxels, plane=PLANE_X)
                     flip_id = ao[1] + ao[3] > ao[0] + ao[2]
 
-                    v0 = pack_data(x, y    , z    , voxel_id, 3, ao[0], flip_id)
-                    v1 = pack_data(x, y + 1, z    , voxel_id, 3, ao[1], flip_id)
-                    v2 = pack_data(x, y + 1, z + 1, voxel_id, 3, ao[2], flip_id)
-                    v3 = pack_data(x, y    , z + 1, voxel_id, 3, ao[3], flip_id)
+                    v0 = pack_data(x, y, z, voxel_id, light, 3, ao[0], flip_id)
+                    v1 = pack_data(x, y, z, voxel_id, light, 3, ao[1], flip_id)
+                    v2 = pack_data(x, y, z, voxel_id, light, 3, ao[2], flip_id)
+                    v3 = pack_data(x, y, z, voxel_id, light, 3, ao[3], flip_id)
 
                     if flip_id:
                         index = add_data(vertex_data, index, v3, v1, v0, v3, v2, v1)
@@ -183,13 +208,14 @@ def build_chunk_mesh(chunk_voxels, format_size, chunk_pos, world_voxels):
 
                 # back face
                 if is_void((x, y, z - 1), (wx, wy, wz - 1), world_voxels):
-                    ao = get_ao((x, y, z - 1), (wx, wy, wz - 1), world_voxels, plane='Z')
+                    light = get_light((wx, wy, wz - 1), world_light)
+                    ao = get_ao((x, y, z - 1), (wx, wy, wz - 1), world_voxels, plane=PLANE_Z)
                     flip_id = ao[1] + ao[3] > ao[0] + ao[2]
 
-                    v0 = pack_data(x,     y,     z, voxel_id, 4, ao[0], flip_id)
-                    v1 = pack_data(x,     y + 1, z, voxel_id, 4, ao[1], flip_id)
-                    v2 = pack_data(x + 1, y + 1, z, voxel_id, 4, ao[2], flip_id)
-                    v3 = pack_data(x + 1, y,     z, voxel_id, 4, ao[3], flip_id)
+                    v0 = pack_data(x, y, z, voxel_id, light, 4, ao[0], flip_id)
+                    v1 = pack_data(x, y, z, voxel_id, light, 4, ao[1], flip_id)
+                    v2 = pack_data(x, y, z, voxel_id, light, 4, ao[2], flip_id)
+                    v3 = pack_data(x, y, z, voxel_id, light, 4, ao[3], flip_id)
 
                     if flip_id:
                         index = add_data(vertex_data, index, v3, v0, v1, v3, v1, v2)
@@ -198,17 +224,18 @@ def build_chunk_mesh(chunk_voxels, format_size, chunk_pos, world_voxels):
 
                 # front face
                 if is_void((x, y, z + 1), (wx, wy, wz + 1), world_voxels):
-                    ao = get_ao((x, y, z + 1), (wx, wy, wz + 1), world_voxels, plane='Z')
+                    light = get_light((wx, wy, wz + 1), world_light)
+                    ao = get_ao((x, y, z + 1), (wx, wy, wz + 1), world_voxels, plane=PLANE_Z)
                     flip_id = ao[1] + ao[3] > ao[0] + ao[2]
 
-                    v0 = pack_data(x    , y    , z + 1, voxel_id, 5, ao[0], flip_id)
-                    v1 = pack_data(x    , y + 1, z + 1, voxel_id, 5, ao[1], flip_id)
-                    v2 = pack_data(x + 1, y + 1, z + 1, voxel_id, 5, ao[2], flip_id)
-                    v3 = pack_data(x + 1, y    , z + 1, voxel_id, 5, ao[3], flip_id)
+                    v0 = pack_data(x, y, z, voxel_id, light, 5, ao[0], flip_id)
+                    v1 = pack_data(x, y, z, voxel_id, light, 5, ao[1], flip_id)
+                    v2 = pack_data(x, y, z, voxel_id, light, 5, ao[2], flip_id)
+                    v3 = pack_data(x, y, z, voxel_id, light, 5, ao[3], flip_id)
 
                     if flip_id:
                         index = add_data(vertex_data, index, v3, v1, v0, v3, v2, v1)
                     else:
                         index = add_data(vertex_data, index, v0, v2, v1, v0, v3, v2)
 
-    return vertex_data[:index + 1]
+    return vertex_data[:index]
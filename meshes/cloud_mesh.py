@@ -1,87 +1,84 @@
 from settings import *
 from meshes.base_mesh import BaseMesh
 from noise import *
+from profiler import startup_profiler
 
 
 class CloudMesh(BaseMesh):
-    def __init__(self, app):
+    def __init__(self, clouds, tile_pos):
         super().__init__()
-        self.app = app
+        self.app = clouds.app
+        self.clouds = clouds
+
+        # tile position in tiles and its origin in cloud cells, vertices are relative to the origin
+        self.tile_pos = tile_pos
+        self.origin = glm.ivec2(tile_pos) * CLOUD_TILE_SIZE
+        # world space center of the tile, moved with the clouds every frame
+        self.center = glm.vec3(0)
 
         self.ctx = self.app.ctx
         self.program = self.app.shader_program.clouds
-        self.vbo_format = '3u2'
+        self.vbo_format = '2u1'
         self.attrs = ('in_position',)
         self.vao = self.get_vao()
 
     def get_vertex_data(self):
-        cloud_data = np.zeros(WORLD_AREA * CHUNK_SIZE ** 2, dtype='uint8')
-        self.gen_clouds(cloud_data)
+        cloud_data, visited, mesh = self.clouds.cloud_data, self.clouds.visited, self.clouds.mesh_data
+        with startup_profiler.timed('clouds.gen_clouds'):
+            self.gen_clouds(cloud_data, self.origin.x, self.origin.y)
 
-        return self.build_mesh(cloud_data)
+        with startup_profiler.timed('clouds.build_mesh'):
+            size = self.build_mesh(cloud_data, visited, mesh)
+        # the scratch buffer is reused by the next tile, the GL buffer takes a copy
+        return mesh[:size]
 
     @staticmethod
-    @njit
-    def gen_clouds(cloud_data):
-        for x in range(WORLD_W * CHUNK_SIZE):
-            for z in range(WORLD_D * CHUNK_SIZE):
-
-                if noise2(0.13 * x, 0.13 * z) < 0.2:
-                    continue
-                cloud_data[x + WORLD_W * CHUNK_SIZE * z] = 1
+    @njit(cache=True)
+    def gen_clouds(cloud_data, ox, oz):
+        # fills the tile bitmap, (ox, oz) is the tile origin in cloud cells
+        for z in range(CLOUD_TILE_SIZE):
+            for x in range(CLOUD_TILE_SIZE):
+                wx, wz = ox + x, oz + z
+                cloud_data[x + CLOUD_TILE_SIZE * z] = noise2(0.13 * wx, 0.13 * wz) >= 0.2
 
     @staticmethod
-    @njit
-    def build_mesh(cloud_data):
-        mesh = np.empty(WORLD_AREA * CHUNK_AREA * 6 * 3, dtype='uint16')
+    @njit(cache=True)
+    def build_mesh(cloud_data, visited, mesh):
+        # greedy meshing of one tile into the preallocated mesh buffer,
+        # returns the number of values written (2 per vertex: local x, z)
+        size = CLOUD_TILE_SIZE
+        visited[:] = 0
         index = 0
-        width = WORLD_W * CHUNK_SIZE
-        depth = WORLD_D * CHUNK_SIZE
 
-        y = CLOUD_HEIGHT
-        visited = set()
+        for z in range(size):
+            for x in range(size):
 
-        for z in range(depth):
-            for x in range(width):
-
-                idx = x + width * z
-                if not cloud_data[idx] or idx in visited:
+                idx = x + size * z
+                if not cloud_data[idx] or visited[idx]:
                     continue
 
                 # find number of continuous quads along x
                 x_count = 1
-                idx = (x + x_count) + width * z
-                while x + x_count < width and cloud_data[idx] and idx not in visited:
+                while x + x_count < size and cloud_data[idx + x_count] and not visited[idx + x_count]:
                     x_count += 1
-                    idx = (x + x_count) + width * z
 
-                # find the number of continuous quads along z for each x
-                z_count_list = []
+                # find the min number of continuous quads along z over the x run
+                z_count = size - z
                 for ix in range(x_count):
-                    z_count = 1
-                    idx = (x + ix) + width * (z + z_count)
-                    while (z + z_count) < depth and cloud_data[idx] and idx not in visited:
-                        z_count += 1
-                        idx = (x + ix) + width * (z + z_count)
-                    z_count_list.append(z_count)
-
-                # find min count z to form a large quad
-                z_count = min(z_count_list) if z_count_list else 1
+                    iz = 1
+                    while iz < z_count and cloud_data[idx + ix + size * iz] and not visited[idx + ix + size * iz]:
+                        iz += 1
+                    z_count = iz
 
                 # mark all unit quads of the large quad as visited
-                for ix in range(x_count):
-                    for iz in range(z_count):
-                        visited.add((x + ix) + width * (z + iz))
-
-                v0 = x, y, z
-                v1 = x + x_count, y, z + z_count
-                v2 = x + x_count, y, z
-                v3 = x, y, z + z_count
-
-                for vertex in (v0, v1, v2, v0, v3, v1):
-                    for attr in vertex:
-                        mesh[index] = attr
-                        index += 1
-
-        mesh = mesh[:index + 1]
-        return mesh
+                for iz in range(z_count):
+                    for ix in range(x_count):
+                        visited[idx + ix + size * iz] = 1
+
+                x0, z0, x1, z1 = x, z, x + x_count, z + z_count
+                # v0, v1, v2, v0, v3, v1
+                for vx, vz in ((x0, z0), (x1, z1), (x1, z0), (x0, z0), (x0, z1), (x1, z1)):
+                    mesh[index] = vx
+                    mesh[index + 1] = vz
+                    index += 2
+        return index
@@ -0,0 +1,32 @@
+from settings import *
+from meshes.base_mesh import BaseMesh
+from meshes.water_mesh_builder import build_water_mesh
+
+
+class WaterMesh(BaseMesh):
+    def __init__(self, chunk):
+        super().__init__()
+        self.app = chunk.app
+        self.chunk = chunk
+        self.ctx = self.app.ctx
+        self.program = self.app.shader_program.chunk_water
+
+        self.vbo_format = '3u1 1u1 1u1'
+        self.attrs = ('in_position', 'in_drop', 'in_face')
+        # counted against the GPU budget, see mesh_residency.py
+        self.residency = chunk.world.mesh_residency
+        self.nbytes = 0
+        self.vao = self.get_vao()
+        self.residency.add_water(self)
+
+    def rebuild(self):
+        self.release()
+        self.vao = self.get_vao()
+        self.residency.add_water(self)
+
+    def get_vertex_data(self):
+        engine = self.chunk.world.water_engine
+        chunk_index = self.chunk.index
+        if engine.slots[chunk_index] == -1:
+            return np.empty(0, dtype='uint8')
+        return build_water_mesh(self.chunk.world.voxels, engine.levels, engine.slots, chunk_index)
@@ -0,0 +1,78 @@
+from settings import *
+from water import get_cell, get_level
+
+# Faces of the water cells of a chunk that border air: 5 uint8 per vertex, the corner
+# (x, y, z) in the chunk, how far the corner sits below the top of its cell in ninths
+# (water is never quite a full block) and the face id (top, bottom, right, left, back, front).
+
+WATER_VERTEX_SIZE = 5
+# face id -> the 4 corners of the face as (dx, dy, dz) from the cell's min corner
+FACE_CORNERS = (
+    ((0, 1, 0), (0, 1, 1), (1, 1, 1), (1, 1, 0)),
+    ((0, 0, 0), (1, 0, 0), (1, 0, 1), (0, 0, 1)),
+    ((1, 0, 0), (1, 1, 0), (1, 1, 1), (1, 0, 1)),
+    ((0, 0, 0), (0, 0, 1), (0, 1, 1), (0, 1, 0)),
+    ((0, 0, 0), (0, 1, 0), (1, 1, 0), (1, 0, 0)),
+    ((0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1)),
+)
+
+
+@njit(cache=True)
+def get_water_faces(voxels, levels, slots, wx, wy, wz, level):
+    # -> bit per face that borders air without water, and the height of the water in ninths
+    _, above = get_cell(voxels, levels, slots, wx, wy + 1, wz)
+    height = 9 if above else min(level + 1, WATER_SOURCE)
+
+    faces = 0
+    for face_id in range(6):
+        dx, dy, dz = FACE_NORMALS[face_id]
+        nx, ny, nz = wx + dx, wy + dy, wz + dz
+        # the world border and the bottom are left open, the sea beyond them has no faces
+        if not (0 <= nx < WORLD_X and 0 <= ny < WORLD_Y and 0 <= nz < WORLD_Z):
+            continue
+        is_solid, side = get_cell(voxels, levels, slots, nx, ny, nz)
+        if not is_solid and not side:
+            faces |= 1 << face_id
+
+    # the open sea surface is drawn by the water plane at WATER_LINE
+    if wy == WATER_SEA_TOP and level == WATER_SOURCE:
+        faces &= ~1
+    return faces, height
+
+
+@njit(cache=True)
+def build_water_mesh(voxels, levels, slots, chunk_index):
+    cx = chunk_index % WORLD_W * CHUNK_SIZE
+    cz = chunk_index // WORLD_W % WORLD_D * CHUNK_SIZE
+    cy = chunk_index // WORLD_AREA * CHUNK_SIZE
+
+    # first pass counts the faces, the second one writes them
+    num_faces = 0
+    for is_writing in (False, True):
+        if is_writing:
+            vertex_data = np.empty(num_faces * 6 * WATER_VERTEX_SIZE, dtype='uint8')
+            index = 0
+        for voxel_index in range(CHUNK_VOL):
+            level = get_level(levels, slots, chunk_index, voxel_index)
+            if not level:
+                continue
+            x, z, y = voxel_index % CHUNK_SIZE, voxel_index // CHUNK_SIZE % CHUNK_SIZE, voxel_index // CHUNK_AREA
+            faces, height = get_water_faces(voxels, levels, slots, cx + x, cy + y, cz + z, level)
+            if not is_writing:
+                for face_id in range(6):
+                    num_faces += faces >> face_id & 1
+                continue
+
+            for face_id in range(6):
+                if not faces >> face_id & 1:
+                    continue
+                corners = FACE_CORNERS[face_id]
+                for corner in (0, 1, 2, 0, 2, 3):
+                    dx, dy, dz = corners[corner]
+                    vertex_data[index] = x + dx
+                    vertex_data[index + 1] = y + dy
+                    vertex_data[index + 2] = z + dz
+                    vertex_data[index + 3] = (9 - height) * dy
+                    vertex_data[index + 4] = face_id
+                    index += WATER_VERTEX_SIZE
+    return vertex_data
@@ -0,0 +1,678 @@
+from concurrent.futures import ThreadPoolExecutor
+from settings import *
+from lighting import get_location, encode, decode
+
+# Paths over the walkable cells of World.voxels, HPA*-style.
+#
+# A cell is walkable when its floor is solid and NAV_CLEARANCE voxels of air are above it.
+# Moves go to the 4 sideways neighbours, one voxel up or down (with headroom for the climb),
+# or diagonally on flat ground without cutting corners, so every move can be walked back and
+# the graph is undirected.
+#
+# Every chunk is a cluster. The moves that cross from one chunk into another are grouped into
+# entrances (runs of touching moves between the same two chunks) and the middle move of each
+# run becomes a pair of portal nodes, one on each side. Inside a chunk the portals are joined
+# by their path costs within the chunk. A long query searches this graph of portals, then
+# refines each step with A* inside one chunk. A chunk's portals and costs depend on the
+# voxels within a voxel of it, so an edit only rebuilds the chunks around it.
+
+# (dx, dz) of the moves: 4 sideways, then the 4 diagonals
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+DIAGONAL_COST = math.sqrt(2)
+# extra cost of a move that climbs or drops a voxel
+STEP_COST = 0.5
+NEIGHBOURS = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)])
+
+
+@njit(cache=True, nogil=True)
+def is_open(voxels, wx, wy, wz):
+    # air a body can be in: above the world is open, beyond its sides and below it is not
+    if not (0 <= wx < WORLD_X and 0 <= wz < WORLD_Z) or wy < 0:
+        return False
+    if wy >= WORLD_Y:
+        return True
+    chunk_index, voxel_index = get_location(wx, wy, wz)
+    return voxels[chunk_index, voxel_index] == 0
+
+
+@njit(cache=True, nogil=True)
+def is_walkable(voxels, wx, wy, wz):
+    if not (0 <= wy < WORLD_Y):
+        return False
+    # the ground below the world is solid
+    if wy > 0 and is_open(voxels, wx, wy - 1, wz):
+        return False
+    for dy in range(NAV_CLEARANCE):
+        if not is_open(voxels, wx, wy + dy, wz):
+            return False
+    return True
+
+
+@njit(cache=True, nogil=True)
+def get_neighbours(voxels, wx, wy, wz, positions, costs):
+    # walkable cells one move away, written to positions (encoded) and costs; -> their number
+    count = 0
+    for d in range(8):
+        dx, dz = DIRECTIONS[d]
+        nx, nz = wx + dx, wz + dz
+        if d < 4:
+            if is_walkable(voxels, nx, wy, nz):
+                ny, cost = wy, 1.0
+            elif is_walkable(voxels, nx, wy + 1, nz) and is_open(voxels, wx, wy + NAV_CLEARANCE, wz):
+                ny, cost = wy + 1, 1.0 + STEP_COST
+            elif is_walkable(voxels, nx, wy - 1, nz) and is_open(voxels, nx, wy - 1 + NAV_CLEARANCE, nz):
+                ny, cost = wy - 1, 1.0 + STEP_COST
+            else:
+                continue
+        else:
+            if not (is_walkable(voxels, nx, wy, nz) and is_walkable(voxels, nx, wy, wz)
+                    and is_walkable(voxels, wx, wy, nz)):
+                continue
+            ny, cost = wy, DIAGONAL_COST
+        positions[count] = encode(nx, ny, nz)
+        costs[count] = cost
+        count += 1
+    return count
+
+
+@njit(cache=True, nogil=True)
+def get_distance(pos_a, pos_b):
+    # octile distance over x and z, no move covers more of it than it costs
+    ax, _, az = decode(pos_a)
+    bx, _, bz = decode(pos_b)
+    dx, dz = abs(ax - bx), abs(az - bz)
+    return max(dx, dz) + (DIAGONAL_COST - 1) * min(dx, dz)
+
+
+@njit(cache=True, nogil=True)
+def heap_push(keys, values, size, key, value):
+    # binary min-heap in two arrays, doubled when full; -> the arrays and the new size
+    if size == len(keys):
+        grown_keys = np.empty(2 * size, dtype=keys.dtype)
+        grown_values = np.empty(2 * size, dtype=values.dtype)
+        grown_keys[:size] = keys
+        grown_values[:size] = values
+        keys, values = grown_keys, grown_values
+    i = size
+    while i > 0:
+        parent = (i - 1) // 2
+        if keys[parent] <= key:
+            break
+        keys[i], values[i] = keys[parent], values[parent]
+        i = parent
+    keys[i], values[i] = key, value
+    return keys, values, size + 1
+
+
+@njit(cache=True, nogil=True)
+def heap_pop(keys, values, size):
+    # -> smallest key, its value and the new size
+    key, value = keys[0], values[0]
+    size -= 1
+    last_key, last_value = keys[size], values[size]
+    i = 0
+    while True:
+        child = 2 * i + 1
+        if child >= size:
+            break
+        if child + 1 < size and keys[child + 1] < keys[child]:
+            child += 1
+        if keys[child] >= last_key:
+            break
+        keys[i], values[i] = keys[child], values[child]
+        i = child
+    if size:
+        keys[i], values[i] = last_key, last_value
+    return key, value, size
+
+
+@njit(cache=True, nogil=True)
+def get_box_index(pos, box):
+    # encoded position -> index in the half-open box (x0, y0, z0, x1, y1, z1), -1 outside it
+    wx, wy, wz = decode(pos)
+    x0, y0, z0, x1, y1, z1 = box
+    if not (x0 <= wx < x1 and y0 <= wy < y1 and z0 <= wz < z1):
+        return -1
+    return wx - x0 + (x1 - x0) * (wz - z0 + (z1 - z0) * (wy - y0))
+
+
+@njit(cache=True, nogil=True)
+def search_box(voxels, source, targets, goal, box):
+    # A* (Dijkstra when goal is -1) from source over the cells of the box, until the goal or
+    # every target is settled; -> costs to the targets (inf if unreachable), the parent box
+    # index of each settled cell and the box indices of the settled cells
+    x0, y0, z0, x1, y1, z1 = box
+    size = (x1 - x0) * (y1 - y0) * (z1 - z0)
+    # 0 unseen, 1 queued, 2 settled
+    state = np.zeros(size, dtype='uint8')
+    g = np.empty(size, dtype='float32')
+    parents = np.empty(size, dtype='int32')
+    costs = np.full(len(targets), np.inf)
+    num_targets = len(targets)
+    if goal != -1:
+        num_targets += 1
+
+    keys = np.empty(256, dtype='float64')
+    values = np.empty(256, dtype='int64')
+    heap_size = 0
+    neighbour_positions = np.empty(8, dtype='int64')
+    neighbour_costs = np.empty(8, dtype='float64')
+
+    start = get_box_index(source, box)
+    if start == -1:
+        return costs, parents, state
+    g[start] = 0
+    parents[start] = -1
+    state[start] = 1
+    keys, values, heap_size = heap_push(keys, values, heap_size, 0.0, source)
+
+    while heap_size:
+        _, pos, heap_size = heap_pop(keys, values, heap_size)
+        index = get_box_index(pos, box)
+        if state[index] == 2:
+            continue
+        state[index] = 2
+
+        for k in range(len(targets)):
+            if targets[k] == pos:
+                costs[k] = g[index]
+                num_targets -= 1
+        if pos == goal:
+            num_targets -= 1
+        if not num_targets:
+            break
+
+        wx, wy, wz = decode(pos)
+        count = get_neighbours(voxels, wx, wy, wz, neighbour_positions, neighbour_costs)
+        for k in range(count):
+            neighbour = neighbour_positions[k]
+            j = get_box_index(neighbour, box)
+            if j == -1 or state[j] == 2:
+                continue
+            cost = g[index] + neighbour_costs[k]
+            if state[j] == 0 or cost < g[j]:
+                g[j] = cost
+                parents[j] = index
+                state[j] = 1
+                estimate = cost + get_distance(neighbour, goal) if goal != -1 else cost
+                keys, values, heap_size = heap_push(keys, values, heap_size, estimate, neighbour)
+    return costs, parents, state
+
+
+@njit(cache=True, nogil=True)
+def find_path_in_box(voxels, start, goal, box):
+    # -> encoded cells from start to goal within the box, empty if there is no such path
+    _, parents, state = search_box(voxels, start, np.empty(0, dtype='int64'), goal, box)
+    end = get_box_index(goal, box)
+    if end == -1 or state[end] != 2:
+        return np.empty(0, dtype='int64')
+
+    x0, y0, z0, x1, y1, z1 = box
+    sx, sz = x1 - x0, z1 - z0
+    length = 0
+    index = end
+    while index != -1:
+        length += 1
+        index = parents[index]
+    path = np.empty(length, dtype='int64')
+    index = end
+    for i in range(length - 1, -1, -1):
+        path[i] = encode(x0 + index % sx, y0 + index // (sx * sz), z0 + index // sx % sz)
+        index = parents[index]
+    return path
+
+
+@njit(cache=True, nogil=True)
+def get_chunk_box(chunk_index):
+    x0 = chunk_index % WORLD_W * CHUNK_SIZE
+    z0 = chunk_index // WORLD_W % WORLD_D * CHUNK_SIZE
+    y0 = chunk_index // WORLD_AREA * CHUNK_SIZE
+    return x0, y0, z0, x0 + CHUNK_SIZE, y0 + CHUNK_SIZE, z0 + CHUNK_SIZE
+
+
+@njit(cache=True, nogil=True)
+def get_costs_in_chunk(voxels, chunk_index, source, targets):
+    costs, _, _ = search_box(voxels, source, targets, -1, get_chunk_box(chunk_index))
+    return costs
+
+
+@njit(cache=True, nogil=True)
+def is_touching(pos_a, pos_b):
+    ax, ay, az = decode(pos_a)
+    bx, by, bz = decode(pos_b)
+    return abs(ax - bx) <= 1 and abs(ay - by) <= 1 and abs(az - bz) <= 1
+
+
+@njit(cache=True, nogil=True)
+def grow(array):
+    grown = np.empty(2 * len(array), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+@njit(cache=True, nogil=True)
+def get_crossings(voxels, chunk_index):
+    # moves from the chunk's border cells into other chunks; -> inside cell, outside cell,
+    # cost and chunk of the outside cell per move
+    x0, y0, z0, x1, y1, z1 = get_chunk_box(chunk_index)
+    inside = np.empty(CHUNK_AREA, dtype='int64')
+    outside = np.empty(CHUNK_AREA, dtype='int64')
+    costs = np.empty(CHUNK_AREA, dtype='float64')
+    count = 0
+    neighbour_positions = np.empty(8, dtype='int64')
+    neighbour_costs = np.empty(8, dtype='float64')
+    for wy in range(y0, y1):
+        for wz in range(z0, z1):
+            for wx in range(x0, x1):
+                if not (wx == x0 or wx == x1 - 1 or wz == z0 or wz == z1 - 1 or wy == y0 or wy == y1 - 1):
+                    continue
+                if not is_walkable(voxels, wx, wy, wz):
+                    continue
+                num = get_neighbours(voxels, wx, wy, wz, neighbour_positions, neighbour_costs)
+                for k in range(num):
+                    nx, ny, nz = decode(neighbour_positions[k])
+                    if x0 <= nx < x1 and y0 <= ny < y1 and z0 <= nz < z1:
+                        continue
+                    if count == len(inside):
+                        inside, outside, costs = grow(inside), grow(outside), grow(costs)
+                    inside[count] = encode(wx, wy, wz)
+                    outside[count] = neighbour_positions[k]
+                    costs[count] = neighbour_costs[k]
+                    count += 1
+
+    chunks = np.empty(count, dtype='int64')
+    for k in range(count):
+        chunks[k], _ = get_location(*decode(outside[k]))
+    return inside[:count], outside[:count], costs[:count], chunks
+
+
+@njit(cache=True, nogil=True)
+def get_entrances(chunk_index, inside, outside, chunks):
+    # groups the crossings into runs of touching moves per neighbouring chunk and picks the
+    # middle move of each run; both chunks see the same moves and order them the same way
+    # (by the cell in the lower chunk index), so they agree on the portals. -> crossing indices
+    count = len(inside)
+    low = np.empty(count, dtype='int64')
+    high = np.empty(count, dtype='int64')
+    keys = np.empty(count, dtype='int64')
+    for k in range(count):
+        if chunk_index < chunks[k]:
+            low[k], high[k] = inside[k], outside[k]
+        else:
+            low[k], high[k] = outside[k], inside[k]
+        lx, ly, lz = decode(low[k])
+        hx, hy, hz = decode(high[k])
+        # by chunk, then low cell, then the direction of the move
+        keys[k] = ((chunks[k] * WORLD_X * WORLD_Y * WORLD_Z + low[k]) * 27
+                   + (hx - lx + 1) * 9 + (hy - ly + 1) * 3 + hz - lz + 1)
+    order = np.argsort(keys)
+
+    picked = np.empty(count, dtype='int64')
+    num_picked = 0
+    start = 0
+    while start < count:
+        end = start
+        while end < count and chunks[order[end]] == chunks[order[start]]:
+            end += 1
+        # union-find over the moves to this chunk, the root is the first move in order
+        roots = np.arange(end - start)
+        for a in range(end - start):
+            for b in range(a):
+                ka, kb = order[start + a], order[start + b]
+                if is_touching(low[ka], low[kb]) and is_touching(high[ka], high[kb]):
+                    ra, rb = a, b
+                    while roots[ra] != ra:
+                        ra = roots[ra]
+                    while roots[rb] != rb:
+                        rb = roots[rb]
+                    roots[max(ra, rb)] = min(ra, rb)
+        for a in range(end - start):
+            root = a
+            while roots[root] != root:
+                root = roots[root]
+            roots[a] = root
+        for a in range(end - start):
+            if roots[a] != a:
+                continue
+            members = np.flatnonzero(roots == a)
+            picked[num_picked] = order[start + members[len(members) // 2]]
+            num_picked += 1
+        start = end
+    return picked[:num_picked]
+
+
+@njit(cache=True, nogil=True)
+def get_walkable_cells(voxels, chunk_index):
+    # is_walkable over the chunk a column at a time, every voxel read once; -> bool per voxel index
+    x0, y0, z0, _, _, _ = get_chunk_box(chunk_index)
+    chunk_voxels = voxels[chunk_index]
+    is_walkable_cell = np.zeros(CHUNK_VOL, dtype='bool')
+    # open voxels of the column from the one below the chunk to the headroom above it
+    is_column_open = np.empty(CHUNK_SIZE + NAV_CLEARANCE, dtype='bool')
+    for z in range(CHUNK_SIZE):
+        for x in range(CHUNK_SIZE):
+            is_column_open[0] = is_open(voxels, x0 + x, y0 - 1, z0 + z)
+            for y in range(CHUNK_SIZE):
+                is_column_open[y + 1] = chunk_voxels[x + CHUNK_SIZE * z + CHUNK_AREA * y] == 0
+            for y in range(CHUNK_SIZE + 1, CHUNK_SIZE + NAV_CLEARANCE):
+                is_column_open[y] = is_open(voxels, x0 + x, y0 + y - 1, z0 + z)
+            # the ground below the world is solid
+            if y0 == 0:
+                is_column_open[0] = False
+            for y in range(CHUNK_SIZE):
+                if is_column_open[y]:
+                    continue
+                is_walkable_cell[x + CHUNK_SIZE * z + CHUNK_AREA * y] = True
+                for dy in range(1, NAV_CLEARANCE + 1):
+                    if not is_column_open[y + dy]:
+                        is_walkable_cell[x + CHUNK_SIZE * z + CHUNK_AREA * y] = False
+                        break
+    return is_walkable_cell
+
+
+@njit(cache=True, nogil=True)
+def get_chunk_graph(voxels, chunk_index):
+    # the moves between the walkable cells of the chunk as CSR over the walkable cells;
+    # -> compact index per box index (-1 if not walkable), indptr, indices, costs
+    box = get_chunk_box(chunk_index)
+    x0, y0, z0, x1, y1, z1 = box
+    is_walkable_cell = get_walkable_cells(voxels, chunk_index)
+    compact = np.full(CHUNK_VOL, -1, dtype='int32')
+    num_cells = 0
+    for index in range(CHUNK_VOL):
+        if is_walkable_cell[index]:
+            compact[index] = num_cells
+            num_cells += 1
+
+    indptr = np.zeros(num_cells + 1, dtype='int32')
+    indices = np.empty(8 * num_cells, dtype='int32')
+    costs = np.empty(8 * num_cells, dtype='float32')
+    neighbour_positions = np.empty(8, dtype='int64')
+    neighbour_costs = np.empty(8, dtype='float64')
+    num_edges = 0
+    for index in range(CHUNK_VOL):
+        cell = compact[index]
+        if cell == -1:
+            continue
+        wx, wz, wy = x0 + index % CHUNK_SIZE, z0 + index // CHUNK_SIZE % CHUNK_SIZE, y0 + index // CHUNK_AREA
+        count = get_neighbours(voxels, wx, wy, wz, neighbour_positions, neighbour_costs)
+        for k in range(count):
+            j = get_box_index(neighbour_positions[k], box)
+            if j != -1:
+                indices[num_edges] = compact[j]
+                costs[num_edges] = neighbour_costs[k]
+                num_edges += 1
+        indptr[cell + 1] = num_edges
+    return compact, indptr, indices[:num_edges], costs[:num_edges]
+
+
+@njit(cache=True, nogil=True)
+def search_chunk_graph(indptr, indices, costs, source, targets):
+    # Dijkstra over get_chunk_graph from the compact cell source until the targets are
+    # settled; -> costs to the targets, inf if unreachable
+    num_cells = len(indptr) - 1
+    g = np.full(num_cells, np.inf, dtype='float32')
+    is_settled = np.zeros(num_cells, dtype='bool')
+    # the targets of each cell, -1 where it is not one
+    target_of = np.full(num_cells, -1, dtype='int32')
+    for k in range(len(targets)):
+        target_of[targets[k]] = k
+    result = np.full(len(targets), np.inf)
+    num_targets = len(targets)
+
+    keys = np.empty(256, dtype='float64')
+    values = np.empty(256, dtype='int64')
+    g[source] = 0
+    keys, values, heap_size = heap_push(keys, values, 0, 0.0, source)
+    while heap_size:
+        _, cell, heap_size = heap_pop(keys, values, heap_size)
+        if is_settled[cell]:
+            continue
+        is_settled[cell] = True
+        if target_of[cell] != -1:
+            result[target_of[cell]] = g[cell]
+            num_targets -= 1
+            if not num_targets:
+                break
+        for e in range(indptr[cell], indptr[cell + 1]):
+            neighbour = indices[e]
+            cost = g[cell] + costs[e]
+            if cost < g[neighbour]:
+                g[neighbour] = cost
+                keys, values, heap_size = heap_push(keys, values, heap_size, cost, neighbour)
+    return result
+
+
+@njit(cache=True, nogil=True)
+def build_cluster(voxels, chunk_index):
+    # -> portal cells of the chunk, their costs to each other within the chunk ([k, k], inf
+    # where there is no path inside the chunk) and the portal links out of the chunk as
+    # (portal row, outside cell, cost)
+    inside, outside, crossing_costs, chunks = get_crossings(voxels, chunk_index)
+    picked = get_entrances(chunk_index, inside, outside, chunks)
+    nodes = np.unique(inside[picked])
+    link_nodes = np.searchsorted(nodes, inside[picked])
+
+    # the moves inside the chunk are found once and shared by the searches from every portal
+    box = get_chunk_box(chunk_index)
+    compact, indptr, indices, move_costs = get_chunk_graph(voxels, chunk_index)
+    cells = np.empty(len(nodes), dtype='int32')
+    for i in range(len(nodes)):
+        cells[i] = compact[get_box_index(nodes[i], box)]
+
+    costs = np.empty((len(nodes), len(nodes)), dtype='float32')
+    for i in range(len(nodes)):
+        # the graph is undirected, the row of i only needs the nodes after it
+        row = search_chunk_graph(indptr, indices, move_costs, cells[i], cells[i:])
+        for j in range(len(row)):
+            costs[i, i + j] = row[j]
+            costs[i + j, i] = row[j]
+    return nodes, costs, link_nodes, outside[picked], crossing_costs[picked]
+
+
+@njit(cache=True, nogil=True)
+def search_graph(node_positions, indptr, indices, weights, start_nodes, start_costs, goal_nodes, goal_costs, goal):
+    # A* over the portal graph from a virtual start joined to start_nodes to a virtual goal
+    # joined from goal_nodes; -> the portal nodes along the cheapest path, empty if none
+    num = len(node_positions)
+    g = np.full(num + 1, np.inf)
+    parents = np.full(num + 1, -1, dtype='int64')
+    is_settled = np.zeros(num + 1, dtype='bool')
+    to_goal = np.full(num, np.inf)
+    for k in range(len(goal_nodes)):
+        to_goal[goal_nodes[k]] = min(to_goal[goal_nodes[k]], goal_costs[k])
+
+    keys = np.empty(256, dtype='float64')
+    values = np.empty(256, dtype='int64')
+    heap_size = 0
+    for k in range(len(start_nodes)):
+        node = start_nodes[k]
+        if start_costs[k] < g[node]:
+            g[node] = start_costs[k]
+            keys, values, heap_size = heap_push(keys, values, heap_size,
+                                                start_costs[k] + get_distance(node_positions[node], goal), node)
+
+    while heap_size:
+        _, node, heap_size = heap_pop(keys, values, heap_size)
+        if is_settled[node]:
+            continue
+        is_settled[node] = True
+        if node == num:
+            break
+        if to_goal[node] < np.inf and g[node] + to_goal[node] < g[num]:
+            g[num] = g[node] + to_goal[node]
+            parents[num] = node
+            keys, values, heap_size = heap_push(keys, values, heap_size, g[num], num)
+        for e in range(indptr[node], indptr[node + 1]):
+            neighbour = indices[e]
+            cost = g[node] + weights[e]
+            if not is_settled[neighbour] and cost < g[neighbour]:
+                g[neighbour] = cost
+                parents[neighbour] = node
+                keys, values, heap_size = heap_push(
+                    keys, values, heap_size, cost + get_distance(node_positions[neighbour], goal), neighbour)
+
+    if not is_settled[num]:
+        return np.empty(0, dtype='int64')
+    length = 0
+    node = parents[num]
+    while node != -1:
+        length += 1
+        node = parents[node]
+    path = np.empty(length, dtype='int64')
+    node = parents[num]
+    for i in range(length - 1, -1, -1):
+        path[i] = node
+        node = parents[node]
+    return path
+
+
+class Navigator:
+    def __init__(self, world):
+        self.world = world
+        # per chunk: portal cells, costs between them and links out, None until built
+        self.clusters = [None] * WORLD_VOL
+        self.is_dirty = np.ones(WORLD_VOL, dtype='bool')
+        self.executor = None
+        # the portal graph of all chunks as CSR
+        self.node_positions = np.empty(0, dtype='int64')
+        self.node_offsets = np.zeros(WORLD_VOL + 1, dtype='int64')
+        self.indptr = np.zeros(1, dtype='int64')
+        self.indices = np.empty(0, dtype='int64')
+        self.weights = np.empty(0, dtype='float64')
+        self.num_rebuilt = 0
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=NAV_WORKERS)
+        return self.executor
+
+    def invalidate(self, chunk_indices):
+        # after the chunks were edited: walkability near their borders depends on the
+        # neighbouring chunks too, so the chunks around them are rebuilt as well
+        for chunk_index in chunk_indices:
+            x, z, y = chunk_index % WORLD_W, chunk_index // WORLD_W % WORLD_D, chunk_index // WORLD_AREA
+            for dx, dy, dz in NEIGHBOURS:
+                nx, ny, nz = x + dx, y + dy, z + dz
+                if 0 <= nx < WORLD_W and 0 <= ny < WORLD_H and 0 <= nz < WORLD_D:
+                    self.is_dirty[nx + WORLD_W * nz + WORLD_AREA * ny] = True
+
+    def update(self):
+        # rebuilds the dirty chunks on the worker pool, then the graph; -> chunks rebuilt
+        dirty = np.flatnonzero(self.is_dirty)
+        if not len(dirty):
+            return 0
+        voxels = self.world.voxels
+        clusters = self.get_executor().map(lambda chunk_index: build_cluster(voxels, chunk_index), dirty)
+        for chunk_index, cluster in zip(dirty, clusters):
+            self.clusters[chunk_index] = cluster
+        self.is_dirty[dirty] = False
+        self.num_rebuilt += len(dirty)
+        self.build_graph()
+        return len(dirty)
+
+    def build_graph(self):
+        nodes = [cluster[0] for cluster in self.clusters]
+        self.node_offsets[1:] = np.cumsum([len(chunk_nodes) for chunk_nodes in nodes])
+        self.node_positions = np.concatenate(nodes)
+        if not len(self.node_positions):
+            self.indptr = np.zeros(1, dtype='int64')
+            return
+        by_position = np.argsort(self.node_positions)
+
+        sources, targets, weights = [], [], []
+        for chunk_index, (chunk_nodes, costs, link_nodes, link_cells, link_costs) in enumerate(self.clusters):
+            offset = self.node_offsets[chunk_index]
+            rows, columns = np.nonzero(np.isfinite(costs) & ~np.eye(len(chunk_nodes), dtype='bool'))
+            sources.append(rows + offset)
+            targets.append(columns + offset)
+            weights.append(costs[rows, columns])
+
+            # the portal on the other side is a node of the neighbouring chunk
+            found = np.searchsorted(self.node_positions, link_cells, sorter=by_position)
+            found = by_position[np.minimum(found, len(by_position) - 1)]
+            is_found = self.node_positions[found] == link_cells
+            sources.append(link_nodes[is_found] + offset)
+            targets.append(found[is_found])
+            weights.append(link_costs[is_found])
+
+        sources = np.concatenate(sources)
+        order = np.argsort(sources, kind='stable')
+        self.indices = np.concatenate(targets)[order]
+        self.weights = np.concatenate(weights).astype('float64')[order]
+        self.indptr = np.searchsorted(sources[order], np.arange(len(self.node_positions) + 1))
+
+    def get_floor(self, world_pos, max_drop=NAV_CLEARANCE + 2):
+        # the walkable cell at or up to max_drop voxels below world_pos, None if there isn't one
+        wx, wy, wz = (int(value) for value in world_pos)
+        for y in range(min(wy, WORLD_Y - 1), max(wy - max_drop, -1), -1):
+            if is_walkable(self.world.voxels, wx, y, wz):
+                return wx, y, wz
+        return None
+
+    def find_path(self, start, goal):
+        # world voxel positions of the cells from start to goal, None without a path
+        self.update()
+        return self.search(start, goal)
+
+    def find_paths(self, queries):
+        # (start, goal) pairs searched in parallel on the worker pool
+        self.update()
+        return list(self.get_executor().map(lambda query: self.search(*query), queries))
+
+    def search(self, start, goal):
+        # reads only the built graph and the voxels, so several can run at once
+        start, goal = self.get_floor(start), self.get_floor(goal)
+        if start is None or goal is None:
+            return None
+        voxels = self.world.voxels
+        start_pos, goal_pos = encode(*start), encode(*goal)
+
+        if max(abs(start[0] - goal[0]), abs(start[2] - goal[2])) <= NAV_LOCAL_RANGE:
+            box = (max(min(start[0], goal[0]) - NAV_LOCAL_MARGIN, 0),
+                   max(min(start[1], goal[1]) - NAV_LOCAL_MARGIN, 0),
+                   max(min(start[2], goal[2]) - NAV_LOCAL_MARGIN, 0),
+                   min(max(start[0], goal[0]) + NAV_LOCAL_MARGIN + 1, WORLD_X),
+                   min(max(start[1], goal[1]) + NAV_LOCAL_MARGIN + 1, WORLD_Y),
+                   min(max(start[2], goal[2]) + NAV_LOCAL_MARGIN + 1, WORLD_Z))
+            path = find_path_in_box(voxels, start_pos, goal_pos, box)
+            if len(path):
+                return self.to_positions(path)
+
+        start_chunk, goal_chunk = get_location(*start)[0], get_location(*goal)[0]
+        start_nodes = np.arange(self.node_offsets[start_chunk], self.node_offsets[start_chunk + 1])
+        goal_nodes = np.arange(self.node_offsets[goal_chunk], self.node_offsets[goal_chunk + 1])
+        start_costs = get_costs_in_chunk(voxels, start_chunk, start_pos, self.node_positions[start_nodes])
+        goal_costs = get_costs_in_chunk(voxels, goal_chunk, goal_pos, self.node_positions[goal_nodes])
+        nodes = search_graph(self.node_positions, self.indptr, self.indices, self.weights,
+                             start_nodes, start_costs, goal_nodes, goal_costs, goal_pos)
+        if not len(nodes):
+            return None
+
+        # refines the portal path: A* inside a chunk between portals of the same chunk,
+        # a single move between the two sides of an entrance
+        cells = [start_pos] + [int(pos) for pos in self.node_positions[nodes]] + [goal_pos]
+        chunks = [start_chunk] + [int(chunk) for chunk in np.searchsorted(self.node_offsets, nodes, 'right') - 1] \
+            + [goal_chunk]
+        path = [np.array([start_pos])]
+        for (pos_a, chunk_a), (pos_b, chunk_b) in zip(zip(cells, chunks), zip(cells[1:], chunks[1:])):
+            if pos_a == pos_b:
+                continue
+            if chunk_a != chunk_b:
+                path.append(np.array([pos_b]))
+                continue
+            segment = find_path_in_box(voxels, pos_a, pos_b, get_chunk_box(chunk_a))
+            if not len(segment):
+                return None
+            path.append(segment[1:])
+        return self.to_positions(np.concatenate(path))
+
+    @staticmethod
+    def to_positions(path):
+        wx, wy, wz = path % WORLD_X, path // (WORLD_X * WORLD_Z), path // WORLD_X % WORLD_Z
+        return np.column_stack([wx, wy, wz])
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
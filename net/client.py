@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+from settings import *
+from lighting import decode, encode, get_location
+from net.protocol import *
+
+
+class ReplicaWorld:
+    # the client's copy of the chunks the server streamed to it
+    def __init__(self):
+        self.voxels = np.zeros([WORLD_VOL, CHUNK_VOL], dtype='uint8')
+        self.is_loaded = np.zeros(WORLD_VOL, dtype='bool')
+
+    def set_chunk(self, chunk_index, voxels):
+        self.voxels[chunk_index] = voxels
+        self.is_loaded[chunk_index] = True
+
+    def unload_chunk(self, chunk_index):
+        self.is_loaded[chunk_index] = False
+
+    def apply_edits(self, positions, voxel_ids):
+        for pos, voxel_id in zip(positions, voxel_ids):
+            chunk_index, voxel_index = get_location(*decode(pos))
+            if self.is_loaded[chunk_index]:
+                self.voxels[chunk_index, voxel_index] = voxel_id
+
+    def get_voxel_id(self, wx, wy, wz):
+        # None where the chunk isn't loaded
+        chunk_index, voxel_index = get_location(wx, wy, wz)
+        if not self.is_loaded[chunk_index]:
+            return None
+        return self.voxels[chunk_index, voxel_index]
+
+
+class WorldClient:
+    def __init__(self, world=None):
+        # receives the stream: anything with set_chunk, unload_chunk and apply_edits, like the
+        # game World's replica (see replica.py)
+        self.world = ReplicaWorld() if world is None else world
+        self.reader = self.writer = None
+        self.receiver = None
+
+        self.bytes_received = 0
+        self.chunks_received = 0
+        self.edits_received = 0
+        # world position -> send time of own edits waiting for the server echo
+        self.edit_times = {}
+        self.edit_latencies = []
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        msg_type, payload = await read_message(self.reader)
+        if msg_type != MSG_WELCOME:
+            raise ProtocolError(f'expected welcome, got {msg_type}')
+        unpack_welcome(payload)
+        self.receiver = asyncio.create_task(self.receive_loop())
+
+    async def close(self):
+        self.receiver.cancel()
+        self.writer.close()
+
+    async def receive_loop(self):
+        try:
+            while True:
+                msg_type, payload = await read_message(self.reader)
+                self.bytes_received += HEADER.size + len(payload)
+                if msg_type == MSG_CHUNK:
+                    self.world.set_chunk(*unpack_chunk(payload))
+                    self.chunks_received += 1
+                elif msg_type == MSG_UNLOAD:
+                    self.world.unload_chunk(CHUNK_INDEX.unpack(payload)[0])
+                elif msg_type == MSG_EDITS:
+                    positions, voxel_ids = unpack_edits(payload)
+                    self.world.apply_edits(positions, voxel_ids)
+                    self.edits_received += len(positions)
+                    self.on_edits(positions)
+                else:
+                    raise ProtocolError(f'unexpected message {msg_type}')
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    def on_edits(self, positions):
+        if not self.edit_times:
+            return
+        now = time.perf_counter()
+        for pos in positions:
+            sent = self.edit_times.pop(int(pos), None)
+            if sent is not None:
+                self.edit_latencies.append(now - sent)
+
+    async def send_position(self, position):
+        self.writer.write(pack_message(MSG_POSITION, POSITION.pack(*position)))
+        await self.writer.drain()
+
+    async def send_edit(self, wx, wy, wz, voxel_id):
+        # the replica changes when the server echoes the edit back, so all clients agree
+        self.edit_times[int(encode(wx, wy, wz))] = time.perf_counter()
+        self.writer.write(pack_message(MSG_EDIT, EDIT.pack(wx, wy, wz, voxel_id)))
+        await self.writer.drain()
+
+    async def send_edits(self, edits):
+        # [(x, y, z, voxel_id)], one drain for all of them
+        now = time.perf_counter()
+        for wx, wy, wz, voxel_id in edits:
+            self.edit_times[int(encode(wx, wy, wz))] = now
+            self.writer.write(pack_message(MSG_EDIT, EDIT.pack(wx, wy, wz, voxel_id)))
+        await self.writer.drain()
+
+
+class ClientThread:
+    # a WorldClient for synchronous callers (the game loop): its event loop runs in a daemon
+    # thread, sends are scheduled on it and the stream reaches client.world from that thread
+    def __init__(self, world=None):
+        self.client = WorldClient(world)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        # sends not checked yet, and the first error of one or of the connection
+        self.futures = []
+        self.error = None
+
+    def connect(self, host, port, timeout=10):
+        self.thread.start()
+        self.call(self.client.connect(host, port)).result(timeout)
+
+    def call(self, coroutine):
+        # -> concurrent future of the coroutine running on the client's loop
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        self.futures.append(future)
+        return future
+
+    def poll(self):
+        # per frame: -> None while connected, else the error that ended the connection
+        futures, self.futures = self.futures, []
+        for future in futures:
+            if not future.done():
+                self.futures.append(future)
+            elif self.error is None and future.exception() is not None:
+                self.error = future.exception()
+        receiver = self.client.receiver
+        if self.error is None and receiver is not None and receiver.done():
+            # the receive loop only ends when the server closes the connection
+            error = None if receiver.cancelled() else receiver.exception()
+            self.error = error or ConnectionError('connection closed by the server')
+        return self.error
+
+    def send_position(self, position):
+        self.call(self.client.send_position(position))
+
+    def send_edits(self, edits):
+        self.call(self.client.send_edits(edits))
+
+    def close(self, timeout=10):
+        if self.client.receiver is not None:
+            self.call(self.client.close()).result(timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+        self.loop.close()
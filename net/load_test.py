@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import time
+from settings import *
+from net.client import WorldClient
+from net.server import INTEREST_RADIUS, WorldServer, get_interest
+
+# Loopback load test: an in-process server and N clients that walk and edit.
+#   python -m net.load_test --clients 16 --seconds 10
+
+
+async def run_client(port, rng, seconds, edit_rate, speed, result):
+    client = WorldClient()
+    await client.connect('127.0.0.1', port)
+
+    # spawn somewhere around the world center, walk in a random direction
+    x, z = CENTER_XZ + rng.uniform(-1, 1, 2) * CHUNK_SIZE * 2
+    angle = rng.uniform(0, 2 * np.pi)
+    direction = np.cos(angle), np.sin(angle)
+    y = float(CHUNK_SIZE)
+
+    start = time.perf_counter()
+    initial = len(get_interest((x, y, z), INTEREST_RADIUS))
+    time_to_interest = None
+    next_edit = start
+    await client.send_position((x, y, z))
+
+    step = 0.05
+    while (now := time.perf_counter()) - start < seconds:
+        if time_to_interest is None and client.chunks_received >= initial:
+            time_to_interest = now - start
+
+        x = float(np.clip(x + direction[0] * speed * step, 0, WORLD_X - 1))
+        z = float(np.clip(z + direction[1] * speed * step, 0, WORLD_Z - 1))
+        await client.send_position((x, y, z))
+
+        while next_edit <= now:
+            # toggle a voxel next to the player so every edit changes something
+            wx, wy, wz = int(x) + rng.integers(-4, 5), int(y), int(z) + rng.integers(-4, 5)
+            voxel_id = client.world.get_voxel_id(wx, wy, wz)
+            if voxel_id is not None:
+                await client.send_edit(wx, wy, wz, 0 if voxel_id else 1)
+            next_edit += 1 / edit_rate
+        await asyncio.sleep(step)
+
+    # let the last echoes arrive
+    await asyncio.sleep(0.2)
+    await client.close()
+    result.append((client, time_to_interest))
+
+
+async def load_test(num_clients, seconds, edit_rate, speed):
+    server = WorldServer()
+    port = await server.start()
+    rng = np.random.default_rng(0)
+
+    results = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_client(port, np.random.default_rng(rng.integers(1 << 32)), seconds, edit_rate, speed, results)
+        for _ in range(num_clients)
+    ))
+    elapsed = time.perf_counter() - start
+    stats = server.get_stats()
+    await server.stop()
+
+    clients = [client for client, _ in results]
+    chunks = sum(client.chunks_received for client in clients)
+    received = sum(client.bytes_received for client in clients)
+    to_interest = [t for _, t in results if t is not None]
+    latencies = np.array([t for client in clients for t in client.edit_latencies]) * 1e3
+
+    print(f'clients            {num_clients} for {elapsed:.1f} s')
+    print(f'chunks generated   {stats["chunks_generated"]}')
+    print(f'chunks sent        {chunks}  ({chunks / elapsed:.0f} /s)')
+    print(f'bytes sent         {received / 2 ** 20:.1f} MiB  ({received / 2 ** 20 / elapsed:.1f} MiB/s, '
+          f'{received / max(chunks, 1) / 1024:.1f} KiB per chunk)')
+    print(f'chunk resends      {stats["resends"]}')
+    if to_interest:
+        print(f'initial interest   median {np.median(to_interest) * 1e3:.0f} ms  max {max(to_interest) * 1e3:.0f} ms'
+              f'  ({len(to_interest)}/{num_clients} clients)')
+    if len(latencies):
+        print(f'edit latency       p50 {np.percentile(latencies, 50):.1f} ms  p99 {np.percentile(latencies, 99):.1f} ms'
+              f'  ({len(latencies)} edits)')
+    print(f'server tick        p50 {stats["tick_p50_ms"]:.3f} ms  p99 {stats["tick_p99_ms"]:.3f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Loopback load test of the world server')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--edit-rate', type=float, default=5, help='edits per second per client')
+    parser.add_argument('--speed', type=float, default=PLAYER_SPEED * 1000, help='voxels per second')
+    args = parser.parse_args()
+    asyncio.run(load_test(args.clients, args.seconds, args.edit_rate, args.speed))
@@ -0,0 +1,79 @@
+import struct
+import zlib
+from settings import *
+from journal import get_world_key
+
+# Wire format shared by the world server and its clients. Every message is a header
+# (payload size, message type) followed by the payload; all integers are little endian.
+#
+#   WELCOME   server -> client   world key: seed, chunk size, world size (5 x int64)
+#   POSITION  client -> server   player position (3 x float32), drives interest management
+#   EDIT      client -> server   world voxel position (3 x int32), new voxel id (uint8)
+#   CHUNK     server -> client   chunk index (uint32), zlib compressed voxels
+#   UNLOAD    server -> client   chunk index (uint32), the chunk left the client's interest
+#   EDITS     server -> client   count (uint32), encoded positions (int64[count]), ids (uint8[count])
+
+HEADER = struct.Struct('<IB')
+MSG_WELCOME, MSG_POSITION, MSG_EDIT, MSG_CHUNK, MSG_UNLOAD, MSG_EDITS = range(6)
+
+POSITION = struct.Struct('<3f')
+EDIT = struct.Struct('<3iB')
+CHUNK_INDEX = struct.Struct('<I')
+EDIT_COUNT = struct.Struct('<I')
+
+# voxel ids are packed in 4 bits of the vertex data, the server drops edits to larger ones
+MAX_VOXEL_ID = 15
+# refuse anything larger, no valid message comes close
+MAX_PAYLOAD_SIZE = 16 * CHUNK_VOL
+COMPRESSION_LEVEL = 1
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def pack_message(msg_type, payload=b''):
+    return HEADER.pack(len(payload), msg_type) + payload
+
+
+async def read_message(reader):
+    # -> (message type, payload); raises asyncio.IncompleteReadError when the peer disconnects
+    size, msg_type = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if size > MAX_PAYLOAD_SIZE:
+        raise ProtocolError(f'message of {size} bytes')
+    return msg_type, await reader.readexactly(size)
+
+
+def pack_welcome():
+    return pack_message(MSG_WELCOME, get_world_key().tobytes())
+
+
+def unpack_welcome(payload):
+    if not np.array_equal(np.frombuffer(payload, dtype='int64'), get_world_key()):
+        raise ProtocolError('the server runs a different seed or world size')
+
+
+def pack_chunk(chunk_index, voxels):
+    return pack_message(MSG_CHUNK, CHUNK_INDEX.pack(chunk_index) + zlib.compress(voxels, COMPRESSION_LEVEL))
+
+
+def unpack_chunk(payload):
+    (chunk_index,) = CHUNK_INDEX.unpack_from(payload)
+    voxels = np.frombuffer(zlib.decompress(payload[CHUNK_INDEX.size:]), dtype='uint8')
+    if chunk_index >= WORLD_VOL or len(voxels) != CHUNK_VOL:
+        raise ProtocolError(f'bad chunk {chunk_index}')
+    return chunk_index, voxels
+
+
+def pack_edits(positions, voxel_ids):
+    positions = np.ascontiguousarray(positions, dtype='int64')
+    voxel_ids = np.ascontiguousarray(voxel_ids, dtype='uint8')
+    return pack_message(MSG_EDITS, EDIT_COUNT.pack(len(positions)) + positions.tobytes() + voxel_ids.tobytes())
+
+
+def unpack_edits(payload):
+    (count,) = EDIT_COUNT.unpack_from(payload)
+    offset = EDIT_COUNT.size
+    positions = np.frombuffer(payload, dtype='int64', count=count, offset=offset)
+    voxel_ids = np.frombuffer(payload, dtype='uint8', count=count, offset=offset + 8 * count)
+    return positions, voxel_ids
@@ -0,0 +1,313 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from settings import *
+from terrain_gen import get_chunk_seed, seed_terrain
+from world_objects.chunk import Chunk
+from lighting import decode, encode, get_location
+from pregen import pregenerated_world
+from net.protocol import *
+
+# Headless authoritative world server:
+#   python -m net.server [--host 127.0.0.1] [--port 5555] [--world worlds/island]
+# The server owns the voxels and generates chunks the first time a client needs them,
+# unless they were pregenerated (see pregen.py).
+# Clients send their position and edits. Each client gets the chunks of the columns
+# around it, nearest first, and the edits that touch chunks it already holds.
+
+# chunk columns within this many chunks of the player are streamed to its client
+INTEREST_RADIUS = 5
+# chunks are unloaded one column further out, so walking along a border doesn't thrash
+UNLOAD_RADIUS = INTEREST_RADIUS + 1
+TICK_RATE = 20
+# a client with more edits than this waiting to be sent gets the edited chunks resent instead
+MAX_PENDING_EDITS = 4096
+# edits sent per EDITS message
+EDIT_BATCH = 1024
+
+
+class ServerWorld:
+    # World.voxels without the app: no player, light or meshes, chunks generated on demand
+    def __init__(self):
+        self.voxels = np.zeros([WORLD_VOL, CHUNK_VOL], dtype='uint8')
+        self.is_generated = np.zeros(WORLD_VOL, dtype='bool')
+        self.is_generated[list(pregenerated_world.load(self.voxels))] = True
+        # chunk index -> compressed CHUNK message, dropped when the chunk is edited
+        self.payloads = {}
+        self.num_generated = 0
+        # generation and compression release the GIL, one thread keeps the loop responsive
+        # and the numba random state (per thread) seeded right before each chunk
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        # chunk index -> future of a payload being built
+        self.building = {}
+
+    def get_chunk(self, chunk_index):
+        if not self.is_generated[chunk_index]:
+            x = chunk_index % WORLD_W
+            z = chunk_index // WORLD_W % WORLD_D
+            y = chunk_index // WORLD_AREA
+            seed_terrain(get_chunk_seed((x, y, z)))
+            Chunk.generate_terrain(self.voxels[chunk_index], x * CHUNK_SIZE, y * CHUNK_SIZE, z * CHUNK_SIZE)
+            self.is_generated[chunk_index] = True
+            self.num_generated += 1
+        return self.voxels[chunk_index]
+
+    def build_payload(self, chunk_index):
+        return pack_chunk(chunk_index, self.get_chunk(chunk_index).copy())
+
+    async def get_payload(self, chunk_index):
+        while chunk_index not in self.payloads:
+            if chunk_index not in self.building:
+                loop = asyncio.get_running_loop()
+                self.building[chunk_index] = loop.run_in_executor(self.executor, self.build_payload, chunk_index)
+            future = self.building[chunk_index]
+            payload = await future
+            if self.building.get(chunk_index) is future:
+                del self.building[chunk_index]
+                self.payloads[chunk_index] = payload
+            # else an edit that landed meanwhile dropped the future, the payload is already
+            # stale and the client would skip that edit: built again
+        return self.payloads[chunk_index]
+
+    def apply_edits(self, edits):
+        # [(x, y, z, voxel_id)] -> chunk index -> (encoded positions, new ids) of the voxels that changed,
+        # edits of chunks the worker is still generating are left for the next tick
+        changed, deferred = {}, []
+        for x, y, z, voxel_id in edits:
+            chunk_index, voxel_index = get_location(x, y, z)
+            if not self.is_generated[chunk_index] and chunk_index in self.building:
+                deferred.append((x, y, z, voxel_id))
+                continue
+            voxels = self.get_chunk(chunk_index)
+            if voxels[voxel_index] == voxel_id:
+                continue
+            voxels[voxel_index] = voxel_id
+            self.payloads.pop(chunk_index, None)
+            self.building.pop(chunk_index, None)
+            positions, voxel_ids = changed.setdefault(chunk_index, ([], []))
+            positions.append(encode(x, y, z))
+            voxel_ids.append(voxel_id)
+        return changed, deferred
+
+
+def get_interest(position, radius):
+    # chunk indices of the columns within radius (in chunks) of the position, nearest first
+    px, pz = position[0] / CHUNK_SIZE, position[2] / CHUNK_SIZE
+    cx, cz = int(px), int(pz)
+    columns = []
+    for x in range(max(cx - radius, 0), min(cx + radius + 1, WORLD_W)):
+        for z in range(max(cz - radius, 0), min(cz + radius + 1, WORLD_D)):
+            dist_sq = (x + 0.5 - px) ** 2 + (z + 0.5 - pz) ** 2
+            if dist_sq <= (radius + 0.5) ** 2:
+                columns.append((dist_sq, x, z))
+    columns.sort()
+    return [x + WORLD_W * z + WORLD_AREA * y for _, x, z in columns for y in range(WORLD_H)]
+
+
+class ClientSession:
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.position = None
+
+        # chunks the client holds, chunks it still needs (nearest first), chunks to unload and
+        # edits waiting to be sent
+        self.sent = set()
+        self.wanted = deque()
+        self.unloads = []
+        self.pending_positions = []
+        self.pending_ids = []
+        self.wake = asyncio.Event()
+
+        self.bytes_sent = 0
+        self.chunks_sent = 0
+        self.resends = 0
+
+    async def run(self):
+        sender = asyncio.create_task(self.send_loop())
+        try:
+            await self.send(pack_welcome())
+            while True:
+                msg_type, payload = await read_message(self.reader)
+                if msg_type == MSG_POSITION:
+                    self.set_position(POSITION.unpack(payload))
+                elif msg_type == MSG_EDIT:
+                    x, y, z, voxel_id = EDIT.unpack(payload)
+                    if 0 <= x < WORLD_X and 0 <= y < WORLD_Y and 0 <= z < WORLD_Z and voxel_id <= MAX_VOXEL_ID:
+                        self.server.queued_edits.append((x, y, z, voxel_id))
+                else:
+                    raise ProtocolError(f'unexpected message {msg_type}')
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError):
+            pass
+        finally:
+            sender.cancel()
+            self.writer.close()
+
+    async def send(self, message):
+        # waits while the socket buffer is above its high water mark: a slow client
+        # holds back its own stream instead of growing the server's memory
+        self.writer.write(message)
+        self.bytes_sent += len(message)
+        await self.writer.drain()
+
+    def set_position(self, position):
+        self.position = position
+        interest = get_interest(position, INTEREST_RADIUS)
+        self.wanted = deque(index for index in interest if index not in self.sent)
+
+        keep = set(get_interest(position, UNLOAD_RADIUS))
+        for chunk_index in [index for index in self.sent if index not in keep]:
+            self.sent.discard(chunk_index)
+            self.unloads.append(chunk_index)
+        self.wake.set()
+
+    def add_edits(self, chunk_index, positions, voxel_ids):
+        # edits of chunks the client doesn't hold arrive with the chunk itself
+        if chunk_index not in self.sent:
+            return
+        if len(self.pending_positions) + len(positions) > MAX_PENDING_EDITS:
+            # too far behind: resending whole chunks is cheaper than the backlog
+            self.resend_pending()
+            self.sent.discard(chunk_index)
+            self.wanted.appendleft(chunk_index)
+            self.resends += 1
+        else:
+            self.pending_positions.extend(positions)
+            self.pending_ids.extend(voxel_ids)
+        self.wake.set()
+
+    def resend_pending(self):
+        chunk_indices = {get_location(*decode(pos))[0] for pos in self.pending_positions}
+        for chunk_index in chunk_indices:
+            self.sent.discard(chunk_index)
+            self.wanted.appendleft(chunk_index)
+        self.resends += len(chunk_indices)
+        self.pending_positions.clear()
+        self.pending_ids.clear()
+
+    async def send_loop(self):
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+            while True:
+                if self.unloads:
+                    # in order with the rest of the stream, a chunk already sent is unloaded
+                    # after it and one still being built never goes out
+                    await self.send(pack_message(MSG_UNLOAD, CHUNK_INDEX.pack(self.unloads.pop(0))))
+                elif self.pending_positions:
+                    # edits first: they are small and the client already shows those chunks
+                    positions = self.pending_positions[:EDIT_BATCH]
+                    voxel_ids = self.pending_ids[:EDIT_BATCH]
+                    del self.pending_positions[:EDIT_BATCH], self.pending_ids[:EDIT_BATCH]
+                    await self.send(pack_edits(positions, voxel_ids))
+                elif self.wanted:
+                    chunk_index = self.wanted.popleft()
+                    if chunk_index in self.sent:
+                        continue
+                    self.sent.add(chunk_index)
+                    payload = await self.server.world.get_payload(chunk_index)
+                    if chunk_index not in self.sent:
+                        # unloaded or resent while it was built
+                        continue
+                    await self.send(payload)
+                    self.chunks_sent += 1
+                else:
+                    break
+
+
+class WorldServer:
+    def __init__(self):
+        self.world = ServerWorld()
+        self.sessions = set()
+        self.handlers = set()
+        self.queued_edits = []
+        # counters of the sessions that already ended
+        self.totals = {'chunks_sent': 0, 'bytes_sent': 0, 'resends': 0}
+        self.tick_times = deque(maxlen=1024)
+        self.server = None
+        self.ticker = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        # port 0 picks a free port, see self.port
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        self.ticker = asyncio.create_task(self.tick_loop())
+        return self.port
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.ticker.cancel()
+        self.world.executor.shutdown(cancel_futures=True)
+        self.server.close()
+        for session in list(self.sessions):
+            session.writer.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def handle_client(self, reader, writer):
+        session = ClientSession(self, reader, writer)
+        self.sessions.add(session)
+        self.handlers.add(asyncio.current_task())
+        try:
+            await session.run()
+        finally:
+            self.sessions.discard(session)
+            self.handlers.discard(asyncio.current_task())
+            for name in self.totals:
+                self.totals[name] += getattr(session, name)
+
+    async def tick_loop(self):
+        interval = 1 / TICK_RATE
+        while True:
+            start = time.perf_counter()
+            self.tick()
+            self.tick_times.append(time.perf_counter() - start)
+            await asyncio.sleep(max(interval - (time.perf_counter() - start), 0))
+
+    def tick(self):
+        # applies the edits received since the last tick and fans the changes out
+        if not self.queued_edits:
+            return
+        changed, self.queued_edits = self.world.apply_edits(self.queued_edits)
+        for chunk_index, (positions, voxel_ids) in changed.items():
+            for session in self.sessions:
+                session.add_edits(chunk_index, positions, voxel_ids)
+
+    def get_stats(self):
+        ticks = np.array(self.tick_times) * 1e3 if self.tick_times else np.zeros(1)
+        return {
+            'clients': len(self.sessions),
+            'chunks_generated': self.world.num_generated,
+            **{name: total + sum(getattr(session, name) for session in self.sessions)
+               for name, total in self.totals.items()},
+            'tick_p50_ms': float(np.percentile(ticks, 50)),
+            'tick_p99_ms': float(np.percentile(ticks, 99)),
+        }
+
+
+async def serve(host, port):
+    server = WorldServer()
+    await server.start(host, port)
+    print(f'world server on {host}:{server.port}')
+    while True:
+        await asyncio.sleep(10)
+        print(server.get_stats())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Headless authoritative world server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--world', help='pregenerated world directory (see pregen.py)')
+    args = parser.parse_args()
+    if args.world:
+        pregenerated_world.path = args.world
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
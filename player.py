@@ -1,6 +1,7 @@
 import pygame as pg
 from camera import Camera
 from settings import *
+from profiler import frame_profiler
 
 
 class Player(Camera):
@@ -14,6 +15,7 @@ class Player(Camera):
         self.creative_mode = False  # Iniciar en modo supervivencia
         self.jump_key_held = False  # Para controlar saltos repetidos
         self.max_jump_height = 0.0  # Para medir altura máxima de salto (debug)
+        self.is_sprinting = False  # Ctrl presionado en el último frame (HUD)
         
         # Posición de los pies del jugador (para colisiones)
         self.feet_position = glm.vec3(position)
@@ -25,8 +27,11 @@ class Player(Camera):
         print(f"DEBUG: Player initialized at feet_pos: {self.feet_position}, eye_pos: {self.position}")
 
     def update(self):
-        self.apply_physics()
-        self.keyboard_control()
+        # nothing to stand on until a progressive startup has loaded the spawn area
+        if self.app.scene.world.is_spawned:
+            with frame_profiler.section('physics'):
+                self.apply_physics()
+            self.keyboard_control()
         self.mouse_control()
         super().update()
 
@@ -163,15 +168,23 @@ class Player(Camera):
         if event.type == pg.KEYDOWN and event.key == pg.K_r:
             self.app.scene.world.spawn_player_on_surface(self)
 
+        # Deshacer / rehacer ediciones con Ctrl+Z / Ctrl+Y
+        if event.type == pg.KEYDOWN and event.mod & pg.KMOD_CTRL:
+            if event.key == pg.K_z:
+                self.app.scene.world.undo()
+            elif event.key == pg.K_y:
+                self.app.scene.world.redo()
+
     def mouse_control(self):
-        mouse_dx, mouse_dy = pg.mouse.get_rel()
+        mouse_dx, mouse_dy = self.app.input.get_rel()
         if mouse_dx:
             self.rotate_yaw(delta_x=mouse_dx * MOUSE_SENSITIVITY)
         if mouse_dy:
             self.rotate_pitch(delta_y=mouse_dy * MOUSE_SENSITIVITY)
 
     def keyboard_control(self):
-        key_state = pg.key.get_pressed()
+        key_state = self.app.input.get_pressed()
+        self.is_sprinting = key_state[pg.K_LCTRL]
         
         # Determinar velocidad según el modo y si está corriendo
         if self.creative_mode:
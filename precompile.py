@@ -0,0 +1,184 @@
+import shutil
+import sys
+import time
+from numba import types
+from settings import *
+from terrain_gen import get_height
+from world_objects.chunk import Chunk
+from meshes.chunk_mesh_builder import build_chunk_mesh
+from meshes.binary_mesh_builder import build_chunk_mesh_binary
+from meshes.cloud_mesh import CloudMesh
+from lighting import LIGHT_EMISSION, update_light, build_sunlight, build_block_light, build_column_light
+import world_edit
+import journal
+import chunk_hash
+import water
+import entities
+import navigation
+import voxel_tree
+from meshes.water_mesh_builder import build_water_mesh
+
+# Compiles every numba kernel into the on-disk cache ahead of the first launch.
+#   python -m precompile            # compile (or load) and report the time per kernel
+#   python -m precompile --clear    # drop the cache first to measure a cold start
+
+
+def get_kernels():
+    # (name, dispatcher, warm-up call) - the calls use the same argument types as the engine,
+    # whole-world kernels are compiled from their signature instead of running them
+    world_array = types.uint8[:, ::1]
+    flat_array = types.uint8[::1]
+    voxels = np.zeros(CHUNK_VOL, dtype='uint8')
+    world_voxels = np.zeros([1, CHUNK_VOL], dtype='uint8')
+    world_light = np.zeros([1, CHUNK_VOL], dtype='uint8')
+    dirty = np.zeros(WORLD_VOL, dtype='uint8')
+    changed = np.zeros(1, dtype='int64')
+    chunk_indices = np.zeros(1, dtype='uint16')
+    voxel_indices = np.zeros(1, dtype='uint32')
+    slots = np.full(WORLD_VOL, -1, dtype='int32')
+    runs = np.zeros(0, dtype='uint32')
+    hashes = np.zeros(WORLD_VOL, dtype='uint64')
+    nodes = np.zeros(2 * chunk_hash.NUM_LEAVES, dtype='uint64')
+    water_slots = np.full(WORLD_VOL, -1, dtype='int32')
+    water_slots[0] = 0
+    levels = np.zeros([1, CHUNK_VOL // 2], dtype='uint8')
+    cells = np.zeros(1, dtype='int64')
+    positions = np.zeros([1, 3], dtype='float32')
+    half_extents = entities.KIND_HALF_EXTENTS[:1].copy()
+    pairs = np.zeros([1, 2], dtype='int64')
+    box = navigation.get_chunk_box(0)
+    tree = voxel_tree.VoxelTree(1, capacity=1)
+    slab = np.zeros((voxel_tree.TREE_SIZE,) * 3, dtype='uint8')
+    rays = np.zeros([1, 3], dtype='float64')
+    box_corners = np.zeros([1, 3], dtype='int64')
+    cloud_data = np.zeros(CLOUD_TILE_AREA, dtype='uint8')
+    visited = np.zeros(CLOUD_TILE_AREA, dtype='uint8')
+    cloud_mesh = np.empty(CLOUD_TILE_AREA * 6 * 2, dtype='uint8')
+
+    return [
+        ('get_height', get_height, lambda: get_height(CENTER_XZ, CENTER_XZ)),
+        ('Chunk.generate_terrain', Chunk.generate_terrain,
+         lambda: Chunk.generate_terrain(voxels, 0, 0, 0)),
+        ('Chunk.get_summary', Chunk.get_summary, lambda: Chunk.get_summary(voxels)),
+        ('build_chunk_mesh', build_chunk_mesh,
+         lambda: build_chunk_mesh(chunk_voxels=world_voxels[0], format_size=1, chunk_pos=(0, 0, 0),
+                                  world_voxels=world_voxels, world_light=world_light)),
+        ('build_chunk_mesh_binary', build_chunk_mesh_binary,
+         lambda: build_chunk_mesh_binary.compile((flat_array, types.int64, types.UniTuple(types.int64, 3),
+                                                  world_array, world_array))),
+        ('lighting.update_light', update_light,
+         lambda: update_light(world_voxels, world_light, changed, LIGHT_EMISSION, dirty)),
+        ('lighting.build_sunlight', build_sunlight,
+         lambda: build_sunlight.compile((world_array, world_array, flat_array))),
+        ('lighting.build_block_light', build_block_light,
+         lambda: build_block_light.compile((world_array, world_array, flat_array, flat_array))),
+        ('lighting.build_column_light', build_column_light,
+         lambda: build_column_light.compile((world_array, world_array, types.int64, flat_array, flat_array))),
+        ('world_edit.fill_box', world_edit.fill_box, lambda: world_edit.fill_box(world_voxels, 0, 0, 0, 0, 0, 0, 0)),
+        ('world_edit.fill_sphere', world_edit.fill_sphere,
+         lambda: world_edit.fill_sphere(world_voxels, 0, 0, 0, 0.0, 0)),
+        ('world_edit.replace_voxels', world_edit.replace_voxels,
+         lambda: world_edit.replace_voxels(world_voxels, 0, 0, 0, 0, 0, 0, 0, 0)),
+        ('world_edit.paste_voxels', world_edit.paste_voxels,
+         lambda: world_edit.paste_voxels(world_voxels, 0, 0, 0, np.zeros([1, 1, 1], dtype='uint8'), True)),
+        ('world_edit.get_edited_chunks', world_edit.get_edited_chunks,
+         lambda: world_edit.get_edited_chunks(changed)),
+        ('journal.record_edits', journal.record_edits,
+         lambda: journal.record_edits(world_voxels, changed, voxels[:1], chunk_indices, voxel_indices,
+                                      voxels[:1], voxels[:1], 0)),
+        ('journal.replay_edits', journal.replay_edits,
+         lambda: journal.replay_edits(world_voxels, chunk_indices, voxel_indices, voxels, 0, 0, True)),
+        ('journal.xor_edits', journal.xor_edits,
+         lambda: journal.xor_edits(world_voxels, slots, chunk_indices, voxel_indices, voxels, voxels, 0, 0)),
+        ('journal.rle_encode', journal.rle_encode, lambda: journal.rle_encode(voxels)),
+        ('journal.rle_decode', journal.rle_decode, lambda: journal.rle_decode(runs, voxels)),
+        ('journal.rle_xor', journal.rle_xor, lambda: journal.rle_xor(runs, voxels, 0)),
+        ('chunk_hash.hash_chunks', chunk_hash.hash_chunks,
+         lambda: chunk_hash.hash_chunks(world_voxels, hashes[:1], changed)),
+        ('chunk_hash.build_tree', chunk_hash.build_tree, lambda: chunk_hash.build_tree(hashes, nodes)),
+        ('chunk_hash.update_tree', chunk_hash.update_tree, lambda: chunk_hash.update_tree(hashes, nodes, changed)),
+        ('chunk_hash.diff_trees', chunk_hash.diff_trees, lambda: chunk_hash.diff_trees(nodes, nodes)),
+        ('chunk_hash.diff_columns', chunk_hash.diff_columns,
+         lambda: chunk_hash.diff_columns(hashes, hashes, changed)),
+        ('water.get_new_levels', water.get_new_levels,
+         lambda: water.get_new_levels(world_voxels, levels, water_slots, cells)),
+        ('water.get_missing_slots', water.get_missing_slots,
+         lambda: water.get_missing_slots(water_slots, cells, voxels[:1])),
+        ('water.set_levels', water.set_levels,
+         lambda: water.set_levels(levels, water_slots, cells, voxels[:1], dirty)),
+        ('water.get_activated', water.get_activated, lambda: water.get_activated(cells)),
+        ('water.get_wet', water.get_wet, lambda: water.get_wet(world_voxels, levels, water_slots, cells)),
+        ('water.clear_solid', water.clear_solid,
+         lambda: water.clear_solid(world_voxels, levels, water_slots, cells, dirty)),
+        ('water.get_sea_chunks', water.get_sea_chunks,
+         lambda: water.get_sea_chunks.compile((world_array, types.int64, types.int64, types.int64, types.int64))),
+        ('water.fill_sea', water.fill_sea,
+         lambda: water.fill_sea.compile((world_array, world_array, types.int32[::1],
+                                         types.int64, types.int64, types.int64, types.int64))),
+        ('water.fill_levels', water.fill_levels,
+         lambda: water.fill_levels(world_voxels, levels, water_slots, 0, 0, 0, 1, 1, 1, 0, dirty)),
+        ('build_water_mesh', build_water_mesh,
+         lambda: build_water_mesh(world_voxels, levels, water_slots, 0)),
+        ('world_edit.place_voxels', world_edit.place_voxels,
+         lambda: world_edit.place_voxels(world_voxels, pairs[:0, :1].repeat(3, axis=1), voxels[:0])),
+        ('entities.integrate_entities', entities.integrate_entities,
+         lambda: entities.integrate_entities(world_voxels, positions, positions.copy(), half_extents,
+                                             positions.copy(), np.zeros(1, dtype='bool'), 0, 50.0)),
+        ('entities.sort_by_column', entities.sort_by_column,
+         lambda: entities.sort_by_column(positions, 1, 2.0, 1, 1)),
+        ('entities.collide_entities', entities.collide_entities,
+         lambda: entities.collide_entities(positions, half_extents, voxels[:1], 1, 2.0, 1, 1,
+                                           entities.sort_by_column(positions, 1, 2.0, 1, 1)[1], pairs,
+                                           positions.copy())),
+        ('navigation.is_walkable', navigation.is_walkable,
+         lambda: navigation.is_walkable(world_voxels, 0, 0, 0)),
+        ('navigation.build_cluster', navigation.build_cluster,
+         lambda: navigation.build_cluster.compile((world_array, types.int64))),
+        ('navigation.find_path_in_box', navigation.find_path_in_box,
+         lambda: navigation.find_path_in_box(world_voxels, 0, 0, box)),
+        ('navigation.get_costs_in_chunk', navigation.get_costs_in_chunk,
+         lambda: navigation.get_costs_in_chunk(world_voxels, 0, 0, cells)),
+        ('navigation.search_graph', navigation.search_graph,
+         lambda: navigation.search_graph(cells, np.zeros(2, dtype='int64'), cells[:0], np.zeros(0), cells,
+                                         np.zeros(1), cells, np.zeros(1), 0)),
+        ('voxel_tree.build_slab', voxel_tree.build_slab,
+         lambda: voxel_tree.build_slab(slab, tree.masks, tree.children, tree.values, 0)),
+        ('voxel_tree.tree_get_voxels', voxel_tree.tree_get_voxels,
+         lambda: voxel_tree.tree_get_voxels(*tree.arrays, tree.height, box_corners)),
+        ('voxel_tree.tree_cast_rays', voxel_tree.tree_cast_rays,
+         lambda: voxel_tree.tree_cast_rays(*tree.arrays, tree.height, rays, rays, 1.0)),
+        ('voxel_tree.dense_get_voxels', voxel_tree.dense_get_voxels,
+         lambda: voxel_tree.dense_get_voxels(world_voxels, WORLD_Y, box_corners)),
+        ('voxel_tree.dense_is_box_solid', voxel_tree.dense_is_box_solid,
+         lambda: voxel_tree.dense_is_box_solid(world_voxels, WORLD_Y, 0, 0, 0, 1, 1, 1)),
+        ('voxel_tree.tree_are_boxes_solid', voxel_tree.tree_are_boxes_solid,
+         lambda: voxel_tree.tree_are_boxes_solid(*tree.arrays, tree.height, box_corners, box_corners)),
+        ('CloudMesh.gen_clouds', CloudMesh.gen_clouds, lambda: CloudMesh.gen_clouds(cloud_data, 0, 0)),
+        ('CloudMesh.build_mesh', CloudMesh.build_mesh,
+         lambda: CloudMesh.build_mesh(cloud_data, visited, cloud_mesh)),
+    ]
+
+
+def precompile(verbose=True):
+    timings = {}
+    start = time.perf_counter()
+    for name, dispatcher, warm_up in get_kernels():
+        kernel_start = time.perf_counter()
+        warm_up()
+        timings[name] = time.perf_counter() - kernel_start
+
+        if verbose:
+            stats = dispatcher.stats
+            source = 'cache' if sum(stats.cache_hits.values()) else 'compiled'
+            print(f'{name:<32} {timings[name]:8.3f} s  ({source})')
+
+    timings['total'] = time.perf_counter() - start
+    if verbose:
+        print(f'{"total":<32} {timings["total"]:8.3f} s  cache: {numba.config.CACHE_DIR}')
+    return timings
+
+
+if __name__ == '__main__':
+    if '--clear' in sys.argv[1:]:
+        shutil.rmtree(numba.config.CACHE_DIR, ignore_errors=True)
+    precompile()
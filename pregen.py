@@ -0,0 +1,325 @@
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from multiprocessing.shared_memory import SharedMemory
+from settings import *
+from terrain_gen import get_chunk_seed, seed_terrain
+from world_objects.chunk import Chunk
+from meshes.binary_mesh_builder import build_chunk_mesh_binary
+from lighting import LIGHT_EMISSION, build_sunlight, build_block_light
+from journal import get_world_key
+
+# Offline world pregeneration, no window or GL context:
+#   python -m pregen worlds/island                       # every chunk, one worker per core
+#   python -m pregen worlds/island --columns 0:8,0:8     # chunk columns x 0..7, z 0..7
+#   python -m pregen worlds/island --mesh --workers 8    # the chunk meshes as well
+#   python main.py --world=worlds/island                 # or VOXEL_WORLD=worlds/island
+# A world is a directory with world.json and a region file per REGION_SIZE x REGION_SIZE chunk
+# columns (every chunk of those columns). Workers generate whole regions and write each one
+# under a temporary name before renaming it, so an interrupted run resumes by skipping the
+# region files that exist. With --mesh a second pass meshes the regions over shared memory
+# holding their voxels, the ones around them and the light, built once, that the game would
+# compute; the game uploads those meshes instead of building its first ones.
+
+WORLD_ENV = 'VOXEL_WORLD'
+WORLD_FLAG = '--world'
+# 2: stored mesh vertices hold their voxel's position, see chunk_mesh_builder.pack_data
+WORLD_VERSION = 2
+MANIFEST_NAME = 'world.json'
+REGION_SIZE = 4
+# ChunkMesh.format_size: one packed uint32 per vertex
+MESH_FORMAT_SIZE = 1
+
+NUM_REGIONS_X = (WORLD_W + REGION_SIZE - 1) // REGION_SIZE
+NUM_REGIONS_Z = (WORLD_D + REGION_SIZE - 1) // REGION_SIZE
+
+
+def get_region_path(path, region):
+    rx, rz = region
+    return os.path.join(path, f'r.{rx}.{rz}.npz')
+
+
+def get_region_chunks(region):
+    # chunk indices of the region's columns, in ascending order
+    rx, rz = region
+    xs = range(rx * REGION_SIZE, min((rx + 1) * REGION_SIZE, WORLD_W))
+    zs = range(rz * REGION_SIZE, min((rz + 1) * REGION_SIZE, WORLD_D))
+    return np.array(sorted(x + WORLD_W * z + WORLD_AREA * y for x in xs for z in zs for y in range(WORLD_H)),
+                    dtype='int64')
+
+
+def get_regions(columns):
+    # regions overlapping the chunk column range (x0, x1, z0, z1), half-open
+    x0, x1, z0, z1 = columns
+    return [(rx, rz)
+            for rz in range(z0 // REGION_SIZE, (z1 + REGION_SIZE - 1) // REGION_SIZE)
+            for rx in range(x0 // REGION_SIZE, (x1 + REGION_SIZE - 1) // REGION_SIZE)]
+
+
+def get_chunk_position(chunk_index):
+    return chunk_index % WORLD_W, chunk_index // WORLD_AREA, chunk_index // WORLD_W % WORLD_D
+
+
+def generate_chunk(voxels, chunk_index):
+    # what Chunk.build_voxels writes, without a Chunk
+    x, y, z = get_chunk_position(chunk_index)
+    seed_terrain(get_chunk_seed((x, y, z)))
+    Chunk.generate_terrain(voxels, x * CHUNK_SIZE, y * CHUNK_SIZE, z * CHUNK_SIZE)
+
+
+def save_region(path, region, chunk_indices, voxels, meshes=None):
+    arrays = dict(world_key=get_world_key(), chunk_indices=chunk_indices, voxels=voxels)
+    if meshes is not None:
+        arrays['mesh_offsets'] = np.cumsum([0] + [len(mesh) for mesh in meshes])
+        arrays['meshes'] = np.concatenate(meshes)
+    # a region file either exists whole or not at all
+    region_path = get_region_path(path, region)
+    temp_path = region_path[:-len('.npz')] + '.tmp.npz'
+    np.savez_compressed(temp_path, **arrays)
+    os.replace(temp_path, region_path)
+
+
+def load_region(region_path):
+    # -> chunk indices, their voxels and their meshes (None if the region wasn't meshed)
+    with np.load(region_path) as data:
+        if not np.array_equal(data['world_key'], get_world_key()):
+            raise ValueError(f'{region_path} was generated for a different seed or world size')
+        chunk_indices, voxels = data['chunk_indices'], data['voxels']
+        if 'meshes' not in data.files:
+            return chunk_indices, voxels, None
+        offsets, meshes = data['mesh_offsets'], data['meshes']
+        return chunk_indices, voxels, [meshes[offsets[i]:offsets[i + 1]] for i in range(len(chunk_indices))]
+
+
+def is_region_meshed(region_path):
+    with np.load(region_path) as data:
+        return 'meshes' in data.files
+
+
+def generate_region(path, region):
+    # worker: -> chunks generated
+    chunk_indices = get_region_chunks(region)
+    voxels = np.zeros([len(chunk_indices), CHUNK_VOL], dtype='uint8')
+    for i, chunk_index in enumerate(chunk_indices):
+        generate_chunk(voxels[i], chunk_index)
+    save_region(path, region, chunk_indices, voxels)
+    return len(chunk_indices)
+
+
+# the world voxels and light of the mesh pass, attached once per worker
+shared_world = {}
+
+
+def attach_world(voxels_name, light_name):
+    for name, key in ((voxels_name, 'voxels'), (light_name, 'light')):
+        memory = SharedMemory(name=name)
+        shared_world[key + '_memory'] = memory
+        shared_world[key] = np.ndarray([WORLD_VOL, CHUNK_VOL], dtype='uint8', buffer=memory.buf)
+
+
+def mesh_region(path, region):
+    # worker: rewrites the region file with the meshes of its chunks; -> chunks meshed
+    voxels, light = shared_world['voxels'], shared_world['light']
+    chunk_indices = get_region_chunks(region)
+    meshes = []
+    for chunk_index in chunk_indices:
+        if not voxels[chunk_index].any():
+            meshes.append(np.empty(0, dtype='uint32'))
+            continue
+        meshes.append(build_chunk_mesh_binary(chunk_voxels=voxels[chunk_index], format_size=MESH_FORMAT_SIZE,
+                                              chunk_pos=get_chunk_position(chunk_index), world_voxels=voxels,
+                                              world_light=light))
+    save_region(path, region, chunk_indices, voxels[chunk_indices], meshes)
+    return len(chunk_indices)
+
+
+class Progress:
+    def __init__(self, name, num_regions):
+        self.name = name
+        self.num_regions = num_regions
+        self.num_done = 0
+        self.num_chunks = 0
+        self.start = time.perf_counter()
+
+    def add(self, num_chunks):
+        self.num_done += 1
+        self.num_chunks += num_chunks
+        elapsed = time.perf_counter() - self.start
+        rate = self.num_chunks / elapsed
+        eta = elapsed / self.num_done * (self.num_regions - self.num_done)
+        print(f'\r{self.name}: {self.num_done}/{self.num_regions} regions, {self.num_chunks} chunks, '
+              f'{rate:.1f} chunks/s, eta {eta:.0f} s ', end='', flush=True)
+
+    def finish(self):
+        if self.num_regions:
+            print()
+        return {'regions': self.num_done, 'chunks': self.num_chunks,
+                'seconds': time.perf_counter() - self.start}
+
+
+def run_pool(name, function, path, regions, workers, initializer=None, initargs=()):
+    progress = Progress(name, len(regions))
+    if regions:
+        with multiprocessing.Pool(min(workers, len(regions)), initializer, initargs) as pool:
+            for num_chunks in pool.imap_unordered(function, [(path, region) for region in regions]):
+                progress.add(num_chunks)
+    return progress.finish()
+
+
+def generate_task(task):
+    return generate_region(*task)
+
+
+def mesh_task(task):
+    return mesh_region(*task)
+
+
+def open_world(path):
+    # creates the world directory, or checks that an existing one matches this world
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    manifest = {'version': WORLD_VERSION, 'world_key': get_world_key().tolist(), 'region_size': REGION_SIZE}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            existing = json.load(file)
+        if existing != manifest:
+            raise ValueError(f'{path} holds a different world: {existing}')
+    else:
+        os.makedirs(path, exist_ok=True)
+        with open(manifest_path, 'w') as file:
+            json.dump(manifest, file)
+
+
+def build_mesh_world(path, regions, voxels, light):
+    # the voxels of the regions and of the chunk columns around them (read from their region
+    # files or generated), then the light over them; light spreads 15 voxels, less than a
+    # chunk, so the rest of the world can stay empty
+    is_needed = np.zeros(WORLD_VOL, dtype='bool')
+    for region in regions:
+        for chunk_index in get_region_chunks(region):
+            x, y, z = get_chunk_position(chunk_index)
+            for dx in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    if 0 <= x + dx < WORLD_W and 0 <= z + dz < WORLD_D:
+                        is_needed[x + dx + WORLD_W * (z + dz) + WORLD_AREA * y] = True
+
+    voxels[:] = 0
+    is_loaded = np.zeros(WORLD_VOL, dtype='bool')
+    needed_regions = {(x // REGION_SIZE, z // REGION_SIZE)
+                      for x, _, z in map(get_chunk_position, np.flatnonzero(is_needed))}
+    for region in needed_regions:
+        region_path = get_region_path(path, region)
+        if os.path.exists(region_path):
+            chunk_indices, region_voxels, _ = load_region(region_path)
+            voxels[chunk_indices] = region_voxels
+            is_loaded[chunk_indices] = True
+    for chunk_index in np.flatnonzero(is_needed & ~is_loaded):
+        generate_chunk(voxels[chunk_index], chunk_index)
+
+    light[:] = 0
+    dirty = np.zeros(WORLD_VOL, dtype='uint8')
+    build_sunlight(voxels, light, dirty)
+    build_block_light(voxels, light, LIGHT_EMISSION, dirty)
+
+
+def pregenerate(path, columns=(0, WORLD_W, 0, WORLD_D), mesh=False, workers=None):
+    # -> stats per pass; regions whose files exist are skipped, so a rerun resumes
+    workers = workers or os.cpu_count() or 1
+    open_world(path)
+    regions = get_regions(columns)
+    report = {'regions': len(regions)}
+
+    missing = [region for region in regions if not os.path.exists(get_region_path(path, region))]
+    report['generate'] = run_pool('generate', generate_task, path, missing, workers)
+    if not mesh:
+        return report
+
+    unmeshed = [region for region in regions if not is_region_meshed(get_region_path(path, region))]
+    if not unmeshed:
+        report['mesh'] = Progress('mesh', 0).finish()
+        return report
+    start = time.perf_counter()
+    memories = [SharedMemory(create=True, size=WORLD_VOL * CHUNK_VOL) for _ in range(2)]
+    try:
+        voxels, light = (np.ndarray([WORLD_VOL, CHUNK_VOL], dtype='uint8', buffer=memory.buf)
+                         for memory in memories)
+        build_mesh_world(path, unmeshed, voxels, light)
+        report['light_seconds'] = time.perf_counter() - start
+        report['mesh'] = run_pool('mesh', mesh_task, path, unmeshed, workers, attach_world,
+                                  tuple(memory.name for memory in memories))
+        del voxels, light
+    finally:
+        for memory in memories:
+            memory.close()
+            memory.unlink()
+    return report
+
+
+class PregeneratedWorld:
+    # the world directory World and the server load their chunks from, if one is configured
+    def __init__(self):
+        self.path = None
+
+    def configure(self, argv=()):
+        path = os.environ.get(WORLD_ENV)
+        for arg in argv:
+            if arg.startswith(WORLD_FLAG + '='):
+                path = arg.split('=', 1)[1]
+        self.path = path or None
+
+    def load(self, voxels):
+        # copies the stored chunks into voxels; -> chunk index -> stored mesh (None if unmeshed)
+        if self.path is None:
+            return {}
+        open_world(self.path)
+        chunks = {}
+        for rz in range(NUM_REGIONS_Z):
+            for rx in range(NUM_REGIONS_X):
+                region_path = get_region_path(self.path, (rx, rz))
+                if not os.path.exists(region_path):
+                    continue
+                chunk_indices, region_voxels, meshes = load_region(region_path)
+                voxels[chunk_indices] = region_voxels
+                for i, chunk_index in enumerate(chunk_indices):
+                    chunks[int(chunk_index)] = None if meshes is None else meshes[i]
+        return chunks
+
+
+pregenerated_world = PregeneratedWorld()
+pregenerated_world.configure()
+
+
+def parse_columns(value):
+    # 'x0:x1,z0:z1' in chunk columns
+    (x0, x1), (z0, z1) = (map(int, part.split(':')) for part in value.split(','))
+    if not (0 <= x0 < x1 <= WORLD_W and 0 <= z0 < z1 <= WORLD_D):
+        raise argparse.ArgumentTypeError(f'columns must lie within 0:{WORLD_W},0:{WORLD_D}')
+    return x0, x1, z0, z1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pregenerates world chunks to a directory the game can load')
+    parser.add_argument('path', help='world directory, created if missing and resumed if not')
+    parser.add_argument('--columns', type=parse_columns, default=(0, WORLD_W, 0, WORLD_D),
+                        help='chunk column range x0:x1,z0:z1 (default: the whole world)')
+    parser.add_argument('--mesh', action='store_true', help='also store the chunk meshes')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('-o', '--output', help='write the report as JSON')
+    args = parser.parse_args(argv)
+
+    report = pregenerate(args.path, args.columns, args.mesh, args.workers)
+    for name in ('generate', 'mesh'):
+        if name in report:
+            stats = report[name]
+            rate = stats['chunks'] / stats['seconds'] if stats['chunks'] else 0
+            print(f'{name}: {stats["chunks"]} chunks in {stats["seconds"]:.2f} s ({rate:.1f} chunks/s), '
+                  f'{report["regions"] - stats["regions"]} of {report["regions"]} regions already done')
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from functools import wraps
+import numpy as np
+from numba.core import event
+
+# enable with VOXEL_PROFILE_STARTUP=1 (report to stdout) or VOXEL_PROFILE_STARTUP=report.json,
+# or with the --profile-startup[=report.json] command line flag
+PROFILE_STARTUP_ENV = 'VOXEL_PROFILE_STARTUP'
+PROFILE_STARTUP_FLAG = '--profile-startup'
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.output_path = None
+
+        # phase name -> accumulated timings, in the order phases were first entered
+        self.phases = {}
+        # sample name -> list of per-item wall times (e.g. one per chunk)
+        self.samples = {}
+        # milestone name -> seconds since this module was imported, recorded even when disabled
+        self.milestones = {}
+        self.import_time = time.perf_counter()
+
+        self.depth = 0
+        self.start_time = None
+        # accumulates the time numba spends compiling, across all threads
+        self.jit_listener = event.TimingListener()
+
+    def configure(self, argv=()):
+        value = os.environ.get(PROFILE_STARTUP_ENV)
+        for arg in argv:
+            if arg == PROFILE_STARTUP_FLAG:
+                value = value or '1'
+            elif arg.startswith(PROFILE_STARTUP_FLAG + '='):
+                value = arg.split('=', 1)[1]
+
+        if value and value != '0':
+            self.enable(output_path=None if value == '1' else value)
+
+    def enable(self, output_path=None):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.output_path = output_path
+        self.start_time = time.perf_counter()
+        event.register('numba:compile', self.jit_listener)
+
+    def get_jit_time(self):
+        return self.jit_listener.duration if self.jit_listener.done else 0.0
+
+    @contextmanager
+    def timed(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        phase = self.phases.setdefault(name, {
+            'depth': self.depth, 'calls': 0, 'wall_time': 0.0, 'jit_compile_time': 0.0
+        })
+        self.depth += 1
+        jit_time = self.get_jit_time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            phase['wall_time'] += time.perf_counter() - start
+            phase['jit_compile_time'] += self.get_jit_time() - jit_time
+            phase['calls'] += 1
+            self.depth -= 1
+
+    def phase(self, name):
+        # decorator form of timed()
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.timed(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def mark(self, name):
+        # the first time a milestone is reached (first frame, interactive, world loaded)
+        if name not in self.milestones:
+            self.milestones[name] = time.perf_counter() - self.import_time
+
+    def get_milestone_text(self):
+        return ', '.join(f'{name.replace("_", " ")} {seconds:.2f} s'
+                         for name, seconds in self.milestones.items())
+
+    def add_sample(self, name, wall_time):
+        if self.enabled:
+            self.samples.setdefault(name, []).append(wall_time)
+
+    @staticmethod
+    def get_stats(values):
+        values = np.asarray(values, dtype='float64')
+        p50, p90, p99 = np.percentile(values, (50, 90, 99))
+        return {
+            'count': len(values),
+            'total': float(values.sum()),
+            'mean': float(values.mean()),
+            'min': float(values.min()),
+            'p50': float(p50),
+            'p90': float(p90),
+            'p99': float(p99),
+            'max': float(values.max()),
+        }
+
+    def get_report(self):
+        phases = []
+        for name, phase in self.phases.items():
+            phases.append({
+                'name': name,
+                **phase,
+                'exec_time': phase['wall_time'] - phase['jit_compile_time'],
+            })
+
+        return {
+            'total_wall_time': time.perf_counter() - self.start_time,
+            'jit_compile_time': self.get_jit_time(),
+            'milestones': self.milestones,
+            'phases': phases,
+            'samples': {name: self.get_stats(values) for name, values in self.samples.items()},
+        }
+
+    def report(self):
+        if not self.enabled:
+            return None
+
+        report = self.get_report()
+        text = json.dumps(report, indent=2)
+        if self.output_path:
+            with open(self.output_path, 'w') as file:
+                file.write(text)
+        else:
+            print(text, file=sys.stdout)
+        return report
+
+
+startup_profiler = StartupProfiler()
+startup_profiler.configure()
+
+
+# per-frame sections, timed inclusively (physics and ray_cast are also part of player and world)
+FRAME_SECTIONS = (
+    'events', 'player', 'physics', 'world', 'ray_cast', 'network', 'jobs', 'flow', 'entities', 'remesh', 'chunks', 'clouds', 'water', 'flip'
+)
+# enable with VOXEL_FRAME_PROFILE=frames.json (or .csv) or --profile-frames=frames.json,
+# or toggle the caption overlay in game with F3
+PROFILE_FRAMES_ENV = 'VOXEL_FRAME_PROFILE'
+PROFILE_FRAMES_FLAG = '--profile-frames'
+FRAME_HISTORY = 1024
+DUMP_INTERVAL = 5.0  # seconds
+
+
+class FrameSection:
+    __slots__ = ('profiler', 'index', 'start')
+
+    def __init__(self, profiler, index):
+        self.profiler = profiler
+        self.index = index
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter() if self.profiler.enabled else None
+
+    def __exit__(self, *exc_info):
+        if self.start is not None:
+            self.profiler.current[self.index] += time.perf_counter() - self.start
+
+
+class FrameProfiler:
+    def __init__(self, sections=FRAME_SECTIONS, num_frames=FRAME_HISTORY):
+        self.enabled = False
+        self.show_overlay = False
+        self.dump_path = None
+        self.last_dump = 0.0
+
+        self.names = ('frame',) + tuple(sections)
+        self.sections = {name: FrameSection(self, i) for i, name in enumerate(self.names)}
+        # ring buffer of recent frames, one column per section, column 0 is the whole frame
+        self.history = np.zeros([num_frames, len(self.names)], dtype='float64')
+        self.current = np.zeros(len(self.names), dtype='float64')
+        self.num_frames = 0
+        self.frame_start = None
+
+    def configure(self, argv=()):
+        path = os.environ.get(PROFILE_FRAMES_ENV)
+        for arg in argv:
+            if arg.startswith(PROFILE_FRAMES_FLAG + '='):
+                path = arg.split('=', 1)[1]
+        if path:
+            self.dump_path = path
+            self.enabled = True
+
+    def start(self, num_frames=FRAME_HISTORY):
+        # keeps every frame from now on, e.g. the whole of a replay of num_frames
+        self.history = np.zeros([num_frames, len(self.names)], dtype='float64')
+        self.num_frames = 0
+        self.enabled = True
+
+    def toggle_overlay(self):
+        self.show_overlay = not self.show_overlay
+        self.enabled = self.show_overlay or self.dump_path is not None
+
+    def section(self, name):
+        return self.sections[name]
+
+    def begin_frame(self):
+        self.current[:] = 0.0
+        self.frame_start = time.perf_counter() if self.enabled else None
+
+    def end_frame(self):
+        if self.frame_start is None:
+            return
+        now = time.perf_counter()
+        self.current[0] = now - self.frame_start
+        self.history[self.num_frames % len(self.history)] = self.current
+        self.num_frames += 1
+
+        if self.dump_path and now - self.last_dump >= DUMP_INTERVAL:
+            self.last_dump = now
+            self.dump(self.dump_path)
+
+    def get_stats(self):
+        # section -> milliseconds over the frames in the ring buffer
+        frames = self.history[:min(self.num_frames, len(self.history))] * 1e3
+        if not len(frames):
+            return {}
+
+        p50, p99 = np.percentile(frames, (50, 99), axis=0)
+        mean, peak = frames.mean(axis=0), frames.max(axis=0)
+        stats = {
+            name: {'p50': p50[i], 'p99': p99[i], 'mean': mean[i], 'max': peak[i]}
+            for i, name in enumerate(self.names)
+        }
+        # frames that took more than twice the median - typically remeshing or GC
+        stats['frame']['hitches'] = int(np.count_nonzero(frames[:, 0] > 2 * p50[0]))
+        return stats
+
+    def get_overlay_text(self):
+        stats = self.get_stats()
+        if not stats:
+            return ''
+        frame = stats['frame']
+        slowest = sorted(self.names[1:], key=lambda name: stats[name]['p99'], reverse=True)[:3]
+        sections = ' '.join(f'{name} {stats[name]["p99"]:.1f}' for name in slowest)
+        return (f' | frame p50 {frame["p50"]:.1f} p99 {frame["p99"]:.1f} ms'
+                f' | hitches {frame["hitches"]} | p99 {sections}')
+
+    def dump(self, path):
+        stats = self.get_stats()
+        if path.endswith('.csv'):
+            with open(path, 'w') as file:
+                file.write('section,p50_ms,p99_ms,mean_ms,max_ms\n')
+                for name in self.names:
+                    s = stats[name]
+                    file.write(f'{name},{s["p50"]:.4f},{s["p99"]:.4f},{s["mean"]:.4f},{s["max"]:.4f}\n')
+        else:
+            with open(path, 'w') as file:
+                json.dump({'frames': min(self.num_frames, len(self.history)), 'unit': 'ms',
+                           'sections': stats}, file, indent=2)
+
+
+frame_profiler = FrameProfiler()
+frame_profiler.configure()
@@ -0,0 +1,304 @@
+import argparse
+import json
+import sys
+import time
+import pygame as pg
+from settings import *
+from journal import get_world_key
+from chunk_hash import WorldHashes
+from profiler import frame_profiler
+from player import Player
+from headless import HeadlessScene
+
+# Input recording and deterministic replay.
+#   python main.py --record=session.npz        # or VOXEL_RECORD=session.npz, saved on exit
+#   python -m replay session.npz               # replays it without a window
+#   python -m replay session.npz --offscreen   # also renders every frame to an offscreen framebuffer
+#
+# Every frame records what the simulation reads from pygame: delta_time and time, the held keys,
+# the mouse motion and the events passed to Player.handle_event. The replay feeds them back
+# through the same code, so the world and the player end up in the same state as the recorded
+# session (checked against the recorded player position and world hash) and the per-subsystem
+# frame timings of two builds can be compared on identical input.
+
+RECORD_ENV = 'VOXEL_RECORD'
+RECORD_FLAG = '--record'
+RECORDING_VERSION = 1
+
+# keys Player.keyboard_control reads, bit i of a recorded key mask is RECORDED_KEYS[i]
+RECORDED_KEYS = (pg.K_w, pg.K_a, pg.K_s, pg.K_d, pg.K_SPACE, pg.K_LCTRL, pg.K_LSHIFT, pg.K_q, pg.K_e)
+RECORDED_EVENTS = (pg.KEYDOWN, pg.KEYUP, pg.MOUSEBUTTONDOWN, pg.MOUSEBUTTONUP)
+KEY_BITS = {key: bit for bit, key in enumerate(RECORDED_KEYS)}
+
+PLAYER_STATE = ('feet_position', 'position', 'velocity', 'yaw', 'pitch', 'on_ground', 'can_jump',
+                'creative_mode', 'jump_key_held')
+
+
+def get_player_state(player):
+    return np.array([value for name in PLAYER_STATE for value in np.ravel(getattr(player, name))],
+                    dtype='float64')
+
+
+def set_player_state(player, state):
+    values = iter(state)
+    for name in PLAYER_STATE:
+        value = getattr(player, name)
+        if isinstance(value, glm.vec3):
+            setattr(player, name, glm.vec3(next(values), next(values), next(values)))
+        elif isinstance(value, bool):
+            setattr(player, name, bool(next(values)))
+        else:
+            setattr(player, name, float(next(values)))
+    player.update_vectors()
+    player.update_view_matrix()
+
+
+class InputRecording:
+    def __init__(self):
+        self.initial_state = None
+        # per frame
+        self.delta_times, self.times, self.keys, self.mouse = [], [], [], []
+        # (frame, type, key, button, mod) per event
+        self.events = []
+
+    def begin_frame(self, app):
+        if self.initial_state is None:
+            self.initial_state = get_player_state(app.player)
+        self.delta_times.append(app.delta_time)
+        self.times.append(app.time)
+        self.keys.append(0)
+        self.mouse.append((0, 0))
+
+    def add_events(self, events):
+        frame = len(self.delta_times) - 1
+        for event in events:
+            if event.type in RECORDED_EVENTS:
+                self.events.append((frame, event.type, getattr(event, 'key', 0), getattr(event, 'button', 0),
+                                    getattr(event, 'mod', 0)))
+
+    def set_keys(self, key_state):
+        self.keys[-1] = sum(1 << bit for key, bit in KEY_BITS.items() if key_state[key])
+
+    def set_mouse(self, rel):
+        self.mouse[-1] = rel
+
+    def save(self, path, app):
+        # a progressive startup may quit before the world hashes are built
+        world = app.scene.world
+        hashes = world.hashes if world.hashes is not None else WorldHashes(world.voxels)
+        np.savez_compressed(
+            path,
+            version=RECORDING_VERSION,
+            world_key=get_world_key(),
+            initial_state=self.initial_state,
+            final_state=get_player_state(app.player),
+            world_hash=np.uint64(hashes.root),
+            delta_times=np.array(self.delta_times, dtype='float64'),
+            times=np.array(self.times, dtype='float64'),
+            keys=np.array(self.keys, dtype='uint32'),
+            mouse=np.array(self.mouse, dtype='int32').reshape(-1, 2),
+            events=np.array(self.events, dtype='int64').reshape(-1, 5),
+        )
+
+
+def load_recording(path):
+    with np.load(path) as file:
+        recording = {name: file[name] for name in file.files}
+    if int(recording['version']) != RECORDING_VERSION:
+        raise ValueError(f'{path}: recording version {int(recording["version"])}, expected {RECORDING_VERSION}')
+    if not np.array_equal(recording['world_key'], get_world_key()):
+        raise ValueError(f'{path} was recorded on another world (seed, chunk or world size)')
+    return recording
+
+
+def get_record_path(argv=()):
+    path = os.environ.get(RECORD_ENV)
+    for arg in argv:
+        if arg.startswith(RECORD_FLAG + '='):
+            path = arg.split('=', 1)[1]
+    return path
+
+
+class LiveInput:
+    # pygame input for VoxelEngine, recorded frame by frame when a recording path is configured
+    def __init__(self):
+        self.recording = None
+        self.record_path = None
+
+    def configure(self, argv=()):
+        path = get_record_path(argv)
+        if path:
+            self.record_path = path
+            self.recording = InputRecording()
+
+    def begin_frame(self, app):
+        if self.recording is not None:
+            self.recording.begin_frame(app)
+
+    def get_events(self):
+        events = pg.event.get()
+        if self.recording is not None:
+            self.recording.add_events(events)
+        return events
+
+    def get_pressed(self):
+        key_state = pg.key.get_pressed()
+        if self.recording is not None:
+            self.recording.set_keys(key_state)
+        return key_state
+
+    def get_rel(self):
+        rel = pg.mouse.get_rel()
+        if self.recording is not None:
+            self.recording.set_mouse(rel)
+        return rel
+
+    def save(self, app):
+        if self.recording is not None and self.recording.delta_times:
+            self.recording.save(self.record_path, app)
+            print(f'recorded {len(self.recording.delta_times)} frames to {self.record_path}')
+
+
+class KeyState:
+    # stands in for pg.key.get_pressed(): only the recorded keys can be held
+    def __init__(self, mask):
+        self.mask = int(mask)
+
+    def __getitem__(self, key):
+        bit = KEY_BITS.get(key)
+        return bit is not None and bool(self.mask >> bit & 1)
+
+
+class ReplayInput:
+    def __init__(self, recording):
+        self.recording = recording
+        self.frame = -1
+        events = recording['events']
+        # events of frame f are events[event_starts[f]:event_starts[f + 1]]
+        self.event_starts = np.searchsorted(events[:, 0], np.arange(self.num_frames + 1))
+
+    @property
+    def num_frames(self):
+        return len(self.recording['delta_times'])
+
+    def begin_frame(self, app):
+        self.frame += 1
+        app.delta_time = float(self.recording['delta_times'][self.frame])
+        app.time = float(self.recording['times'][self.frame])
+
+    def get_events(self):
+        start, end = self.event_starts[self.frame], self.event_starts[self.frame + 1]
+        return [pg.event.Event(int(event_type), key=int(key), button=int(button), mod=int(mod))
+                for _, event_type, key, button, mod in self.recording['events'][start:end]]
+
+    def get_pressed(self):
+        return KeyState(self.recording['keys'][self.frame])
+
+    def get_rel(self):
+        dx, dy = self.recording['mouse'][self.frame]
+        return int(dx), int(dy)
+
+
+class ReplayApp:
+    # VoxelEngine driven by a recording: no window, and no GL context unless offscreen
+    def __init__(self, recording, offscreen=False):
+        self.input = ReplayInput(recording)
+        self.delta_time = 0
+        self.time = 0
+
+        if offscreen:
+            # the GL side is only needed here
+            import moderngl as mgl
+            from shader_program import ShaderProgram
+            from scene import Scene
+            from textures import Textures
+            self.ctx = mgl.create_standalone_context(require=MAJOR_VER * 100 + MINOR_VER * 10)
+            self.ctx.enable(flags=mgl.DEPTH_TEST | mgl.CULL_FACE | mgl.BLEND)
+            self.fbo = self.ctx.simple_framebuffer(WIN_RES, samples=NUM_SAMPLES)
+            self.fbo.use()
+            self.textures = Textures(self)
+            self.player = Player(self)
+            self.shader_program = ShaderProgram(self)
+            self.scene = Scene(self)
+        else:
+            self.ctx = None
+            self.player = Player(self)
+            self.scene = HeadlessScene(self)
+        set_player_state(self.player, recording['initial_state'])
+
+    def tick(self):
+        # one frame of VoxelEngine.run
+        frame_profiler.begin_frame()
+        self.input.begin_frame(self)
+        with frame_profiler.section('events'):
+            for event in self.input.get_events():
+                self.player.handle_event(event=event)
+
+        with frame_profiler.section('player'):
+            self.player.update()
+        if self.ctx is not None:
+            self.shader_program.update()
+        self.scene.update()
+
+        if self.ctx is not None:
+            self.ctx.clear(color=BG_COLOR)
+            self.scene.render()
+            # stands in for the buffer swap: waits until the frame is drawn
+            with frame_profiler.section('flip'):
+                self.ctx.finish()
+            self.shader_program.uniforms.end_frame()
+        frame_profiler.end_frame()
+
+
+def replay(recording, offscreen=False):
+    app = ReplayApp(recording, offscreen)
+    num_frames = app.input.num_frames
+    frame_profiler.start(num_frames)
+
+    start = time.perf_counter()
+    for _ in range(num_frames):
+        app.tick()
+    wall_time = time.perf_counter() - start
+
+    final_state = get_player_state(app.player)
+    world_hash = app.scene.world.hashes.root
+    return {
+        'frames': num_frames,
+        'offscreen': offscreen,
+        'wall_time': wall_time,
+        'frames_per_sec': num_frames / wall_time,
+        'recorded_time': float(np.sum(recording['delta_times'])) * 1e-3,
+        'is_deterministic': bool(world_hash == int(recording['world_hash'])
+                                 and np.allclose(final_state, recording['final_state'])),
+        'unit': 'ms',
+        'sections': frame_profiler.get_stats(),
+    }
+
+
+def print_report(report):
+    print(f'{report["frames"]} frames in {report["wall_time"]:.3f} s ({report["frames_per_sec"]:.0f} frames/s), '
+          f'recorded {report["recorded_time"]:.1f} s, '
+          f'{"deterministic" if report["is_deterministic"] else "DIVERGED from the recording"}')
+    print(f'{"section":<12} {"p50":>9} {"p99":>9} {"mean":>9} {"max":>9}')
+    for name, stats in report['sections'].items():
+        print(f'{name:<12} ' + ' '.join(f'{stats[key]:9.3f}' for key in ('p50', 'p99', 'mean', 'max')))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replays a recorded session and times every subsystem')
+    parser.add_argument('recording')
+    parser.add_argument('--offscreen', action='store_true', help='render to an offscreen framebuffer too')
+    parser.add_argument('-o', '--output', help='write the report as JSON')
+    args = parser.parse_args(argv)
+
+    report = replay(load_recording(args.recording), args.offscreen)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    # a diverged replay times different work, fail like the benchmarks do on a regression
+    return 0 if report['is_deterministic'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
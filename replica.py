@@ -0,0 +1,240 @@
+from settings import *
+from collections import deque
+from net.client import ClientThread
+from net.protocol import MSG_CHUNK, MSG_UNLOAD, MSG_EDITS, MAX_VOXEL_ID
+import time
+
+# The game World as a replicated cache of a world server (see net/server.py). Its chunks come
+# from the server instead of generate jobs: a column counts as generated once all its chunks
+# arrived, its sea is filled and the scheduler lights, meshes and uploads it from there. Unloaded
+# chunks free their meshes and keep their voxels and light until the server sends them again,
+# and then only what changed meanwhile goes through World.refresh_voxels.
+# Edits are sent to the server and the local voxels left alone until it echoes them back, so
+# every client applies the same edits in the same order. The server owns the edit history, so
+# undo is off.
+#   python main.py --server=127.0.0.1:5555      # or VOXEL_SERVER=127.0.0.1:5555
+SERVER_ENV = 'VOXEL_SERVER'
+SERVER_FLAG = '--server'
+
+# voxels the player moves before its position is sent again, the server reorders its stream
+POSITION_STEP = 1.0
+# chunks applied per frame: a first copy is only stored, one received again relights what changed
+CHUNKS_PER_FRAME = 4
+# seconds an edit waits for its echo before it is sent again, and how many times it is sent
+EDIT_TIMEOUT = 2.0
+EDIT_SENDS = 3
+
+
+def get_locations(positions):
+    # encoded world positions -> chunk indices, voxel indices
+    wx = positions % WORLD_X
+    wz = positions // WORLD_X % WORLD_Z
+    wy = positions // (WORLD_X * WORLD_Z)
+    chunk_indices = wx // CHUNK_SIZE + WORLD_W * (wz // CHUNK_SIZE) + WORLD_AREA * (wy // CHUNK_SIZE)
+    voxel_indices = wx % CHUNK_SIZE + CHUNK_SIZE * (wz % CHUNK_SIZE) + CHUNK_AREA * (wy % CHUNK_SIZE)
+    return chunk_indices, voxel_indices
+
+
+def get_positions(chunk_index, voxel_indices):
+    # voxel indices of one chunk -> encoded world positions
+    wx = chunk_index % WORLD_W * CHUNK_SIZE + voxel_indices % CHUNK_SIZE
+    wz = chunk_index // WORLD_W % WORLD_D * CHUNK_SIZE + voxel_indices // CHUNK_SIZE % CHUNK_SIZE
+    wy = chunk_index // WORLD_AREA * CHUNK_SIZE + voxel_indices // CHUNK_AREA
+    return wx + WORLD_X * (wz + WORLD_Z * wy)
+
+
+class ReplicaConfig:
+    def __init__(self):
+        self.address = None
+
+    def configure(self, argv=()):
+        value = os.environ.get(SERVER_ENV)
+        for arg in argv:
+            if arg.startswith(SERVER_FLAG + '='):
+                value = arg.split('=', 1)[1]
+        if value:
+            host, port = value.rsplit(':', 1)
+            self.address = host, int(port)
+
+
+class WorldReplica:
+    def __init__(self, world, host, port):
+        self.world = world
+        # chunks the server streams to this client, only their edits are applied
+        self.is_held = np.zeros(WORLD_VOL, dtype='bool')
+        # chunks and whole columns received at least once, their voxels and light are kept
+        # through unloads and their sea is filled
+        self.is_received = np.zeros(WORLD_VOL, dtype='bool')
+        self.is_column_received = np.zeros(WORLD_AREA, dtype='bool')
+        # the stream, filled by the client thread and applied on the game thread
+        self.messages = deque()
+        self.sent_position = None
+        # own edits waiting for their echo: [deadline, encoded positions, voxel ids, sends]
+        self.pending = deque()
+        # what ended the connection, None while connected
+        self.error = None
+
+        self.chunks_received = 0
+        self.chunks_unloaded = 0
+        self.edits_received = 0
+        self.edits_sent = 0
+        self.edits_lost = 0
+
+        world.scheduler.remote = True
+        self.client = ClientThread(self)
+        self.client.connect(host, port)
+
+    @property
+    def is_connected(self):
+        return self.error is None
+
+    # called from the client thread
+    def set_chunk(self, chunk_index, voxels):
+        self.messages.append((MSG_CHUNK, chunk_index, voxels))
+
+    def unload_chunk(self, chunk_index):
+        self.messages.append((MSG_UNLOAD, chunk_index, None))
+
+    def apply_edits(self, positions, voxel_ids):
+        self.messages.append((MSG_EDITS, positions, voxel_ids))
+
+    def update(self):
+        # per frame: sends the player position after it moved, applies what the server sent
+        # and sends again the edits it didn't echo in time
+        if self.error is None and self.client.poll() is not None:
+            self.disconnect(self.client.error)
+
+        position = self.world.app.player.position
+        if self.is_connected and (self.sent_position is None
+                                  or glm.distance(position, self.sent_position) >= POSITION_STEP):
+            self.sent_position = glm.vec3(position)
+            self.client.send_position(tuple(position))
+
+        chunks = 0
+        while self.messages and chunks < CHUNKS_PER_FRAME:
+            msg_type, key, data = self.messages.popleft()
+            if msg_type == MSG_CHUNK:
+                self.receive_chunk(key, data)
+                chunks += 1
+            elif msg_type == MSG_UNLOAD:
+                self.receive_unload(key)
+            else:
+                self.receive_edits(key, data)
+
+        if self.is_connected:
+            self.check_pending()
+
+    def disconnect(self, error):
+        # the world stays as it was, edits still waiting for their echo are lost
+        self.error = error
+        self.edits_lost += sum(len(positions) for _, positions, _, _ in self.pending)
+        self.pending.clear()
+        print(f'Lost the world server: {error}')
+
+    def receive_chunk(self, chunk_index, voxels):
+        world = self.world
+        chunk = world.chunks[chunk_index]
+        if self.is_received[chunk_index]:
+            # a chunk held before (unloaded, or resent after an edit backlog): only what
+            # changed meanwhile goes through the edit path
+            voxel_indices = np.flatnonzero(world.voxels[chunk_index] != voxels)
+            world.voxels[chunk_index] = voxels
+            world.refresh_voxels(get_positions(chunk_index, voxel_indices))
+        else:
+            # lit by the scheduler with the rest of its column
+            world.voxels[chunk_index] = voxels
+            chunk.update_summary()
+            world.hashes.update([chunk_index])
+            world.navigation.invalidate([chunk_index])
+            self.is_received[chunk_index] = True
+        chunk.is_generated = True
+        self.is_held[chunk_index] = True
+        self.chunks_received += 1
+
+        column = chunk_index % WORLD_AREA
+        if self.is_held[column::WORLD_AREA].all():
+            if not self.is_column_received[column]:
+                self.is_column_received[column] = True
+                world.water_engine.build_sea(column)
+            world.scheduler.set_generated(column)
+
+    def receive_unload(self, chunk_index):
+        self.is_held[chunk_index] = False
+        chunk = self.world.chunks[chunk_index]
+        chunk.is_generated = False
+        chunk.release_mesh()
+        self.world.scheduler.unload_column(chunk_index % WORLD_AREA)
+        self.chunks_unloaded += 1
+
+    def receive_edits(self, positions, voxel_ids):
+        # edits of chunks not held arrive with the chunk itself
+        chunk_indices, voxel_indices = get_locations(positions)
+        voxels = self.world.voxels
+        is_changed = self.is_held[chunk_indices] & (voxels[chunk_indices, voxel_indices] != voxel_ids)
+        chunk_indices, voxel_indices = chunk_indices[is_changed], voxel_indices[is_changed]
+        voxels[chunk_indices, voxel_indices] = voxel_ids[is_changed]
+        self.edits_received += len(positions)
+        self.world.refresh_voxels(positions[is_changed])
+
+        # any echo settles a pending edit of that voxel: its own, or a later one of another client
+        for edit in self.pending:
+            is_echoed = np.isin(edit[1], positions)
+            if is_echoed.any():
+                edit[1], edit[2] = edit[1][~is_echoed], edit[2][~is_echoed]
+
+    def check_pending(self):
+        # edits past their deadline are sent again, unless the voxel already holds the new id
+        # (its chunk was resent with it), and reported as lost after the last send
+        now = time.perf_counter()
+        while self.pending and self.pending[0][0] <= now:
+            _, positions, voxel_ids, sends = self.pending.popleft()
+            chunk_indices, voxel_indices = get_locations(positions)
+            is_missing = self.world.voxels[chunk_indices, voxel_indices] != voxel_ids
+            positions, voxel_ids = positions[is_missing], voxel_ids[is_missing]
+            if not len(positions):
+                continue
+            if sends < EDIT_SENDS:
+                self.send(positions, voxel_ids, sends + 1)
+            else:
+                self.edits_lost += len(positions)
+                print(f'The world server did not apply {len(positions)} edits')
+
+    def send_edits(self, changed, old_ids):
+        # call right after the voxels at the encoded positions changed from old_ids: they are
+        # put back and the new ids sent, the server's echo applies them; -> edits sent
+        chunk_indices, voxel_indices = get_locations(changed)
+        voxels = self.world.voxels
+        new_ids = voxels[chunk_indices, voxel_indices]
+        voxels[chunk_indices, voxel_indices] = old_ids
+        if not self.is_connected:
+            self.edits_lost += len(changed)
+            return 0
+        # the server drops ids it can't mesh, they would never be echoed
+        is_valid = new_ids <= MAX_VOXEL_ID
+        self.edits_lost += int(np.count_nonzero(~is_valid))
+        self.send(changed[is_valid], new_ids[is_valid], 1)
+        return int(np.count_nonzero(is_valid))
+
+    def send(self, positions, voxel_ids, sends):
+        if not len(positions):
+            return
+        wx, wz, wy = positions % WORLD_X, positions // WORLD_X % WORLD_Z, positions // (WORLD_X * WORLD_Z)
+        self.client.send_edits(list(zip(wx.tolist(), wy.tolist(), wz.tolist(), voxel_ids.tolist())))
+        self.pending.append([time.perf_counter() + EDIT_TIMEOUT, positions, voxel_ids, sends])
+        self.edits_sent += len(positions)
+
+    def close(self):
+        self.client.close()
+
+    def get_overlay_text(self):
+        text = (f' | server {self.chunks_received} chunks {self.chunks_unloaded} unloaded'
+                f' {self.edits_sent} edits sent {self.edits_received} received')
+        if self.edits_lost:
+            text += f' {self.edits_lost} lost'
+        if not self.is_connected:
+            text += ' DISCONNECTED'
+        return text
+
+
+replica_config = ReplicaConfig()
+replica_config.configure()
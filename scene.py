@@ -1,32 +1,40 @@
 from settings import *
 import moderngl as mgl
 from world import World
+from scheduler import loading_config
+from replica import replica_config
 from world_objects.voxel_marker import VoxelMarker
 from world_objects.water import Water
 from world_objects.clouds import Clouds
+from profiler import frame_profiler
 
 
 class Scene:
     def __init__(self, app):
         self.app = app
-        self.world = World(self.app)
+        self.world = World(self.app, progressive=loading_config.progressive, server=replica_config.address)
         self.voxel_marker = VoxelMarker(self.world.voxel_handler)
         self.water = Water(app)
         self.clouds = Clouds(app)
 
     def update(self):
-        self.world.update()
+        with frame_profiler.section('world'):
+            self.world.update()
         self.voxel_marker.update()
         self.clouds.update()
 
     def render(self):
         # chunks rendering
-        self.world.render()
+        with frame_profiler.section('chunks'):
+            self.world.render()
 
         # rendering without cull face
         self.app.ctx.disable(mgl.CULL_FACE)
-        self.clouds.render()
-        self.water.render()
+        with frame_profiler.section('clouds'):
+            self.clouds.render()
+        with frame_profiler.section('water'):
+            self.water.render()
+            self.world.render_water()
         self.app.ctx.enable(mgl.CULL_FACE)
 
         # voxel selection
@@ -0,0 +1,307 @@
+from settings import *
+from collections import deque
+import heapq
+import itertools
+import time
+from meshes.chunk_mesh import build_vertex_data
+from profiler import startup_profiler
+
+# Chunk jobs in priority order instead of x/y/z loops. A column of chunks (x + WORLD_W * z) is
+# generated, then lit once the columns around it are generated, then each of its chunks is meshed
+# once the columns around it are lit, and with a GL context the mesh is uploaded. A job is queued
+# as soon as what it depends on is done, and the queue is ordered by distance to the player,
+# stretched for jobs off to the side or behind; it is reordered whenever the player moves or
+# turns far enough. Queued jobs of columns beyond SCHEDULER_LOAD_RADIUS are cancelled (and queued
+# again once the player is back in range), so are uploads of meshes an edit made stale.
+# A progressive startup (World(app, progressive=True)) draws frames while the queue drains, with
+# SCHEDULER_LOADING_BUDGET per frame; the player spawns once the columns around it are done.
+# Replays load the world before the first frame, so main refuses to --record with it.
+# A remote world (World(app, server=(host, port)), see replica.py) has no generate jobs: a column
+# counts as generated once the server sent all its chunks, and loses its meshes when unloaded.
+#   python main.py --progressive-startup     # or VOXEL_PROGRESSIVE_STARTUP=1
+PROGRESSIVE_STARTUP_ENV = 'VOXEL_PROGRESSIVE_STARTUP'
+PROGRESSIVE_STARTUP_FLAG = '--progressive-startup'
+
+GENERATE, LIGHT, MESH, UPLOAD = range(4)
+STAGE_NAMES = ('generate', 'light', 'mesh', 'upload')
+
+# columns around a column whose voxels its light floods over, and whose light its meshes sample
+LIGHT_REACH = 1 + MAX_LIGHT // CHUNK_SIZE
+
+
+def get_neighbour_columns(column, reach=LIGHT_REACH):
+    # the columns within reach of the column, itself included
+    cx, cz = column % WORLD_W, column // WORLD_W
+    return [x + WORLD_W * z
+            for z in range(max(cz - reach, 0), min(cz + reach + 1, WORLD_D))
+            for x in range(max(cx - reach, 0), min(cx + reach + 1, WORLD_W))]
+
+
+class LoadingConfig:
+    def __init__(self):
+        self.progressive = False
+
+    def configure(self, argv=()):
+        self.progressive = (os.environ.get(PROGRESSIVE_STARTUP_ENV, '0') != '0'
+                            or PROGRESSIVE_STARTUP_FLAG in argv)
+
+
+class Job:
+    __slots__ = ('stage', 'key', 'enqueued', 'vertex_data', 'is_cancelled')
+
+    def __init__(self, stage, key, vertex_data=None):
+        self.stage = stage
+        # a column for generate and light jobs, a chunk index for mesh and upload jobs
+        self.key = key
+        self.enqueued = time.perf_counter()
+        self.vertex_data = vertex_data
+        self.is_cancelled = False
+
+
+class ChunkScheduler:
+    def __init__(self, world):
+        self.world = world
+        self.chunks = world.chunks
+        self.neighbours = [get_neighbour_columns(column) for column in range(WORLD_AREA)]
+        # headless apps have no GL context: no meshes, as in World.__init__
+        self.upload = world.app.ctx is not None
+        self.mesh = self.upload
+        # the columns come from a server instead of generate jobs
+        self.remote = False
+
+        self.is_generated = np.array([all(self.chunks[column + WORLD_AREA * y].is_generated
+                                          for y in range(WORLD_H)) for column in range(WORLD_AREA)])
+        self.is_lit = np.zeros(WORLD_AREA, dtype='bool')
+        # meshed, or meshed and waiting for its upload
+        self.is_meshed = np.zeros(WORLD_VOL, dtype='bool')
+        # through its last stage: lit without meshes, uploaded with a GL context
+        self.is_done = np.zeros(WORLD_VOL, dtype='bool')
+
+        # heap of [priority, order, job], cancelled jobs are dropped when they come up
+        self.heap = []
+        self.order = itertools.count()
+        self.jobs = {}
+        self.origin = None
+        self.direction = None
+        # some columns were left out for being beyond SCHEDULER_LOAD_RADIUS
+        self.is_partial = False
+
+        self.depths = [0] * len(STAGE_NAMES)
+        self.done = [0] * len(STAGE_NAMES)
+        self.cancelled = [0] * len(STAGE_NAMES)
+        self.latencies = [deque(maxlen=SCHEDULER_LATENCY_WINDOW) for _ in STAGE_NAMES]
+
+    def start(self):
+        # queues the jobs that can run now; the rest follow as their dependencies finish
+        self.set_view()
+        for column in range(WORLD_AREA):
+            self.queue_ready(column)
+
+    def update(self, budget=SCHEDULER_FRAME_BUDGET):
+        # per frame: reorders the queue after the player moved or turned, then runs budget ms of jobs
+        player = self.world.app.player
+        if self.origin is None:
+            self.start()
+        elif (glm.distance(player.position, self.origin) > SCHEDULER_REPRIORITIZE_DISTANCE or
+              glm.dot(player.forward, self.direction) < math.cos(SCHEDULER_REPRIORITIZE_ANGLE)):
+            self.reprioritize()
+        return self.run(budget * 1e-3)
+
+    def run(self, budget=None):
+        # runs jobs until the queue is empty or budget seconds passed, at least one if any is
+        # queued; -> jobs run
+        if self.origin is None:
+            self.start()
+        deadline = None if budget is None else time.perf_counter() + budget
+        num_run = 0
+        while self.heap:
+            if num_run and deadline is not None and time.perf_counter() >= deadline:
+                break
+            job = heapq.heappop(self.heap)[2]
+            if job.is_cancelled:
+                continue
+            del self.jobs[job.stage, job.key]
+            self.depths[job.stage] -= 1
+            self.run_job(job)
+            self.done[job.stage] += 1
+            self.latencies[job.stage].append(time.perf_counter() - job.enqueued)
+            num_run += 1
+        return num_run
+
+    def run_job(self, job):
+        if job.stage == GENERATE:
+            self.generate_column(job.key)
+            self.set_generated(job.key)
+
+        elif job.stage == LIGHT:
+            changed = self.world.light_engine.build_column(job.key)
+            self.is_lit[job.key] = True
+            if not self.mesh:
+                self.is_done[job.key::WORLD_AREA] = True
+            for column in self.neighbours[job.key]:
+                self.queue_ready(column)
+            # meshes that already sampled the changed light are rebuilt with the dirty chunks
+            self.world.dirty_chunks.update(index for index in changed if self.is_meshed[index])
+
+        elif job.stage == MESH:
+            start = time.perf_counter()
+            vertex_data = build_vertex_data(self.chunks[job.key])
+            startup_profiler.add_sample('chunk.mesh', time.perf_counter() - start)
+            self.is_meshed[job.key] = True
+            if self.upload:
+                self.add(UPLOAD, job.key, vertex_data)
+            else:
+                self.is_done[job.key] = True
+
+        else:
+            self.chunks[job.key].build_mesh(job.vertex_data)
+            self.is_done[job.key] = True
+
+    def generate_column(self, column):
+        for y in range(WORLD_H):
+            chunk = self.chunks[column + WORLD_AREA * y]
+            if not chunk.is_generated:
+                self.world.generate_chunk(chunk)
+
+    def set_generated(self, column):
+        # the column's voxels are all there: generated, or received again after an unload
+        self.is_generated[column] = True
+        if self.is_lit[column] and not self.mesh:
+            self.is_done[column::WORLD_AREA] = True
+        for neighbour in self.neighbours[column]:
+            self.queue_ready(neighbour)
+
+    def unload_column(self, column):
+        # a remote column the server stopped sending: its voxels and light stay as the last
+        # copy, its meshes are rebuilt once it arrives again
+        self.is_generated[column] = False
+        job = self.jobs.get((LIGHT, column))
+        if job is not None:
+            self.cancel(job)
+        for y in range(WORLD_H):
+            chunk_index = column + WORLD_AREA * y
+            for stage in (MESH, UPLOAD):
+                job = self.jobs.get((stage, chunk_index))
+                if job is not None:
+                    self.cancel(job)
+        self.is_meshed[column::WORLD_AREA] = False
+        self.is_done[column::WORLD_AREA] = False
+
+    def queue_ready(self, column):
+        # queues the column's next job if its dependencies are done
+        if not self.is_in_range(column):
+            self.is_partial = True
+        elif not self.is_generated[column]:
+            if not self.remote:
+                self.add(GENERATE, column)
+        elif not self.is_lit[column]:
+            if self.is_generated[self.neighbours[column]].all():
+                self.add(LIGHT, column)
+        elif self.mesh and self.is_lit[self.neighbours[column]].all():
+            for y in range(WORLD_H):
+                chunk_index = column + WORLD_AREA * y
+                if not self.is_meshed[chunk_index]:
+                    self.add(MESH, chunk_index)
+
+    def is_area_ready(self, columns):
+        # whether every chunk of the columns went through its last stage
+        return all(self.is_done[column::WORLD_AREA].all() for column in columns)
+
+    def add(self, stage, key, vertex_data=None):
+        if (stage, key) in self.jobs:
+            return
+        job = Job(stage, key, vertex_data)
+        self.jobs[stage, key] = job
+        self.depths[stage] += 1
+        heapq.heappush(self.heap, [self.get_priority(stage, key), next(self.order), job])
+
+    def cancel(self, job):
+        job.is_cancelled = True
+        del self.jobs[job.stage, job.key]
+        self.depths[job.stage] -= 1
+        self.cancelled[job.stage] += 1
+
+    def invalidate(self, chunk_indices):
+        # call with the chunks to remesh after an edit: a queued upload would show the mesh from
+        # before it, so it is cancelled and the chunk meshed again; -> the chunks that already
+        # have a mesh, to rebuild now
+        resident = []
+        for chunk_index in chunk_indices:
+            job = self.jobs.get((UPLOAD, chunk_index))
+            if job is not None:
+                self.cancel(job)
+                self.is_meshed[chunk_index] = False
+                self.queue_ready(chunk_index % WORLD_AREA)
+            elif self.chunks[chunk_index].mesh is not None:
+                resident.append(chunk_index)
+        return resident
+
+    def set_view(self):
+        player = self.world.app.player
+        self.origin = glm.vec3(player.position)
+        self.direction = glm.vec3(player.forward)
+
+    def reprioritize(self):
+        # new priorities for the queued jobs from where the player is now
+        self.set_view()
+        entries = []
+        for job in list(self.jobs.values()):
+            column = job.key % WORLD_AREA
+            if not self.is_in_range(column):
+                self.cancel(job)
+                self.is_partial = True
+                continue
+            entries.append([self.get_priority(job.stage, job.key), next(self.order), job])
+        heapq.heapify(entries)
+        self.heap = entries
+
+        # columns whose jobs were cancelled earlier may be back in range
+        if self.is_partial:
+            self.is_partial = False
+            for column in range(WORLD_AREA):
+                self.queue_ready(column)
+
+    def get_center(self, stage, key):
+        if stage in (GENERATE, LIGHT):
+            # columns at the player's height, only their horizontal distance counts
+            return glm.vec3((key % WORLD_W + 0.5) * CHUNK_SIZE, self.origin.y,
+                            (key // WORLD_W + 0.5) * CHUNK_SIZE)
+        return self.chunks[key].center
+
+    def get_priority(self, stage, key):
+        # distance to the player, times up to 1 + 2 * SCHEDULER_ANGLE_WEIGHT for jobs behind it
+        offset = self.get_center(stage, key) - self.origin
+        distance = glm.length(offset)
+        if distance < 1e-6:
+            return 0.0
+        cos_angle = glm.dot(offset, self.direction) / distance
+        return distance * (1.0 + SCHEDULER_ANGLE_WEIGHT * (1.0 - cos_angle))
+
+    def is_in_range(self, column):
+        x, z = (column % WORLD_W + 0.5) * CHUNK_SIZE, (column // WORLD_W + 0.5) * CHUNK_SIZE
+        return math.hypot(x - self.origin.x, z - self.origin.z) <= SCHEDULER_LOAD_RADIUS
+
+    def get_metrics(self):
+        # stage -> queued jobs, jobs done and cancelled, enqueue to done latency in ms
+        metrics = {}
+        for stage, name in enumerate(STAGE_NAMES):
+            latencies = np.asarray(self.latencies[stage], dtype='float64') * 1e3
+            p50, p99 = np.percentile(latencies, (50, 99)) if len(latencies) else (0.0, 0.0)
+            metrics[name] = {
+                'queued': self.depths[stage],
+                'done': self.done[stage],
+                'cancelled': self.cancelled[stage],
+                'latency_ms_p50': float(p50),
+                'latency_ms_p99': float(p99),
+            }
+        return metrics
+
+    def get_overlay_text(self):
+        if not len(self.jobs):
+            return ''
+        queued = ' '.join(f'{name} {depth}' for name, depth in zip(STAGE_NAMES, self.depths) if depth)
+        return f' | jobs {queued}'
+
+
+loading_config = LoadingConfig()
+loading_config.configure()
@@ -1,7 +1,10 @@
 from numba import njit
+import numba
 import numpy as np
 import glm
 import math
+import hashlib
+import os
 
 # OpenGL settings
 MAJOR_VER, MINOR_VER = 3, 3
@@ -17,22 +20,35 @@ SEED = 16
 # ray casting
 MAX_RAY_DIST = 6
 
-# chunk
-CHUNK_SIZE = 48
+# chunk: fewer, larger chunks mean fewer draw calls but slower remeshes after an edit;
+# VOXEL_CHUNK_SIZE overrides it per deployment (python -m benchmarks.chunk_size compares sizes).
+# The vertex packing and the 64-voxel trees and bitmasks cap it at 64
+CHUNK_SIZE = int(os.environ.get('VOXEL_CHUNK_SIZE', 48))
+assert 0 < CHUNK_SIZE <= 64, f'CHUNK_SIZE {CHUNK_SIZE} is outside 1-64'
 H_CHUNK_SIZE = CHUNK_SIZE // 2
 CHUNK_AREA = CHUNK_SIZE * CHUNK_SIZE
 CHUNK_VOL = CHUNK_AREA * CHUNK_SIZE
 CHUNK_SPHERE_RADIUS = H_CHUNK_SIZE * math.sqrt(3)
 
-# world
-WORLD_W, WORLD_H = 20, 2
+# face normals in face_id order: top, bottom, right, left, back, front (opposite face = face_id ^ 1)
+FACE_NORMALS = ((0, 1, 0), (0, -1, 0), (1, 0, 0), (-1, 0, 0), (0, 0, -1), (0, 0, 1))
+
+# world: about 960 x 96 x 960 voxels whatever the chunk size, rounded up to whole chunks
+WORLD_EXTENT_XZ, WORLD_EXTENT_Y = 960, 96
+WORLD_W, WORLD_H = -(-WORLD_EXTENT_XZ // CHUNK_SIZE), -(-WORLD_EXTENT_Y // CHUNK_SIZE)
 WORLD_D = WORLD_W
 WORLD_AREA = WORLD_W * WORLD_D
 WORLD_VOL = WORLD_AREA * WORLD_H
+# the edit journal stores chunk indices as uint16, which rules out chunks smaller than 12
+assert WORLD_VOL <= 1 << 16, f'CHUNK_SIZE {CHUNK_SIZE} makes {WORLD_VOL} chunks, the journal indexes at most 65536'
+
+# world size in voxels
+WORLD_X, WORLD_Y, WORLD_Z = WORLD_W * CHUNK_SIZE, WORLD_H * CHUNK_SIZE, WORLD_D * CHUNK_SIZE
 
 # world center
 CENTER_XZ = WORLD_W * H_CHUNK_SIZE
-CENTER_Y = WORLD_H * H_CHUNK_SIZE
+# terrain amplitude, from the extent so the terrain doesn't change with the chunk size
+CENTER_Y = WORLD_EXTENT_Y // 2
 
 # camera
 ASPECT_RATIO = WIN_RES.x / WIN_RES.y
@@ -59,10 +75,16 @@ GROUND_FRICTION = 0.9  # Fricción en el suelo
 PLAYER_POS = glm.vec3(CENTER_XZ, CHUNK_SIZE, CENTER_XZ)
 MOUSE_SENSITIVITY = 0.002
 
+# hud (window caption) refresh interval in ms
+HUD_UPDATE_INTERVAL = 250
+
 # colors
 BG_COLOR = glm.vec3(0.58, 0.83, 0.99)
+FOG_DENSITY = 0.00001
+# voxels at which the fog (1 - exp2(-density * distance^2)) hides 99% of what is drawn
+FOG_DISTANCE = math.sqrt(math.log2(100) / FOG_DENSITY)
 
-# textures
+# textures (voxel ids are packed in 4 bits of the vertex data, so ids stay below 16)
 SAND = 1
 GRASS = 2
 DIRT = 3
@@ -83,10 +105,71 @@ TREE_PROBABILITY = 0.02
 TREE_WIDTH, TREE_HEIGHT = 4, 8
 TREE_H_WIDTH, TREE_H_HEIGHT = TREE_WIDTH // 2, TREE_HEIGHT // 2
 
+# lighting: 4-bit sunlight and block light channels packed in one byte per voxel
+MAX_LIGHT = 15
+SUN_SHIFT, BLOCK_SHIFT = 4, 0
+
+# edit journal: edits kept for undo before the oldest are compacted into per-chunk deltas
+JOURNAL_CAPACITY = 1 << 20
+MAX_UNDO_STEPS = 256
+
 # water
 WATER_LINE = 5.6
 WATER_AREA = 5 * CHUNK_SIZE * WORLD_W
+# voxel water: levels 1-7 flow and fade, WATER_SOURCE never drains; the sea fills the air
+# below the water line up to WATER_SEA_TOP
+WATER_SOURCE = 8
+WATER_SEA_TOP = math.ceil(WATER_LINE) - 1
+WATER_TICK_INTERVAL = 150  # ms between flow steps
+WATER_TICK_BUDGET = 8192  # cell updates per frame, a longer tick continues next frame
+
+# entities: mobs, dropped items and falling blocks, stepped together at a fixed rate
+ENTITY_TICK_INTERVAL = 50  # ms per physics step
+ENTITY_MAX_STEPS = 4  # steps per frame at most, a longer frame drops the rest of its time
+ENTITY_GRID_CELL = 2.0  # broadphase cell edge in voxels, raised to the largest entity if needed
+ENTITY_GROUND_FRICTION = 0.5  # share of the horizontal velocity kept per step on the ground
+ENTITY_PUSH = 0.5  # share of the overlap two mobs push each other apart per step
+
+# navigation: a walkable cell has a solid floor and NAV_CLEARANCE air voxels, paths climb or
+# drop one voxel per step
+NAV_CLEARANCE = 2
+NAV_LOCAL_RANGE = 48  # voxels, closer queries search the voxel grid directly
+NAV_LOCAL_MARGIN = 8  # voxels around the start and goal a direct search may detour through
+NAV_WORKERS = 4
+
+# chunk jobs: generation, light, meshing and uploads run nearest the player first, see scheduler.py
+SCHEDULER_FRAME_BUDGET = 4  # ms of jobs per frame
+SCHEDULER_LOADING_BUDGET = 16  # ms of jobs per frame while a progressive startup loads the world
+SCHEDULER_SPAWN_RADIUS = 1  # columns around the spawn column loaded before the player spawns
+SCHEDULER_ANGLE_WEIGHT = 1.0  # a job behind the player waits like one (1 + 2 * weight) times as far ahead
+SCHEDULER_REPRIORITIZE_DISTANCE = 8  # voxels the player moves before the queue is reordered
+SCHEDULER_REPRIORITIZE_ANGLE = glm.radians(20)  # or radians it turns
+# voxels from a column's center, queued jobs of farther columns are cancelled: the fog hides them
+SCHEDULER_LOAD_RADIUS = FOG_DISTANCE + CHUNK_SIZE
+SCHEDULER_LATENCY_WINDOW = 1024  # latest jobs per stage the latency percentiles cover
+
+# chunk meshes on the GPU: past the budget the least recently seen are evicted, see mesh_residency.py
+MESH_VRAM_BUDGET = 128 << 20  # bytes, VOXEL_VRAM_BUDGET or --vram-budget= (MiB) override it
+MESH_KEEP_EVICTED = True  # keep evicted vertices as compressed blobs instead of meshing again
+# zlib level of those blobs: 1 makes them ~3.3x smaller but restores about as fast as a remesh,
+# 0 keeps them raw and restores ~10x faster (python -m benchmarks -k 'residency.*')
+MESH_BLOB_LEVEL = 1
 
 # cloud
 CLOUD_SCALE = 25
 CLOUD_HEIGHT = WORLD_H * CHUNK_SIZE * 2
+# clouds are meshed and culled per tile, vertices are stored as uint8 relative to the tile origin
+CLOUD_TILE_SIZE = 2 * CHUNK_SIZE  # cloud cells, must stay <= 255
+CLOUD_TILE_AREA = CLOUD_TILE_SIZE * CLOUD_TILE_SIZE
+CLOUD_TILES_W = -(-WORLD_W * CHUNK_SIZE // CLOUD_TILE_SIZE)
+CLOUD_TILE_RADIUS = CLOUD_TILE_SIZE * 0.5 * math.sqrt(2) * CLOUD_SCALE
+
+# numba cache: kernels bake the settings above in as compile-time constants,
+# so cached machine code is kept per settings configuration
+NUMBA_CACHE_KEY = hashlib.sha1(repr(sorted(
+    (name, repr(value)) for name, value in globals().items() if name.isupper()
+)).encode()).hexdigest()[:12]
+if not os.environ.get('NUMBA_CACHE_DIR'):
+    numba.config.CACHE_DIR = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'numba', NUMBA_CACHE_KEY
+    )
@@ -1,4 +1,6 @@
 from settings import *
+from profiler import startup_profiler
+from uniforms import UniformState
 
 
 class ShaderProgram:
@@ -6,45 +8,47 @@ class ShaderProgram:
         self.app = app
         self.ctx = app.ctx
         self.player = app.player
+        self.uniforms = UniformState(self.ctx)
         # -------- shaders -------- #
         self.chunk = self.get_program(shader_name='chunk')
         self.voxel_marker = self.get_program(shader_name='voxel_marker')
         self.water = self.get_program('water')
+        self.chunk_water = self.get_program('chunk_water')
         self.clouds = self.get_program('clouds')
         # ------------------------- #
         self.set_uniforms_on_init()
 
     def set_uniforms_on_init(self):
+        # camera block: projection, view, fog and water line shared by every program
+        for program in (self.chunk, self.voxel_marker, self.water, self.chunk_water, self.clouds):
+            self.uniforms.bind(program)
+        self.uniforms.set_environment(BG_COLOR, FOG_DENSITY, WATER_LINE)
+
         # chunk
-        self.chunk['m_proj'].write(self.player.m_proj)
         self.chunk['m_model'].write(glm.mat4())
-        # self.chunk['u_texture_array_0'] = 1  # COMMENTED OUT - Texture system disabled
-        self.chunk['bg_color'].write(BG_COLOR)
-        self.chunk['water_line'] = WATER_LINE
+        self.chunk['u_texture_array_0'] = 1
 
         # marker
-        self.voxel_marker['m_proj'].write(self.player.m_proj)
         self.voxel_marker['m_model'].write(glm.mat4())
-        # self.voxel_marker['u_texture_0'] = 0  # COMMENTED OUT - Texture system disabled
+        self.voxel_marker['u_texture_0'] = 0
 
         # water
-        self.water['m_proj'].write(self.player.m_proj)
-        # self.water['u_texture_0'] = 2  # COMMENTED OUT - Texture system disabled
+        self.water['u_texture_0'] = 2
         self.water['water_area'] = WATER_AREA
-        self.water['water_line'] = WATER_LINE
+
+        # voxel water
+        self.chunk_water['m_model'].write(glm.mat4())
+        self.chunk_water['u_texture_0'] = 2
 
         # clouds
-        self.clouds['m_proj'].write(self.player.m_proj)
         self.clouds['center'] = CENTER_XZ
-        self.clouds['bg_color'].write(BG_COLOR)
         self.clouds['cloud_scale'] = CLOUD_SCALE
+        self.clouds['cloud_height'] = CLOUD_HEIGHT
 
     def update(self):
-        self.chunk['m_view'].write(self.player.m_view)
-        self.voxel_marker['m_view'].write(self.player.m_view)
-        self.water['m_view'].write(self.player.m_view)
-        self.clouds['m_view'].write(self.player.m_view)
+        self.uniforms.set_camera(self.player.m_proj, self.player.m_view)
 
+    @startup_profiler.phase('shader_program.get_program')
     def get_program(self, shader_name):
         with open(f'shaders/{shader_name}.vert') as file:
             vertex_shader = file.read()
@@ -6,8 +6,12 @@ const vec3 gamma = vec3(2.2);
 const vec3 inv_gamma = 1 / gamma;
 
 uniform sampler2DArray u_texture_array_0;
-uniform vec3 bg_color;
-uniform float water_line;
+layout (std140) uniform Camera {
+    mat4 m_proj;
+    mat4 m_view;
+    vec4 fog;  // rgb: background color, a: fog density
+    float water_line;
+};
 
 in vec2 uv;
 in float shading;
@@ -31,7 +35,7 @@ void main() {
 
     //fog
     float fog_dist = gl_FragCoord.z / gl_FragCoord.w;
-    tex_col = mix(tex_col, bg_color, (1.0 - exp2(-0.00001 * fog_dist * fog_dist)));
+    tex_col = mix(tex_col, fog.rgb, (1.0 - exp2(-fog.a * fog_dist * fog_dist)));
 
     tex_col = pow(tex_col, inv_gamma);
     fragColor = vec4(tex_col, 1.0);
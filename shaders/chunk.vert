@@ -3,11 +3,17 @@
 layout (location = 0) in uint packed_data;
 
 int x, y, z;
+int light_id;
 int ao_id;
 int flip_id;
 
-uniform mat4 m_proj;
-uniform mat4 m_view;
+layout (std140) uniform Camera {
+    mat4 m_proj;
+    mat4 m_view;
+    vec4 fog;  // rgb: background color, a: fog density
+    float water_line;
+};
+
 uniform mat4 m_model;
 
 flat out int voxel_id;
@@ -38,6 +44,17 @@ const int uv_indices[24] = int[24](
     1, 2, 3, 1, 0, 2   // odd flipped face
 );
 
+// corner of each vertex of a face relative to its voxel, as bits x | y << 1 | z << 2,
+// in the order build_chunk_mesh emits them: 12 per face, the even then the flipped triangles
+const int vertex_corners[72] = int[72](
+    2, 6, 7, 2, 7, 3,  3, 2, 6, 3, 6, 7,  // top
+    0, 5, 4, 0, 1, 5,  1, 4, 0, 1, 5, 4,  // bottom
+    1, 3, 7, 1, 7, 5,  5, 1, 3, 5, 3, 7,  // right
+    0, 6, 2, 0, 4, 6,  4, 2, 0, 4, 6, 2,  // left
+    0, 2, 3, 0, 3, 1,  1, 0, 2, 1, 2, 3,  // back
+    4, 7, 6, 4, 5, 7,  5, 6, 4, 5, 7, 6   // front
+);
+
 
 vec3 hash31(float p) {
     vec3 p3 = fract(vec3(p * 21.2) * vec3(0.1031, 0.1030, 0.0973));
@@ -47,21 +64,23 @@ vec3 hash31(float p) {
 
 
 void unpack(uint packed_data) {
-    // a, b, c, d, e, f, g = x, y, z, voxel_id, face_id, ao_id, flip_id
-    uint b_bit = 6u, c_bit = 6u, d_bit = 8u, e_bit = 3u, f_bit = 2u, g_bit = 1u;
-    uint b_mask = 63u, c_mask = 63u, d_mask = 255u, e_mask = 7u, f_mask = 3u, g_mask = 1u;
+    // a, b, c, d, l, e, f, g = x, y, z, voxel_id, light_id, face_id, ao_id, flip_id
+    uint b_bit = 6u, c_bit = 6u, d_bit = 4u, l_bit = 4u, e_bit = 3u, f_bit = 2u, g_bit = 1u;
+    uint b_mask = 63u, c_mask = 63u, d_mask = 15u, l_mask = 15u, e_mask = 7u, f_mask = 3u, g_mask = 1u;
     //
     uint fg_bit = f_bit + g_bit;
     uint efg_bit = e_bit + fg_bit;
-    uint defg_bit = d_bit + efg_bit;
-    uint cdefg_bit = c_bit + defg_bit;
-    uint bcdefg_bit = b_bit + cdefg_bit;
+    uint lefg_bit = l_bit + efg_bit;
+    uint dlefg_bit = d_bit + lefg_bit;
+    uint cdlefg_bit = c_bit + dlefg_bit;
+    uint bcdlefg_bit = b_bit + cdlefg_bit;
     // unpacking vertex data
-    x = int(packed_data >> bcdefg_bit);
-    y = int((packed_data >> cdefg_bit) & b_mask);
-    z = int((packed_data >> defg_bit) & c_mask);
+    x = int(packed_data >> bcdlefg_bit);
+    y = int((packed_data >> cdlefg_bit) & b_mask);
+    z = int((packed_data >> dlefg_bit) & c_mask);
     //
-    voxel_id = int((packed_data >> efg_bit) & d_mask);
+    voxel_id = int((packed_data >> lefg_bit) & d_mask);
+    light_id = int((packed_data >> efg_bit) & l_mask);
     face_id = int((packed_data >> fg_bit) & e_mask);
     ao_id = int((packed_data >> g_bit) & f_mask);
     flip_id = int(packed_data & g_mask);
@@ -71,12 +90,15 @@ void unpack(uint packed_data) {
 void main() {
     unpack(packed_data);
 
-    vec3 in_position = vec3(x, y, z);
+    // packed positions are the voxel's, each vertex sits on one of its corners
+    int corner = vertex_corners[face_id * 12 + flip_id * 6 + gl_VertexID % 6];
+    vec3 in_position = vec3(x + (corner & 1), y + (corner >> 1 & 1), z + (corner >> 2));
     int uv_index = gl_VertexID % 6  + ((face_id & 1) + flip_id * 2) * 6;
 
     uv = uv_coords[uv_indices[uv_index]];
 
-    shading = face_shading[face_id] * ao_values[ao_id];
+    // each light level below full sunlight dims the face by 20%
+    shading = face_shading[face_id] * ao_values[ao_id] * pow(0.8, float(15 - light_id));
 
     frag_world_pos = (m_model * vec4(in_position, 1.0)).xyz;
 
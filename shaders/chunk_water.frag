@@ -0,0 +1,32 @@
+#version 330 core
+
+layout (location = 0) out vec4 fragColor;
+
+const vec3 gamma = vec3(2.2);
+const vec3 inv_gamma = 1 / gamma;
+
+uniform sampler2D u_texture_0;
+layout (std140) uniform Camera {
+    mat4 m_proj;
+    mat4 m_view;
+    vec4 fog;  // rgb: background color, a: fog density
+    float water_line;
+};
+
+in vec2 uv;
+in float shading;
+
+
+void main() {
+    vec3 tex_col = texture(u_texture_0, uv).rgb;
+    tex_col = pow(tex_col, gamma);
+
+    tex_col *= shading;
+
+    // fog
+    float fog_dist = gl_FragCoord.z / gl_FragCoord.w;
+    tex_col = mix(tex_col, fog.rgb, (1.0 - exp2(-fog.a * fog_dist * fog_dist)));
+
+    tex_col = pow(tex_col, inv_gamma);
+    fragColor = vec4(tex_col, 0.6);
+}
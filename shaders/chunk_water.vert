@@ -0,0 +1,39 @@
+#version 330 core
+
+layout (location = 0) in uvec3 in_position;
+layout (location = 1) in uint in_drop;
+layout (location = 2) in uint in_face;
+
+layout (std140) uniform Camera {
+    mat4 m_proj;
+    mat4 m_view;
+    vec4 fog;  // rgb: background color, a: fog density
+    float water_line;
+};
+
+uniform mat4 m_model;
+
+out vec2 uv;
+out float shading;
+
+const float face_shading[6] = float[6](
+    1.0, 0.5,  // top bottom
+    0.5, 0.8,  // right left
+    0.5, 0.8   // front back
+);
+
+
+void main() {
+    // flowing water sits lower in its cell, in ninths of a voxel
+    vec3 pos = vec3(in_position);
+    pos.y -= float(in_drop) / 9.0;
+
+    vec3 world_pos = (m_model * vec4(pos, 1.0)).xyz;
+    // the water texture tiles in world space, projected along the face normal
+    if (in_face < 2u) uv = world_pos.xz;
+    else if (in_face < 4u) uv = world_pos.zy;
+    else uv = world_pos.xy;
+    shading = face_shading[int(in_face)];
+
+    gl_Position = m_proj * m_view * vec4(world_pos, 1.0);
+}
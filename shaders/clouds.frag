@@ -4,11 +4,16 @@ layout (location = 0) out vec4 fragColor;
 
 const vec3 cloud_color = vec3(1);
 
-uniform vec3 bg_color;
+layout (std140) uniform Camera {
+    mat4 m_proj;
+    mat4 m_view;
+    vec4 fog;  // rgb: background color, a: fog density
+    float water_line;
+};
 
 void main() {
     float fog_dist = gl_FragCoord.z / gl_FragCoord.w;
-    vec3 col = mix(cloud_color, bg_color, 1.0 - exp(-0.000001 * fog_dist * fog_dist));
+    vec3 col = mix(cloud_color, fog.rgb, 1.0 - exp(-0.000001 * fog_dist * fog_dist));
 
     fragColor = vec4(col, 0.8);
 }
\ No newline at end of file
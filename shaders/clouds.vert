@@ -1,22 +1,29 @@
 #version 330 core
 
-layout (location = 0) in vec3 in_position;
+layout (location = 0) in vec2 in_position;
+
+layout (std140) uniform Camera {
+    mat4 m_proj;
+    mat4 m_view;
+    vec4 fog;  // rgb: background color, a: fog density
+    float water_line;
+};
 
-uniform mat4 m_proj;
-uniform mat4 m_view;
 uniform mat4 m_view_proj;
 uniform int center;
-uniform float u_time;
+uniform float cloud_offset;
 uniform float cloud_scale;
+uniform float cloud_height;
+uniform ivec2 tile_origin;
 
 void main() {
-    vec3 pos = vec3(in_position);
+    // vertices are relative to the tile origin, in cloud cells
+    vec3 pos = vec3(tile_origin.x + in_position.x, cloud_height, tile_origin.y + in_position.y);
     pos.xz -= center;
     pos.xz *= cloud_scale;
     pos.xz += center;
 
-    float time = 300 * sin(0.01 * u_time);
-    pos.xz += time;
+    pos.xz += cloud_offset;
     gl_Position = m_proj * m_view * vec4(pos, 1.0);
 //    gl_Position = m_view_proj * vec4(pos, 1.0);
-}
\ No newline at end of file
+}
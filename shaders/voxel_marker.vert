@@ -3,8 +3,13 @@
 layout (location = 0) in vec2 in_tex_coord_0;
 layout (location = 1) in vec3 in_position;
 
-uniform mat4 m_proj;
-uniform mat4 m_view;
+layout (std140) uniform Camera {
+    mat4 m_proj;
+    mat4 m_view;
+    vec4 fog;  // rgb: background color, a: fog density
+    float water_line;
+};
+
 uniform mat4 m_model;
 uniform uint mode_id;
 
@@ -8,7 +8,6 @@ const vec3 inv_gamma = 1 / gamma;
 in vec2 uv;
 
 uniform sampler2D u_texture_0;
-uniform float water_line;
 
 
 void main() {
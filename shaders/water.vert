@@ -3,11 +3,15 @@
 layout (location = 0) in vec2 in_tex_coord;
 layout (location = 1) in vec3 in_position;
 
-uniform mat4 m_proj;
-uniform mat4 m_view;
+layout (std140) uniform Camera {
+    mat4 m_proj;
+    mat4 m_view;
+    vec4 fog;  // rgb: background color, a: fog density
+    float water_line;
+};
+
 uniform mat4 m_view_proj;
 uniform int water_area;
-uniform float water_line;
 
 out vec2 uv;
 
@@ -1,9 +1,22 @@
 from noise import noise2, noise3
-from random import random
+from random import random, seed
 from settings import *
 
 
-@njit
+@njit(cache=True)
+def seed_terrain(value):
+    # numba keeps its own random state, seeding the random module from Python doesn't reach it
+    seed(value)
+
+
+def get_chunk_seed(chunk_pos):
+    # every chunk draws its random numbers from its own seed, so generation is deterministic
+    # in any order: saved changes are deltas against it and servers generate on demand
+    x, y, z = chunk_pos
+    return SEED + x + WORLD_W * z + WORLD_AREA * y
+
+
+@njit(cache=True)
 def get_height(x, z):
     # island mask
     island = 1 / (pow(0.0025 * math.hypot(x - CENTER_XZ, z - CENTER_XZ), 20) + 0.0001)
@@ -32,12 +45,12 @@ def get_height(x, z):
     return int(height)
 
 
-@njit
+@njit(cache=True)
 def get_index(x, y, z):
     return x + CHUNK_SIZE * z + CHUNK_AREA * y
 
 
-@njit
+@njit(cache=True)
 def set_voxel_id(voxels, x, y, z, wx, wy, wz, world_height):
     voxel_id = 0
 
@@ -75,7 +88,7 @@ def set_voxel_id(voxels, x, y, z, wx, wy, wz, world_height):
         place_tree(voxels, x, y, z, voxel_id)
 
 
-@njit
+@njit(cache=True)
 def place_tree(voxels, x, y, z, voxel_id):
     rnd = random()
     if voxel_id != GRASS or rnd > TREE_PROBABILITY:
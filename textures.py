@@ -1,8 +1,6 @@
-# TEXTURE SYSTEM DISABLED - Uncomment all code below to reactivate textures
-
-"""
-import pygame as pg
 import moderngl as mgl
+from asset_pipeline import TexturePack
+from profiler import startup_profiler
 
 
 class Textures:
@@ -10,35 +8,41 @@ class Textures:
         self.app = app
         self.ctx = app.ctx
 
+        # decoded, flipped and mipmapped offline by asset_pipeline.py
+        with startup_profiler.timed('textures.pack'):
+            self.pack = TexturePack()
+
         # load textures
         self.texture_0 = self.load('frame.png')
         self.texture_1 = self.load('water.png')
-        self.texture_array_0 = self.load('tex_array_0.png', is_tex_array=True)
+        self.texture_array_0 = self.load('tex_array_0.png')
 
         # assign texture unit
         self.texture_0.use(location=0)
         self.texture_array_0.use(location=1)
         self.texture_1.use(location=2)
 
-    def load(self, file_name, is_tex_array=False):
-        texture = pg.image.load(f'assets/{file_name}')
-        texture = pg.transform.flip(texture, flip_x=True, flip_y=False)
-
-        if is_tex_array:
-            num_layers = 3 * texture.get_height() // texture.get_width()  # 3 textures per layer
-            texture = self.app.ctx.texture_array(
-                size=(texture.get_width(), texture.get_height() // num_layers, num_layers),
-                components=4,
-                data=pg.image.tostring(texture, 'RGBA')
-            )
+    @startup_profiler.phase('textures.upload')
+    def load(self, file_name):
+        info = self.pack.textures[file_name]
+        levels = self.pack.get_levels(file_name)
+        width, height, pixels = levels[0]
+
+        # pixels are views into the mapped pack, the driver copies them straight from the page cache
+        if info['is_tex_array']:
+            texture = self.ctx.texture_array(size=(width, height, info['layers']), components=4, data=pixels)
         else:
-            texture = self.ctx.texture(
-                size=texture.get_size(),
-                components=4,
-                data=pg.image.tostring(texture, 'RGBA', False)
-            )
+            texture = self.ctx.texture(size=(width, height), components=4, data=pixels)
+
+        if info['is_tex_array']:
+            # stored without mips, the TextureArray.write of moderngl 5.8 only writes level 0
+            texture.build_mipmaps()
+        else:
+            # moderngl only allocates mip levels through build_mipmaps, the stored ones replace them
+            texture.build_mipmaps(0, len(levels) - 1)
+            for level, (_, _, level_pixels) in enumerate(levels[1:], 1):
+                texture.write(level_pixels, level=level)
+
         texture.anisotropy = 32.0
-        texture.build_mipmaps()
         texture.filter = (mgl.NEAREST, mgl.NEAREST)
         return texture
-"""
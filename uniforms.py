@@ -0,0 +1,78 @@
+from settings import *
+
+# Uniform state shared by every program: the camera block lives in one std140 uniform buffer
+# bound to all programs, and per-program uniforms go through set(), which skips writes of
+# values a program already holds. Writes and skipped writes are counted per frame.
+#
+#   layout (std140) uniform Camera {
+#       mat4 m_proj;       // offset 0
+#       mat4 m_view;       // offset 64
+#       vec4 fog;          // offset 128, rgb: background color, a: fog density
+#       float water_line;  // offset 144
+#   };
+
+CAMERA_BLOCK = 'Camera'
+CAMERA_BINDING = 0
+CAMERA_BLOCK_SIZE = 160  # bytes, std140 rounds the block up to a multiple of 16
+
+M_PROJ, M_VIEW, FOG, WATER = slice(0, 16), slice(16, 32), slice(32, 36), 36
+
+
+class UniformState:
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.camera = np.zeros(CAMERA_BLOCK_SIZE // 4, dtype='float32')
+        self.next_camera = self.camera.copy()
+        self.camera_buffer = ctx.buffer(reserve=CAMERA_BLOCK_SIZE)
+        self.camera_buffer.bind_to_uniform_block(CAMERA_BINDING)
+        self.is_camera_written = False
+
+        # (program, uniform name) -> last written value
+        self.values = {}
+
+        # counters of the current frame and of the last finished one
+        self.num_writes = self.num_skipped = 0
+        self.frame_writes = self.frame_skipped = 0
+
+    def bind(self, program):
+        program[CAMERA_BLOCK].binding = CAMERA_BINDING
+
+    def set_environment(self, bg_color, fog_density, water_line):
+        self.next_camera[FOG] = (*bg_color, fog_density)
+        self.next_camera[WATER] = water_line
+
+    def set_camera(self, m_proj, m_view):
+        # a still camera leaves the block unchanged and skips the upload
+        camera = self.next_camera
+        camera[M_PROJ] = np.frombuffer(m_proj.to_bytes(), dtype='float32')
+        camera[M_VIEW] = np.frombuffer(m_view.to_bytes(), dtype='float32')
+
+        if self.is_camera_written and np.array_equal(camera, self.camera):
+            self.num_skipped += 1
+            return
+        self.camera[:] = camera
+        self.camera_buffer.write(self.camera)
+        self.is_camera_written = True
+        self.num_writes += 1
+
+    def set(self, program, name, value):
+        key = (program.glo, name)
+        if key in self.values and self.values[key] == value:
+            self.num_skipped += 1
+            return
+
+        if isinstance(value, (int, float, tuple)):
+            program[name].value = value
+            self.values[key] = value
+        else:
+            # glm values are mutable, keep a copy to compare against
+            program[name].write(value)
+            self.values[key] = type(value)(value)
+        self.num_writes += 1
+
+    def end_frame(self):
+        self.frame_writes, self.frame_skipped = self.num_writes, self.num_skipped
+        self.num_writes = self.num_skipped = 0
+
+    def get_overlay_text(self):
+        return f' | uniforms {self.frame_writes} writes {self.frame_skipped} skipped'
@@ -1,10 +1,11 @@
 from settings import *
-from meshes.chunk_mesh_builder import get_chunk_index
+from profiler import frame_profiler
 
 
 class VoxelHandler:
     def __init__(self, world):
         self.app = world.app
+        self.world = world
         self.chunks = world.chunks
 
         # ray casting result
@@ -15,72 +16,40 @@ class VoxelHandler:
         self.voxel_world_pos = None
         self.voxel_normal = None
 
-        self.interaction_mode = 0  # 0: remove voxel (FIJO - construcción deshabilitada)
-        self.new_voxel_id = DIRT  # No se usa ya que la construcción está deshabilitada
+        self.interaction_mode = 0  # 0: remove voxel   1: add voxel
+        self.new_voxel_id = DIRT
 
     def add_voxel(self):
-        # CONSTRUCCIÓN DESHABILITADA - Solo se permite destruir cubos
-        pass
-        # if self.voxel_id:
-        #     # check voxel id along normal
-        #     result = self.get_voxel_id(self.voxel_world_pos + self.voxel_normal)
-        #
-        #     # is the new place empty?
-        #     if not result[0]:
-        #         _, voxel_index, _, chunk = result
-        #         chunk.voxels[voxel_index] = self.new_voxel_id
-        #         chunk.mesh.rebuild()
-        #
-        #         # was it an empty chunk
-        #         if chunk.is_empty:
-        #             chunk.is_empty = False
-
-    def rebuild_adj_chunk(self, adj_voxel_pos):
-        index = get_chunk_index(adj_voxel_pos)
-        if index != -1:
-            self.chunks[index].mesh.rebuild()
-
-    def rebuild_adjacent_chunks(self):
-        lx, ly, lz = self.voxel_local_pos
-        wx, wy, wz = self.voxel_world_pos
-
-        if lx == 0:
-            self.rebuild_adj_chunk((wx - 1, wy, wz))
-        elif lx == CHUNK_SIZE - 1:
-            self.rebuild_adj_chunk((wx + 1, wy, wz))
-
-        if ly == 0:
-            self.rebuild_adj_chunk((wx, wy - 1, wz))
-        elif ly == CHUNK_SIZE - 1:
-            self.rebuild_adj_chunk((wx, wy + 1, wz))
-
-        if lz == 0:
-            self.rebuild_adj_chunk((wx, wy, wz - 1))
-        elif lz == CHUNK_SIZE - 1:
-            self.rebuild_adj_chunk((wx, wy, wz + 1))
+        if self.voxel_id:
+            # place against the hit face, if that spot is empty and not inside the player
+            pos = self.voxel_world_pos + self.voxel_normal
+            if not self.world.get_voxel_id(glm.vec3(pos)) and not self.is_inside_player(pos):
+                self.world.set_voxel(pos, self.new_voxel_id)
+
+    def is_inside_player(self, voxel_world_pos):
+        # the voxel's unit cube overlaps the player's collision box
+        feet = self.app.player.feet_position
+        half_size = PLAYER_COLLISION_SIZE / 2
+        return (feet.x - half_size < voxel_world_pos.x + 1 and voxel_world_pos.x < feet.x + half_size and
+                feet.y < voxel_world_pos.y + 1 and voxel_world_pos.y < feet.y + PLAYER_HEIGHT and
+                feet.z - half_size < voxel_world_pos.z + 1 and voxel_world_pos.z < feet.z + half_size)
 
     def remove_voxel(self):
         if self.voxel_id:
-            self.chunk.voxels[self.voxel_index] = 0
-
-            self.chunk.mesh.rebuild()
-            self.rebuild_adjacent_chunks()
+            self.world.set_voxel(self.voxel_world_pos, 0)
 
     def set_voxel(self):
-        # Solo permitir destruir cubos, construcción deshabilitada
-        self.remove_voxel()
-        # if self.interaction_mode:
-        #     self.add_voxel()
-        # else:
-        #     self.remove_voxel()
+        if self.interaction_mode:
+            self.add_voxel()
+        else:
+            self.remove_voxel()
 
     def switch_mode(self):
-        # Cambio de modo deshabilitado - Solo se permite destruir
-        pass
-        # self.interaction_mode = not self.interaction_mode
+        self.interaction_mode = not self.interaction_mode
 
     def update(self):
-        self.ray_cast()
+        with frame_profiler.section('ray_cast'):
+            self.ray_cast()
 
     def ray_cast(self):
         # start point
@@ -0,0 +1,606 @@
+from settings import *
+
+# Sparse 64-tree voxel store, an alternative to the dense [chunks, CHUNK_VOL] array for tall worlds.
+#
+# Every chunk column is cut into slabs TREE_SIZE voxels tall, each the root of a 64-tree: a node
+# covers a cube of 64, 16 or 4 voxels and splits it into 4x4x4 children. A child is either
+# uniform (one voxel id, kept in values[node, child]) or mixed (its bit set in masks[node]);
+# the mixed children of a node are stored contiguously from children[node], so the index of
+# one is children[node] plus the number of mixed children before it. The children of a 4 voxel
+# node are single voxels, always uniform. Air above the terrain and the stone below it collapse
+# into a few uniform children, while a slab of mixed voxels costs little more than dense storage.
+# The columns are 48 voxels wide, the padding up to 64 is uniform air that is never queried.
+#
+# The kernels come in pairs with the same arguments after the store's arrays, tree_* over the
+# tree and dense_* over a dense array of any number of chunk layers, so callers can switch
+# stores. Edits rebuild the slab they touch and leave the old nodes as garbage until compact().
+
+TREE_SIZE = 64
+# child index bit shift of the root, each level down is 2 less
+TREE_SHIFT = 4
+NUM_CHILDREN = 64
+
+ONE = np.uint64(1)
+M1 = np.uint64(0x5555555555555555)
+M2 = np.uint64(0x3333333333333333)
+M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+H01 = np.uint64(0x0101010101010101)
+
+
+@njit(cache=True)
+def popcount(x):
+    x = x - ((x >> ONE) & M1)
+    x = (x & M2) + ((x >> np.uint64(2)) & M2)
+    x = (x + (x >> np.uint64(4))) & M4
+    return np.int64((x * H01) >> np.uint64(56))
+
+
+@njit(cache=True)
+def read_slab(voxels, num_layers, column, slab, out):
+    # dense chunk voxels of one slab into out[y, z, x] (TREE_SIZE cubed, padding air)
+    out[:] = 0
+    cx, cz = column % WORLD_W, column // WORLD_W
+    for y in range(TREE_SIZE):
+        wy = slab * TREE_SIZE + y
+        if wy >= num_layers * CHUNK_SIZE:
+            break
+        chunk_index = cx + WORLD_W * cz + WORLD_AREA * (wy // CHUNK_SIZE)
+        offset = CHUNK_AREA * (wy % CHUNK_SIZE)
+        for z in range(CHUNK_SIZE):
+            for x in range(CHUNK_SIZE):
+                out[y, z, x] = voxels[chunk_index, offset + x + CHUNK_SIZE * z]
+
+
+@njit(cache=True)
+def is_uniform(values):
+    for i in range(1, len(values)):
+        if values[i] != values[0]:
+            return False
+    return True
+
+
+@njit(cache=True)
+def grow_nodes(masks, children, values, needed):
+    if needed <= len(masks):
+        return masks, children, values
+    size = max(needed, 2 * len(masks))
+    grown_masks = np.zeros(size, dtype='uint64')
+    grown_children = np.full(size, -1, dtype='int32')
+    grown_values = np.zeros((size, NUM_CHILDREN), dtype='uint8')
+    grown_masks[:len(masks)] = masks
+    grown_children[:len(masks)] = children
+    grown_values[:len(masks)] = values
+    return grown_masks, grown_children, grown_values
+
+
+@njit(cache=True)
+def build_slab(slab_voxels, masks, children, values, num_nodes):
+    # appends the tree of a slab (out of read_slab); -> the arrays, its root and the node count
+    # 4 voxel nodes, 16 per side
+    small_values = np.empty((4096, NUM_CHILDREN), dtype='uint8')
+    is_small_mixed = np.empty(4096, dtype='bool')
+    for node in range(4096):
+        nx, nz, ny = node % 16 * 4, node // 16 % 16 * 4, node // 256 * 4
+        for i in range(NUM_CHILDREN):
+            small_values[node, i] = slab_voxels[ny + i // 16, nz + i // 4 % 4, nx + i % 4]
+        is_small_mixed[node] = not is_uniform(small_values[node])
+
+    # 16 voxel nodes, 4 per side; their children are 4 voxel nodes
+    mid_masks = np.zeros(NUM_CHILDREN, dtype='uint64')
+    mid_values = np.zeros((NUM_CHILDREN, NUM_CHILDREN), dtype='uint8')
+    is_mid_mixed = np.empty(NUM_CHILDREN, dtype='bool')
+    num_needed = 1
+    for mid in range(NUM_CHILDREN):
+        mx, mz, my = mid % 4 * 4, mid // 4 % 4 * 4, mid // 16 * 4
+        for i in range(NUM_CHILDREN):
+            small = mx + i % 4 + 16 * (mz + i // 4 % 4) + 256 * (my + i // 16)
+            if is_small_mixed[small]:
+                mid_masks[mid] |= ONE << np.uint64(i)
+            else:
+                mid_values[mid, i] = small_values[small, 0]
+        is_mid_mixed[mid] = mid_masks[mid] != 0 or not is_uniform(mid_values[mid])
+        if is_mid_mixed[mid]:
+            num_needed += 1 + popcount(mid_masks[mid])
+
+    masks, children, values = grow_nodes(masks, children, values, num_nodes + num_needed)
+    root = num_nodes
+    masks[root] = 0
+    children[root] = root + 1
+    num_nodes += 1
+    for mid in range(NUM_CHILDREN):
+        if is_mid_mixed[mid]:
+            masks[root] |= ONE << np.uint64(mid)
+        else:
+            values[root, mid] = mid_values[mid, 0]
+    # the mixed 16 voxel nodes, then the mixed children of each in turn
+    mid_nodes = np.empty(NUM_CHILDREN, dtype='int64')
+    for mid in range(NUM_CHILDREN):
+        if is_mid_mixed[mid]:
+            mid_nodes[mid] = num_nodes
+            masks[num_nodes] = mid_masks[mid]
+            values[num_nodes] = mid_values[mid]
+            num_nodes += 1
+    for mid in range(NUM_CHILDREN):
+        if not is_mid_mixed[mid]:
+            continue
+        children[mid_nodes[mid]] = num_nodes
+        mx, mz, my = mid % 4 * 4, mid // 4 % 4 * 4, mid // 16 * 4
+        for i in range(NUM_CHILDREN):
+            small = mx + i % 4 + 16 * (mz + i // 4 % 4) + 256 * (my + i // 16)
+            if is_small_mixed[small]:
+                masks[num_nodes] = 0
+                children[num_nodes] = -1
+                values[num_nodes] = small_values[small]
+                num_nodes += 1
+    return masks, children, values, root, num_nodes
+
+
+@njit(cache=True)
+def build_tree(voxels, num_layers, roots, masks, children, values):
+    # every slab of every column from dense chunk voxels; -> the arrays and the node count
+    slab_voxels = np.empty((TREE_SIZE, TREE_SIZE, TREE_SIZE), dtype='uint8')
+    num_nodes = 0
+    for column in range(WORLD_AREA):
+        for slab in range(roots.shape[1]):
+            read_slab(voxels, num_layers, column, slab, slab_voxels)
+            masks, children, values, roots[column, slab], num_nodes = build_slab(
+                slab_voxels, masks, children, values, num_nodes)
+    return masks, children, values, num_nodes
+
+
+@njit(cache=True)
+def decode_slab(masks, children, values, root, out):
+    # the voxels of a slab's tree into out[y, z, x], padding included
+    for mid in range(NUM_CHILDREN):
+        mx, mz, my = mid % 4 * 16, mid // 4 % 4 * 16, mid // 16 * 16
+        mid_bit = ONE << np.uint64(mid)
+        if not masks[root] & mid_bit:
+            out[my:my + 16, mz:mz + 16, mx:mx + 16] = values[root, mid]
+            continue
+        mid_node = children[root] + popcount(masks[root] & (mid_bit - ONE))
+        for i in range(NUM_CHILDREN):
+            sx, sz, sy = mx + i % 4 * 4, mz + i // 4 % 4 * 4, my + i // 16 * 4
+            bit = ONE << np.uint64(i)
+            if not masks[mid_node] & bit:
+                out[sy:sy + 4, sz:sz + 4, sx:sx + 4] = values[mid_node, i]
+                continue
+            small_node = children[mid_node] + popcount(masks[mid_node] & (bit - ONE))
+            for j in range(NUM_CHILDREN):
+                out[sy + j // 16, sz + j // 4 % 4, sx + j % 4] = values[small_node, j]
+
+
+@njit(cache=True)
+def get_tree_cell(masks, children, values, roots, height, wx, wy, wz):
+    # -> voxel id and the side of the uniform cube around it that holds only that id
+    if not (0 <= wx < WORLD_X and 0 <= wy < height and 0 <= wz < WORLD_Z):
+        return np.uint8(0), 1
+    node = np.int64(roots[wx // CHUNK_SIZE + WORLD_W * (wz // CHUNK_SIZE), wy // TREE_SIZE])
+    x, y, z = wx % CHUNK_SIZE, wy % TREE_SIZE, wz % CHUNK_SIZE
+    shift = TREE_SHIFT
+    while True:
+        i = (x >> shift & 3) + 4 * (z >> shift & 3) + 16 * (y >> shift & 3)
+        mask = masks[node]
+        bit = ONE << np.uint64(i)
+        if not mask & bit:
+            break
+        node = children[node] + popcount(mask & (bit - ONE))
+        shift -= 2
+    return values[node, i], 1 << shift
+
+
+@njit(cache=True)
+def tree_get_voxel(masks, children, values, roots, height, wx, wy, wz):
+    # voxel id, 0 outside the world
+    voxel_id, _ = get_tree_cell(masks, children, values, roots, height, wx, wy, wz)
+    return voxel_id
+
+
+@njit(cache=True)
+def dense_get_voxel(voxels, height, wx, wy, wz):
+    if not (0 <= wx < WORLD_X and 0 <= wy < height and 0 <= wz < WORLD_Z):
+        return 0
+    chunk_index = wx // CHUNK_SIZE + WORLD_W * (wz // CHUNK_SIZE) + WORLD_AREA * (wy // CHUNK_SIZE)
+    return voxels[chunk_index, wx % CHUNK_SIZE + CHUNK_SIZE * (wz % CHUNK_SIZE) + CHUNK_AREA * (wy % CHUNK_SIZE)]
+
+
+@njit(cache=True)
+def tree_is_void(masks, children, values, roots, height, wx, wy, wz):
+    # the mesher's is_void: air inside the world, solid outside it
+    if not (0 <= wx < WORLD_X and 0 <= wy < height and 0 <= wz < WORLD_Z):
+        return False
+    return tree_get_voxel(masks, children, values, roots, height, wx, wy, wz) == 0
+
+
+@njit(cache=True)
+def dense_is_void(voxels, height, wx, wy, wz):
+    if not (0 <= wx < WORLD_X and 0 <= wy < height and 0 <= wz < WORLD_Z):
+        return False
+    return dense_get_voxel(voxels, height, wx, wy, wz) == 0
+
+
+@njit(cache=True)
+def tree_get_voxels(masks, children, values, roots, height, positions):
+    # voxel ids of [n, 3] world voxel positions; the descent of get_tree_cell written out,
+    # calling it per point is several times slower
+    voxel_ids = np.zeros(len(positions), dtype='uint8')
+    for k in range(len(positions)):
+        wx, wy, wz = positions[k, 0], positions[k, 1], positions[k, 2]
+        if not (0 <= wx < WORLD_X and 0 <= wy < height and 0 <= wz < WORLD_Z):
+            continue
+        node = np.int64(roots[wx // CHUNK_SIZE + WORLD_W * (wz // CHUNK_SIZE), wy // TREE_SIZE])
+        x, y, z = wx % CHUNK_SIZE, wy % TREE_SIZE, wz % CHUNK_SIZE
+        shift = TREE_SHIFT
+        while True:
+            i = (x >> shift & 3) + 4 * (z >> shift & 3) + 16 * (y >> shift & 3)
+            mask = masks[node]
+            bit = ONE << np.uint64(i)
+            if not mask & bit:
+                break
+            node = children[node] + popcount(mask & (bit - ONE))
+            shift -= 2
+        voxel_ids[k] = values[node, i]
+    return voxel_ids
+
+
+@njit(cache=True)
+def dense_get_voxels(voxels, height, positions):
+    voxel_ids = np.empty(len(positions), dtype='uint8')
+    for k in range(len(positions)):
+        voxel_ids[k] = dense_get_voxel(voxels, height, positions[k, 0], positions[k, 1], positions[k, 2])
+    return voxel_ids
+
+
+@njit(cache=True)
+def clip_box(height, x0, y0, z0, x1, y1, z1):
+    return max(x0, 0), max(y0, 0), max(z0, 0), min(x1, WORLD_X), min(y1, height), min(z1, WORLD_Z)
+
+
+@njit(cache=True)
+def visit_tree_box(masks, children, values, roots, height, box, out, stop_at_solid):
+    # the half-open box of world voxels, descending only into the nodes it overlaps: writes
+    # the ids into out[y, z, x] (box-relative) unless stop_at_solid; -> whether any is solid
+    bx0, by0, bz0, bx1, by1, bz1 = box
+    x0, y0, z0, x1, y1, z1 = clip_box(height, bx0, by0, bz0, bx1, by1, bz1)
+    # (node, world x, y, z of its corner, shift of its children)
+    stack = np.empty((3 * NUM_CHILDREN, 5), dtype='int64')
+    is_solid = False
+    for cz in range(z0 // CHUNK_SIZE, (z1 + CHUNK_SIZE - 1) // CHUNK_SIZE):
+        for cx in range(x0 // CHUNK_SIZE, (x1 + CHUNK_SIZE - 1) // CHUNK_SIZE):
+            for slab in range(y0 // TREE_SIZE, (y1 + TREE_SIZE - 1) // TREE_SIZE):
+                stack[0, 0] = roots[cx + WORLD_W * cz, slab]
+                stack[0, 1], stack[0, 2], stack[0, 3] = cx * CHUNK_SIZE, slab * TREE_SIZE, cz * CHUNK_SIZE
+                stack[0, 4] = TREE_SHIFT
+                top = 1
+                while top:
+                    top -= 1
+                    node, nx, ny, nz, shift = stack[top, 0], stack[top, 1], stack[top, 2], stack[top, 3], stack[top, 4]
+                    size = 1 << shift
+                    # only the children the box overlaps, none of the padding beyond the column
+                    for iy in range(max(y0 - ny, 0) // size, (min(y1 - ny, 4 * size) - 1) // size + 1):
+                        for iz in range(max(z0 - nz, 0) // size, (min(z1 - nz, 4 * size, CHUNK_SIZE) - 1) // size + 1):
+                            for ix in range(max(x0 - nx, 0) // size,
+                                            (min(x1 - nx, 4 * size, CHUNK_SIZE) - 1) // size + 1):
+                                i = ix + 4 * iz + 16 * iy
+                                sx, sy, sz = nx + ix * size, ny + iy * size, nz + iz * size
+                                bit = ONE << np.uint64(i)
+                                if masks[node] & bit:
+                                    stack[top, 0] = children[node] + popcount(masks[node] & (bit - ONE))
+                                    stack[top, 1], stack[top, 2], stack[top, 3], stack[top, 4] = sx, sy, sz, shift - 2
+                                    top += 1
+                                    continue
+                                voxel_id = values[node, i]
+                                if voxel_id:
+                                    is_solid = True
+                                    if stop_at_solid:
+                                        return True
+                                if not stop_at_solid:
+                                    ex, ey, ez = max(sx, x0), max(sy, y0), max(sz, z0)
+                                    fx, fy, fz = min(sx + size, x1), min(sy + size, y1), min(sz + size, z1)
+                                    out[ey - by0:fy - by0, ez - bz0:fz - bz0, ex - bx0:fx - bx0] = voxel_id
+    return is_solid
+
+
+@njit(cache=True)
+def tree_get_box(masks, children, values, roots, height, x0, y0, z0, x1, y1, z1):
+    # voxel ids of the half-open box as [y, z, x], 0 outside the world
+    out = np.zeros((y1 - y0, z1 - z0, x1 - x0), dtype='uint8')
+    visit_tree_box(masks, children, values, roots, height, (x0, y0, z0, x1, y1, z1), out, False)
+    return out
+
+
+@njit(cache=True)
+def dense_get_box(voxels, height, x0, y0, z0, x1, y1, z1):
+    out = np.zeros((y1 - y0, z1 - z0, x1 - x0), dtype='uint8')
+    cx0, cy0, cz0, cx1, cy1, cz1 = clip_box(height, x0, y0, z0, x1, y1, z1)
+    for wy in range(cy0, cy1):
+        for wz in range(cz0, cz1):
+            for wx in range(cx0, cx1):
+                out[wy - y0, wz - z0, wx - x0] = dense_get_voxel(voxels, height, wx, wy, wz)
+    return out
+
+
+@njit(cache=True)
+def tree_is_box_solid(masks, children, values, roots, height, x0, y0, z0, x1, y1, z1):
+    # collision: whether any voxel of the half-open box is solid, outside the world is air
+    return visit_tree_box(masks, children, values, roots, height, (x0, y0, z0, x1, y1, z1),
+                          np.empty((0, 0, 0), dtype='uint8'), True)
+
+
+@njit(cache=True)
+def dense_is_box_solid(voxels, height, x0, y0, z0, x1, y1, z1):
+    cx0, cy0, cz0, cx1, cy1, cz1 = clip_box(height, x0, y0, z0, x1, y1, z1)
+    for wy in range(cy0, cy1):
+        for wz in range(cz0, cz1):
+            for wx in range(cx0, cx1):
+                if dense_get_voxel(voxels, height, wx, wy, wz):
+                    return True
+    return False
+
+
+@njit(cache=True)
+def clip_ray(height, origin, direction, max_distance):
+    # -> distances at which the ray enters and leaves the world box, enter > leave if it misses
+    t0, t1 = 0.0, max_distance
+    bounds = (WORLD_X, height, WORLD_Z)
+    for axis in range(3):
+        if direction[axis] == 0:
+            if not (0 <= origin[axis] < bounds[axis]):
+                return 1.0, 0.0
+            continue
+        ta = (0 - origin[axis]) / direction[axis]
+        tb = (bounds[axis] - origin[axis]) / direction[axis]
+        t0, t1 = max(t0, min(ta, tb)), min(t1, max(ta, tb))
+    return t0, t1
+
+
+@njit(cache=True)
+def step_ray(origin, direction, voxel, size):
+    # leaves the aligned cube of the given side around voxel: -> distance of the exit, the
+    # axis crossed, and moves voxel to the first one beyond it
+    t_exit, exit_axis = np.inf, -1
+    for axis in range(3):
+        low = voxel[axis] // size * size
+        if direction[axis] > 0:
+            t = (low + size - origin[axis]) / direction[axis]
+        elif direction[axis] < 0:
+            t = (low - origin[axis]) / direction[axis]
+        else:
+            continue
+        if t < t_exit:
+            t_exit, exit_axis = t, axis
+    for axis in range(3):
+        low = voxel[axis] // size * size
+        if axis == exit_axis:
+            voxel[axis] = low + size if direction[axis] > 0 else low - 1
+        else:
+            # the other axes stay within the cube, whatever the rounding
+            voxel[axis] = min(max(int(math.floor(origin[axis] + direction[axis] * t_exit)), low), low + size - 1)
+    return t_exit, exit_axis
+
+
+@njit(cache=True)
+def start_ray(height, origin, direction, max_distance):
+    # -> the first voxel of the ray in the world, and the distance the ray ends at (-1 on a miss)
+    t0, t1 = clip_ray(height, origin, direction, max_distance)
+    voxel = np.empty(3, dtype='int64')
+    if t0 > t1:
+        return voxel, -1.0
+    bounds = (WORLD_X, height, WORLD_Z)
+    for axis in range(3):
+        voxel[axis] = min(max(int(math.floor(origin[axis] + direction[axis] * t0)), 0), bounds[axis] - 1)
+    return voxel, t1
+
+
+@njit(cache=True)
+def tree_ray_cast(masks, children, values, roots, height, origin, direction, max_distance):
+    # first solid voxel along the unit direction within max_distance, skipping whole uniform
+    # air cubes at a time; -> hit, voxel, normal (the face entered, zero if the ray starts in
+    # the voxel), the last two only meaningful on a hit
+    normal = np.zeros(3, dtype='int64')
+    voxel, t_end = start_ray(height, origin, direction, max_distance)
+    if t_end < 0:
+        return False, voxel, normal
+    axis = -1
+    while True:
+        voxel_id, size = get_tree_cell(masks, children, values, roots, height, voxel[0], voxel[1], voxel[2])
+        if voxel_id:
+            if axis != -1:
+                normal[axis] = -1 if direction[axis] > 0 else 1
+            return True, voxel, normal
+        t, axis = step_ray(origin, direction, voxel, size)
+        if t > t_end:
+            return False, voxel, normal
+
+
+@njit(cache=True)
+def dense_ray_cast(voxels, height, origin, direction, max_distance):
+    normal = np.zeros(3, dtype='int64')
+    voxel, t_end = start_ray(height, origin, direction, max_distance)
+    if t_end < 0:
+        return False, voxel, normal
+    axis = -1
+    while True:
+        if dense_get_voxel(voxels, height, voxel[0], voxel[1], voxel[2]):
+            if axis != -1:
+                normal[axis] = -1 if direction[axis] > 0 else 1
+            return True, voxel, normal
+        t, axis = step_ray(origin, direction, voxel, 1)
+        if t > t_end:
+            return False, voxel, normal
+
+
+@njit(cache=True)
+def tree_cast_rays(masks, children, values, roots, height, origins, directions, max_distance):
+    # tree_ray_cast of [n, 3] origins and unit directions; -> hits, voxels, normals
+    hits = np.zeros(len(origins), dtype='bool')
+    voxels = np.zeros((len(origins), 3), dtype='int64')
+    normals = np.zeros((len(origins), 3), dtype='int64')
+    for k in range(len(origins)):
+        hits[k], voxels[k], normals[k] = tree_ray_cast(masks, children, values, roots, height,
+                                                      origins[k], directions[k], max_distance)
+    return hits, voxels, normals
+
+
+@njit(cache=True)
+def dense_cast_rays(voxels, height, origins, directions, max_distance):
+    hits = np.zeros(len(origins), dtype='bool')
+    hit_voxels = np.zeros((len(origins), 3), dtype='int64')
+    normals = np.zeros((len(origins), 3), dtype='int64')
+    for k in range(len(origins)):
+        hits[k], hit_voxels[k], normals[k] = dense_ray_cast(voxels, height, origins[k], directions[k], max_distance)
+    return hits, hit_voxels, normals
+
+
+@njit(cache=True)
+def tree_are_boxes_solid(masks, children, values, roots, height, box_min, box_max):
+    # tree_is_box_solid of [n, 3] half-open boxes
+    is_solid = np.empty(len(box_min), dtype='bool')
+    for k in range(len(box_min)):
+        is_solid[k] = tree_is_box_solid(masks, children, values, roots, height, box_min[k, 0], box_min[k, 1],
+                                        box_min[k, 2], box_max[k, 0], box_max[k, 1], box_max[k, 2])
+    return is_solid
+
+
+@njit(cache=True)
+def dense_are_boxes_solid(voxels, height, box_min, box_max):
+    is_solid = np.empty(len(box_min), dtype='bool')
+    for k in range(len(box_min)):
+        is_solid[k] = dense_is_box_solid(voxels, height, box_min[k, 0], box_min[k, 1], box_min[k, 2],
+                                         box_max[k, 0], box_max[k, 1], box_max[k, 2])
+    return is_solid
+
+
+class DenseVoxels:
+    # the dense chunk layout of World.voxels with num_layers chunk layers, behind the VoxelTree API
+    def __init__(self, voxels, num_layers=WORLD_H):
+        self.voxels = voxels
+        self.num_layers = num_layers
+        self.height = num_layers * CHUNK_SIZE
+
+    @property
+    def arrays(self):
+        return self.voxels,
+
+    @property
+    def nbytes(self):
+        return self.voxels.nbytes
+
+    def get_voxel(self, wx, wy, wz):
+        return dense_get_voxel(self.voxels, self.height, wx, wy, wz)
+
+    def get_voxels(self, positions):
+        return dense_get_voxels(self.voxels, self.height, positions)
+
+    def get_box(self, min_pos, max_pos):
+        return dense_get_box(self.voxels, self.height, *min_pos, *max_pos)
+
+    def is_box_solid(self, min_pos, max_pos):
+        return dense_is_box_solid(self.voxels, self.height, *min_pos, *max_pos)
+
+    def ray_cast(self, origin, direction, max_distance):
+        return dense_ray_cast(self.voxels, self.height, np.asarray(origin, dtype='float64'),
+                              np.asarray(direction, dtype='float64'), float(max_distance))
+
+    def cast_rays(self, origins, directions, max_distance):
+        return dense_cast_rays(self.voxels, self.height, origins, directions, float(max_distance))
+
+    def are_boxes_solid(self, box_min, box_max):
+        return dense_are_boxes_solid(self.voxels, self.height, box_min, box_max)
+
+
+class VoxelTree:
+    def __init__(self, num_layers=WORLD_H, capacity=1024):
+        self.num_layers = num_layers
+        self.height = num_layers * CHUNK_SIZE
+        self.num_slabs = (self.height + TREE_SIZE - 1) // TREE_SIZE
+        self.roots = np.zeros((WORLD_AREA, self.num_slabs), dtype='int32')
+        self.masks = np.zeros(capacity, dtype='uint64')
+        self.children = np.full(capacity, -1, dtype='int32')
+        self.values = np.zeros((capacity, NUM_CHILDREN), dtype='uint8')
+        self.num_nodes = 0
+        # nodes of slabs rebuilt since, reclaimed by compact()
+        self.num_garbage = 0
+
+    @classmethod
+    def from_dense(cls, voxels, num_layers=WORLD_H):
+        tree = cls(num_layers)
+        tree.masks, tree.children, tree.values, tree.num_nodes = build_tree(
+            voxels, num_layers, tree.roots, tree.masks, tree.children, tree.values)
+        return tree
+
+    @property
+    def arrays(self):
+        return self.masks, self.children, self.values, self.roots
+
+    @property
+    def nbytes(self):
+        # the nodes in use, not the spare capacity
+        return (self.num_nodes * (self.masks.itemsize + self.children.itemsize + NUM_CHILDREN)
+                + self.roots.nbytes)
+
+    def get_slab(self, column, slab):
+        slab_voxels = np.empty((TREE_SIZE, TREE_SIZE, TREE_SIZE), dtype='uint8')
+        decode_slab(self.masks, self.children, self.values, self.roots[column, slab], slab_voxels)
+        return slab_voxels
+
+    def set_slab(self, column, slab, slab_voxels):
+        old_root = self.roots[column, slab]
+        self.masks, self.children, self.values, self.roots[column, slab], num_nodes = build_slab(
+            slab_voxels, self.masks, self.children, self.values, self.num_nodes)
+        self.num_garbage += self.count_slab_nodes(old_root)
+        self.num_nodes = num_nodes
+
+    def count_slab_nodes(self, root):
+        mid_nodes = np.arange(self.children[root], self.children[root] + popcount(self.masks[root]))
+        return 1 + len(mid_nodes) + sum(popcount(self.masks[node]) for node in mid_nodes)
+
+    def set_voxels(self, positions, voxel_ids):
+        # [n, 3] world voxel positions inside the world; rebuilds every slab they touch
+        positions = np.asarray(positions, dtype='int64').reshape(-1, 3)
+        voxel_ids = np.broadcast_to(np.asarray(voxel_ids, dtype='uint8'), len(positions))
+        columns = positions[:, 0] // CHUNK_SIZE + WORLD_W * (positions[:, 2] // CHUNK_SIZE)
+        slabs = positions[:, 1] // TREE_SIZE
+        for column, slab in set(zip(columns.tolist(), slabs.tolist())):
+            edits = (columns == column) & (slabs == slab)
+            slab_voxels = self.get_slab(column, slab)
+            local = positions[edits]
+            slab_voxels[local[:, 1] % TREE_SIZE, local[:, 2] % CHUNK_SIZE, local[:, 0] % CHUNK_SIZE] = voxel_ids[edits]
+            self.set_slab(column, slab, slab_voxels)
+        if self.num_garbage > self.num_nodes // 2:
+            self.compact()
+
+    def compact(self):
+        # rebuilds every slab into fresh arrays, dropping the garbage
+        masks, children, values = self.masks, self.children, self.values
+        self.masks = np.zeros(max(self.num_nodes - self.num_garbage, 1), dtype='uint64')
+        self.children = np.full(len(self.masks), -1, dtype='int32')
+        self.values = np.zeros((len(self.masks), NUM_CHILDREN), dtype='uint8')
+        self.num_nodes = self.num_garbage = 0
+        slab_voxels = np.empty((TREE_SIZE, TREE_SIZE, TREE_SIZE), dtype='uint8')
+        for column in range(WORLD_AREA):
+            for slab in range(self.num_slabs):
+                decode_slab(masks, children, values, self.roots[column, slab], slab_voxels)
+                self.masks, self.children, self.values, self.roots[column, slab], self.num_nodes = build_slab(
+                    slab_voxels, self.masks, self.children, self.values, self.num_nodes)
+
+    def get_voxel(self, wx, wy, wz):
+        return tree_get_voxel(*self.arrays, self.height, wx, wy, wz)
+
+    def get_voxels(self, positions):
+        return tree_get_voxels(*self.arrays, self.height, positions)
+
+    def get_box(self, min_pos, max_pos):
+        return tree_get_box(*self.arrays, self.height, *min_pos, *max_pos)
+
+    def is_box_solid(self, min_pos, max_pos):
+        return tree_is_box_solid(*self.arrays, self.height, *min_pos, *max_pos)
+
+    def ray_cast(self, origin, direction, max_distance):
+        return tree_ray_cast(*self.arrays, self.height, np.asarray(origin, dtype='float64'),
+                             np.asarray(direction, dtype='float64'), float(max_distance))
+
+    def cast_rays(self, origins, directions, max_distance):
+        return tree_cast_rays(*self.arrays, self.height, origins, directions, float(max_distance))
+
+    def are_boxes_solid(self, box_min, box_max):
+        return tree_are_boxes_solid(*self.arrays, self.height, box_min, box_max)
@@ -0,0 +1,344 @@
+from settings import *
+from lighting import get_location, encode, decode, mark_dirty
+
+# Voxel water as a cellular automaton over world voxel coordinates. Water lives in air voxels,
+# its level is stored as a nibble per voxel, and only chunks that ever held water get a row of
+# nibbles (slots / levels, like the journal's dense deltas). Each tick only recomputes the
+# active cells, those that changed in the previous tick or had a neighbour change, so the cost
+# follows the flowing water, not the size of the world or of the sea.
+#
+# Rules, per air cell:
+#   - sources stay; an air cell with two source neighbours on a floor becomes one,
+#     and below the water line a single one is enough, so breaches in the coast flood
+#   - water above makes a cell fall (level WATER_FALLING)
+#   - otherwise it takes the highest level of its sideways neighbours minus one, counting
+#     only neighbours that rest on a floor (a solid voxel or a source)
+# Outside the world the sea continues: sources below the water line, air above it.
+
+WATER_FALLING = WATER_SOURCE - 1
+# (dx, dz) of the sideways neighbours
+SIDE_OFFSETS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+@njit(cache=True)
+def get_level(levels, slots, chunk_index, voxel_index):
+    slot = slots[chunk_index]
+    if slot == -1:
+        return 0
+    return (levels[slot, voxel_index >> 1] >> ((voxel_index & 1) << 2)) & 15
+
+
+@njit(cache=True)
+def set_level(levels, slots, chunk_index, voxel_index, level):
+    slot, byte, shift = slots[chunk_index], voxel_index >> 1, (voxel_index & 1) << 2
+    levels[slot, byte] = (levels[slot, byte] & (0xF0 >> shift)) | (level << shift)
+
+
+@njit(cache=True)
+def get_cell(voxels, levels, slots, wx, wy, wz):
+    # -> is solid, water level
+    if wy < 0:
+        return True, 0
+    chunk_index, voxel_index = get_location(wx, wy, wz)
+    if chunk_index == -1:
+        return False, WATER_SOURCE if wy <= WATER_SEA_TOP and wy < WORLD_Y else 0
+    if voxels[chunk_index, voxel_index]:
+        return True, 0
+    return False, get_level(levels, slots, chunk_index, voxel_index)
+
+
+@njit(cache=True)
+def is_floor(voxels, levels, slots, wx, wy, wz):
+    is_solid, level = get_cell(voxels, levels, slots, wx, wy, wz)
+    return is_solid or level == WATER_SOURCE
+
+
+@njit(cache=True)
+def get_new_level(voxels, levels, slots, wx, wy, wz):
+    is_solid, level = get_cell(voxels, levels, slots, wx, wy, wz)
+    if is_solid:
+        return 0
+    if level == WATER_SOURCE:
+        return WATER_SOURCE
+
+    num_sources, flow = 0, 0
+    for dx, dz in SIDE_OFFSETS:
+        _, side = get_cell(voxels, levels, slots, wx + dx, wy, wz + dz)
+        if side and is_floor(voxels, levels, slots, wx + dx, wy - 1, wz + dz):
+            num_sources += side == WATER_SOURCE
+            flow = max(flow, side - 1)
+
+    if num_sources and is_floor(voxels, levels, slots, wx, wy - 1, wz):
+        if num_sources >= 2 or wy <= WATER_SEA_TOP:
+            return WATER_SOURCE
+    if get_cell(voxels, levels, slots, wx, wy + 1, wz)[1]:
+        return WATER_FALLING
+    return flow
+
+
+@njit(cache=True)
+def get_new_levels(voxels, levels, slots, cells):
+    # reads only: every cell of a batch sees the levels from before the batch
+    new_levels = np.empty(len(cells), dtype='uint8')
+    for i in range(len(cells)):
+        wx, wy, wz = decode(cells[i])
+        new_levels[i] = get_new_level(voxels, levels, slots, wx, wy, wz)
+    return new_levels
+
+
+@njit(cache=True)
+def get_missing_slots(slots, cells, new_levels):
+    # chunks that get water and have no nibbles yet
+    is_missing = np.zeros(WORLD_VOL, dtype='uint8')
+    for i in range(len(cells)):
+        if new_levels[i]:
+            chunk_index, _ = get_location(*decode(cells[i]))
+            if slots[chunk_index] == -1:
+                is_missing[chunk_index] = 1
+    return np.flatnonzero(is_missing)
+
+
+@njit(cache=True)
+def set_levels(levels, slots, cells, new_levels, dirty):
+    # -> encoded positions of the cells whose level changed
+    changed = np.empty(len(cells), dtype='int64')
+    num_changed = 0
+    for i in range(len(cells)):
+        wx, wy, wz = decode(cells[i])
+        chunk_index, voxel_index = get_location(wx, wy, wz)
+        if get_level(levels, slots, chunk_index, voxel_index) != new_levels[i]:
+            set_level(levels, slots, chunk_index, voxel_index, new_levels[i])
+            mark_dirty(dirty, wx, wy, wz)
+            changed[num_changed] = cells[i]
+            num_changed += 1
+    return changed[:num_changed]
+
+
+@njit(cache=True)
+def get_activated(cells):
+    # the cells and their 6 neighbours inside the world, duplicates removed
+    activated = np.empty(7 * len(cells), dtype='int64')
+    num_activated = 0
+    for pos in cells:
+        wx, wy, wz = decode(pos)
+        for dx, dy, dz in ((0, 0, 0), (1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)):
+            nx, ny, nz = wx + dx, wy + dy, wz + dz
+            if 0 <= nx < WORLD_X and 0 <= ny < WORLD_Y and 0 <= nz < WORLD_Z:
+                activated[num_activated] = encode(nx, ny, nz)
+                num_activated += 1
+    return np.unique(activated[:num_activated])
+
+
+@njit(cache=True)
+def get_wet(voxels, levels, slots, cells):
+    # the cells holding water or below or beside water, no other cell can change level
+    is_wet = np.zeros(len(cells), dtype='bool')
+    for i in range(len(cells)):
+        wx, wy, wz = decode(cells[i])
+        for dx, dy, dz in ((0, 0, 0), (0, 1, 0), (1, 0, 0), (-1, 0, 0), (0, 0, 1), (0, 0, -1)):
+            if get_cell(voxels, levels, slots, wx + dx, wy + dy, wz + dz)[1]:
+                is_wet[i] = True
+                break
+    return cells[is_wet]
+
+
+@njit(cache=True)
+def clear_solid(voxels, levels, slots, cells, dirty):
+    # edited cells that are solid now hold no water; water faces next to any edited
+    # cell may have been covered or uncovered
+    for pos in cells:
+        wx, wy, wz = decode(pos)
+        chunk_index, voxel_index = get_location(wx, wy, wz)
+        if voxels[chunk_index, voxel_index] and get_level(levels, slots, chunk_index, voxel_index):
+            set_level(levels, slots, chunk_index, voxel_index, 0)
+        mark_dirty(dirty, wx, wy, wz)
+
+
+@njit(cache=True)
+def get_sea_chunks(voxels, x0, z0, x1, z1):
+    # chunks holding air below the water line that is open to the sky, over the voxel columns
+    # [x0, x1) x [z0, z1)
+    is_sea = np.zeros(WORLD_VOL, dtype='uint8')
+    for wz in range(z0, z1):
+        for wx in range(x0, x1):
+            chunk_index, voxel_index = get_location(wx, WATER_SEA_TOP, wz)
+            if not voxels[chunk_index, voxel_index] and is_open_to_sky(voxels, wx, wz):
+                for wy in range(WATER_SEA_TOP + 1):
+                    is_sea[get_location(wx, wy, wz)[0]] = 1
+    return np.flatnonzero(is_sea)
+
+
+@njit(cache=True)
+def is_open_to_sky(voxels, wx, wz):
+    for wy in range(WATER_SEA_TOP + 1, WORLD_Y):
+        chunk_index, voxel_index = get_location(wx, wy, wz)
+        if voxels[chunk_index, voxel_index]:
+            return False
+    return True
+
+
+@njit(cache=True)
+def fill_sea(voxels, levels, slots, x0, z0, x1, z1):
+    # sources in every voxel column of [x0, x1) x [z0, z1) open to the sky, from the water line
+    # down to the ground
+    for wz in range(z0, z1):
+        for wx in range(x0, x1):
+            if not is_open_to_sky(voxels, wx, wz):
+                continue
+            for wy in range(WATER_SEA_TOP, -1, -1):
+                chunk_index, voxel_index = get_location(wx, wy, wz)
+                if voxels[chunk_index, voxel_index]:
+                    break
+                set_level(levels, slots, chunk_index, voxel_index, WATER_SOURCE)
+
+
+@njit(cache=True)
+def fill_levels(voxels, levels, slots, x0, y0, z0, x1, y1, z1, level, dirty):
+    # half-open box already clipped to the world; -> encoded positions of the changed air cells
+    changed = np.empty((x1 - x0) * (y1 - y0) * (z1 - z0), dtype='int64')
+    num_changed = 0
+    for wy in range(y0, y1):
+        for wz in range(z0, z1):
+            for wx in range(x0, x1):
+                chunk_index, voxel_index = get_location(wx, wy, wz)
+                if voxels[chunk_index, voxel_index] or get_level(levels, slots, chunk_index, voxel_index) == level:
+                    continue
+                set_level(levels, slots, chunk_index, voxel_index, level)
+                mark_dirty(dirty, wx, wy, wz)
+                changed[num_changed] = encode(wx, wy, wz)
+                num_changed += 1
+    return changed[:num_changed]
+
+
+class WaterEngine:
+    def __init__(self, world):
+        self.world = world
+        # chunk index -> row in levels, -1 while the chunk never held water
+        self.slots = np.full(WORLD_VOL, -1, dtype='int32')
+        self.levels = np.zeros([0, CHUNK_VOL // 2], dtype='uint8')
+        self.num_slots = 0
+
+        # cells of the running tick not processed yet, and cells activated for the next one
+        self.pending = np.empty(0, dtype='int64')
+        self.activated = []
+        self.time_since_tick = 0.0
+
+        # chunks whose water changed since the last call, their water meshes need a rebuild
+        self.dirty = np.zeros(WORLD_VOL, dtype='uint8')
+        self.num_ticks = 0
+        self.num_updates = 0
+
+    def build_water(self):
+        self.slots[:] = -1
+        self.num_slots = 0
+        self.pending = np.empty(0, dtype='int64')
+        self.activated.clear()
+        self.add_slots(get_sea_chunks(self.world.voxels, 0, 0, WORLD_X, WORLD_Z))
+        self.levels[:self.num_slots] = 0
+        fill_sea(self.world.voxels, self.levels, self.slots, 0, 0, WORLD_X, WORLD_Z)
+        self.dirty[self.slots != -1] = 1
+
+    def build_sea(self, column):
+        # the sea of one column of chunks (x + WORLD_W * z) that just arrived, for worlds that
+        # come in column by column (see replica.py)
+        x0, z0 = column % WORLD_W * CHUNK_SIZE, column // WORLD_W * CHUNK_SIZE
+        bounds = x0, z0, x0 + CHUNK_SIZE, z0 + CHUNK_SIZE
+        sea_chunks = get_sea_chunks(self.world.voxels, *bounds)
+        self.add_slots(sea_chunks)
+        fill_sea(self.world.voxels, self.levels, self.slots, *bounds)
+        self.dirty[sea_chunks] = 1
+
+    def add_slots(self, chunk_indices):
+        chunk_indices = [index for index in chunk_indices if self.slots[index] == -1]
+        if not chunk_indices:
+            return
+        needed = self.num_slots + len(chunk_indices)
+        if needed > len(self.levels):
+            levels = np.zeros([max(needed, 2 * len(self.levels)), CHUNK_VOL // 2], dtype='uint8')
+            levels[:self.num_slots] = self.levels[:self.num_slots]
+            self.levels = levels
+        self.slots[chunk_indices] = np.arange(self.num_slots, needed)
+        self.num_slots = needed
+
+    def get_level(self, world_pos):
+        wx, wy, wz = (int(value) for value in world_pos)
+        chunk_index, voxel_index = get_location(wx, wy, wz)
+        if chunk_index == -1:
+            return 0
+        return get_level(self.levels, self.slots, chunk_index, voxel_index)
+
+    def fill_water(self, min_pos, max_pos, level=WATER_SOURCE):
+        # sets the air cells of an inclusive box to level (0 removes water); returns their number
+        x0, y0, z0 = (max(int(v), 0) for v in min_pos)
+        x1, y1, z1 = (min(int(v) + 1, size) for v, size in zip(max_pos, (WORLD_X, WORLD_Y, WORLD_Z)))
+        if x0 >= x1 or y0 >= y1 or z0 >= z1:
+            return 0
+        if level:
+            for cy in range(y0 // CHUNK_SIZE, (y1 - 1) // CHUNK_SIZE + 1):
+                for cz in range(z0 // CHUNK_SIZE, (z1 - 1) // CHUNK_SIZE + 1):
+                    self.add_slots(range(x0 // CHUNK_SIZE + WORLD_W * cz + WORLD_AREA * cy,
+                                         (x1 - 1) // CHUNK_SIZE + 1 + WORLD_W * cz + WORLD_AREA * cy))
+        changed = fill_levels(self.world.voxels, self.levels, self.slots, x0, y0, z0, x1, y1, z1,
+                              level, self.dirty)
+        self.activate(changed)
+        return len(changed)
+
+    def update_voxels(self, changed):
+        # call after the voxels at the encoded positions changed: water leaves what became
+        # solid and flows into what became air from the next tick on; dry cells stay inactive,
+        # so a chunk streamed in (see replica.py) doesn't flood the ticks
+        clear_solid(self.world.voxels, self.levels, self.slots, changed, self.dirty)
+        if len(changed):
+            self.activated.append(get_wet(self.world.voxels, self.levels, self.slots, get_activated(changed)))
+
+    def activate(self, cells):
+        if len(cells):
+            self.activated.append(get_activated(cells))
+
+    @property
+    def is_active(self):
+        return len(self.pending) > 0 or len(self.activated) > 0
+
+    def update(self, delta_time):
+        # delta_time in ms; a tick starts every WATER_TICK_INTERVAL and runs over as many
+        # frames as its cells need at WATER_TICK_BUDGET per frame
+        self.time_since_tick += delta_time
+        if not len(self.pending) and self.time_since_tick < WATER_TICK_INTERVAL:
+            return 0
+        return self.step()
+
+    def step(self, budget=WATER_TICK_BUDGET):
+        # processes up to budget cells, starting the next tick when the current one is done;
+        # returns the number of cells whose level changed
+        if not len(self.pending):
+            if not self.activated:
+                return 0
+            self.pending = np.unique(np.concatenate(self.activated))
+            self.activated.clear()
+            self.time_since_tick = 0.0
+            self.num_ticks += 1
+
+        cells, self.pending = self.pending[:budget], self.pending[budget:]
+        voxels = self.world.voxels
+        new_levels = get_new_levels(voxels, self.levels, self.slots, cells)
+        self.add_slots(get_missing_slots(self.slots, cells, new_levels))
+        changed = set_levels(self.levels, self.slots, cells, new_levels, self.dirty)
+        self.activate(changed)
+        self.num_updates += len(cells)
+        return len(changed)
+
+    def settle(self, max_steps=1 << 20):
+        # steps until no cell is active; returns the number of steps
+        steps = 0
+        while self.is_active and steps < max_steps:
+            self.step()
+            steps += 1
+        return steps
+
+    def pop_dirty_chunks(self):
+        indices = np.flatnonzero(self.dirty)
+        self.dirty[indices] = 0
+        return indices.tolist()
+
+    def get_nbytes(self):
+        return self.levels[:self.num_slots].nbytes + self.slots.nbytes
@@ -1,22 +1,203 @@
 from settings import *
 from world_objects.chunk import Chunk
 from voxel_handler import VoxelHandler
+from lighting import LightEngine
+from water import WaterEngine
+from entities import EntitySystem
+from navigation import Navigator
+from pregen import pregenerated_world
+from world_edit import fill_box, fill_sphere, replace_voxels, paste_voxels, get_edited_chunks
+from journal import EditJournal, load_changes, rle_xor
+from chunk_hash import WorldHashes
+from scheduler import ChunkScheduler, get_neighbour_columns
+from mesh_residency import MeshResidency
+from replica import WorldReplica
+from voxel_tree import dense_get_voxels, dense_is_box_solid
+from profiler import startup_profiler, frame_profiler
+import time
 
 
 class World:
-    def __init__(self, app):
+    def __init__(self, app, progressive=False, server=None):
         self.app = app
         self.chunks = [None for _ in range(WORLD_VOL)]
-        self.voxels = np.empty([WORLD_VOL, CHUNK_VOL], dtype='uint8')
-        self.build_chunks()
-        self.build_chunk_mesh()
+        # chunks not generated (or received) yet read as air
+        self.voxels = np.zeros([WORLD_VOL, CHUNK_VOL], dtype='uint8')
+        # sunlight and block light nibbles per voxel, see lighting.py
+        self.light = np.zeros([WORLD_VOL, CHUNK_VOL], dtype='uint8')
+        self.light_engine = LightEngine(self)
+        # water levels of the chunks that hold water, see water.py
+        self.water_engine = WaterEngine(self)
+        # mobs, items and falling blocks as arrays, see entities.py
+        self.entities = EntitySystem(self)
+        # paths over the walkable cells, built on the first query, see navigation.py
+        self.navigation = Navigator(self)
+        # chunks waiting for a remesh, each is rebuilt once per frame however many edits hit it
+        self.dirty_chunks = set()
+        self.journal = EditJournal(self)
+        # a replicated cache of a world server at (host, port) instead of a generated world,
+        # see replica.py
+        self.replica = None
+        self.build_chunks(load_stored=server is None)
+        # uploaded chunk meshes within the VRAM budget, see mesh_residency.py
+        self.mesh_residency = MeshResidency(self)
+        # generate, light, mesh and upload jobs, nearest the player first, see scheduler.py
+        self.scheduler = ChunkScheduler(self)
+        # content hashes per chunk and per column, kept current by refresh_voxels
+        self.hashes = None
+        # a progressive startup (and a remote world) draws frames while the scheduler loads the
+        # world: the player spawns once the columns around it are done, water and hashes follow
+        # the last job
+        self.is_spawned = False
+        self.is_loaded = False
         self.voxel_handler = VoxelHandler(self)
-        
-        # Colocar al jugador en la superficie después de generar el terreno
-        self.spawn_player_on_surface(self.app.player)
+        if server is not None:
+            # the chunks arrive over frames, hashed as they come
+            self.hashes = WorldHashes(self.voxels)
+            self.replica = WorldReplica(self, *server)
+        if progressive or server is not None:
+            self.scheduler.start()
+        else:
+            self.run_jobs()
+            self.finish_loading()
+            # Colocar al jugador en la superficie después de generar el terreno
+            self.spawn_player_on_surface(self.app.player)
+            self.is_spawned = True
 
     def update(self):
-        self.voxel_handler.update()
+        if self.is_spawned:
+            self.voxel_handler.update()
+        if self.replica is not None:
+            with frame_profiler.section('network'):
+                self.replica.update()
+        with frame_profiler.section('jobs'):
+            self.update_loading()
+        with frame_profiler.section('flow'):
+            self.water_engine.update(self.app.delta_time)
+        with frame_profiler.section('entities'):
+            self.entities.update(self.app.delta_time)
+        with frame_profiler.section('remesh'):
+            self.rebuild_dirty_chunks()
+
+    def update_loading(self):
+        if self.is_loaded:
+            self.scheduler.update()
+            return
+        self.scheduler.update(SCHEDULER_LOADING_BUDGET)
+        if not self.is_spawned:
+            column = self.get_spawn_column(self.app.player)
+            if self.scheduler.is_area_ready(get_neighbour_columns(column, SCHEDULER_SPAWN_RADIUS)):
+                self.spawn_player_on_surface(self.app.player)
+                self.is_spawned = True
+        if self.is_spawned and not self.scheduler.jobs:
+            self.finish_loading()
+
+    def finish_loading(self):
+        if self.hashes is None:
+            self.hashes = WorldHashes(self.voxels)
+        # a remote world fills the sea of each column as it arrives
+        if self.replica is None:
+            self.build_water()
+        self.is_loaded = True
+
+    def close(self):
+        if self.replica is not None:
+            self.replica.close()
+
+    def set_voxel(self, world_pos, voxel_id):
+        x, y, z = (int(value) for value in world_pos)
+        return self.fill_box((x, y, z), (x, y, z), voxel_id)
+
+    def fill_box(self, min_pos, max_pos, voxel_id):
+        # corners are inclusive world voxel positions, the box is clipped to the world
+        edits = fill_box(self.voxels, *(int(v) for v in min_pos), *(int(v) for v in max_pos), voxel_id)
+        return self.apply_edits(*edits)
+
+    def fill_sphere(self, center, radius, voxel_id):
+        cx, cy, cz = (int(value) for value in center)
+        return self.apply_edits(*fill_sphere(self.voxels, cx, cy, cz, float(radius), voxel_id))
+
+    def carve_sphere(self, center, radius):
+        return self.fill_sphere(center, radius, 0)
+
+    def replace_voxels(self, min_pos, max_pos, old_id, new_id):
+        edits = replace_voxels(self.voxels, *(int(v) for v in min_pos), *(int(v) for v in max_pos),
+                               old_id, new_id)
+        return self.apply_edits(*edits)
+
+    def paste_voxels(self, pos, data, skip_air=True):
+        # data is a uint8 array indexed [x, y, z] with its min corner at pos
+        ox, oy, oz = (int(value) for value in pos)
+        data = np.ascontiguousarray(data, dtype='uint8')
+        return self.apply_edits(*paste_voxels(self.voxels, ox, oy, oz, data, skip_air))
+
+    def apply_edits(self, changed, old_ids):
+        # journals an edit as one undo step; returns the number of changed voxels
+        if not len(changed):
+            return 0
+        if self.replica is not None:
+            # applied when the server echoes them back
+            return self.replica.send_edits(changed, old_ids)
+        self.journal.record(changed, old_ids)
+        return self.refresh_voxels(changed)
+
+    def merge_edits(self, changed, old_ids):
+        # edits of the simulation (landed blocks) join the last undo step instead of making one;
+        # a remote world keeps them local, entities aren't replicated
+        if not len(changed):
+            return 0
+        if self.replica is None:
+            self.journal.record(changed, old_ids, merge=True)
+        return self.refresh_voxels(changed)
+
+    def undo(self):
+        # a remote world's edits are the server's to keep
+        if self.replica is not None:
+            return 0
+        return self.refresh_voxels(self.journal.undo())
+
+    def redo(self):
+        if self.replica is not None:
+            return 0
+        return self.refresh_voxels(self.journal.redo())
+
+    def save_changes(self, path):
+        # changes since generation as per-chunk XOR deltas, see journal.py
+        return self.journal.save_changes(path)
+
+    def load_changes(self, path):
+        # applies saved changes on top of the freshly generated world, outside the undo history;
+        # a remote world's voxels are the server's
+        if self.replica is not None:
+            return 0
+        changes = load_changes(path)
+        changed = [rle_xor(runs, self.voxels[chunk_index], chunk_index) for chunk_index, runs in changes.items()]
+        self.journal.merge_deltas(changes)
+        return self.refresh_voxels(np.concatenate(changed) if changed else np.empty(0, dtype='int64'))
+
+    def refresh_voxels(self, changed):
+        # updates what depends on the changed voxels; returns the number of changed voxels
+        if not len(changed):
+            return 0
+        edited_chunks = get_edited_chunks(changed)
+        for chunk_index in edited_chunks:
+            self.chunks[chunk_index].update_summary()
+        if self.hashes is not None:
+            self.hashes.update(edited_chunks)
+        self.dirty_chunks.update(self.light_engine.update_voxels(changed))
+        self.water_engine.update_voxels(changed)
+        self.navigation.invalidate(edited_chunks)
+        return len(changed)
+
+    def rebuild_dirty_chunks(self):
+        # headless apps have no meshes to rebuild
+        water_chunks = self.water_engine.pop_dirty_chunks()
+        if self.app.ctx is not None:
+            for chunk_index in self.scheduler.invalidate(self.dirty_chunks):
+                self.chunks[chunk_index].mesh.rebuild()
+            for chunk_index in water_chunks:
+                self.chunks[chunk_index].build_water_mesh()
+        self.dirty_chunks.clear()
 
     def get_voxel_id(self, world_pos):
         """
@@ -64,6 +245,27 @@ class World:
         """
         voxel_id = self.get_voxel_id(world_pos)
         return voxel_id != 0  # 0 significa vacío
+
+    def get_voxel_ids(self, positions):
+        """
+        IDs de los vóxeles en un array (N, 3) de posiciones enteras del mundo, con un solo
+        gather compilado sobre World.voxels. Fuera de los límites el ID es 0, como en get_voxel_id.
+        """
+        positions = np.ascontiguousarray(positions, dtype='int64').reshape(-1, 3)
+        return dense_get_voxels(self.voxels, WORLD_Y, positions)
+
+    def are_voxels_solid(self, positions):
+        """
+        Máscara booleana de solidez para un array (N, 3) de posiciones enteras del mundo.
+        """
+        return self.get_voxel_ids(positions) != 0
+
+    def is_box_solid(self, min_pos, max_pos):
+        """
+        Verifica si algún vóxel de la caja entre min_pos y max_pos (inclusivos) es sólido.
+        """
+        (x0, y0, z0), (x1, y1, z1) = min_pos, max_pos
+        return dense_is_box_solid(self.voxels, WORLD_Y, x0, y0, z0, x1 + 1, y1 + 1, z1 + 1)
     
     def check_collision(self, position, size=None, height=None):
         """
@@ -88,12 +290,7 @@ class World:
         max_z = int(position.z + half_size)
         
         # Verificar todos los vóxeles que intersectan con la caja de colisión
-        for x in range(min_x, max_x + 1):
-            for y in range(min_y, max_y + 1):
-                for z in range(min_z, max_z + 1):
-                    if self.is_voxel_solid(glm.vec3(x, y, z)):
-                        return True
-        return False
+        return self.is_box_solid((min_x, min_y, min_z), (max_x, max_y, max_z))
 
     def is_on_ground(self, position, size=None):
         """
@@ -112,13 +309,14 @@ class World:
         min_z = int(position.z - half_size)
         max_z = int(position.z + half_size)
         
-        for x in range(min_x, max_x + 1):
-            for z in range(min_z, max_z + 1):
-                if self.is_voxel_solid(glm.vec3(x, check_y, z)):
-                    return True
-        return False
+        return self.is_box_solid((min_x, check_y, min_z), (max_x, check_y, max_z))
 
-    def build_chunks(self):
+    @startup_profiler.phase('world.build_chunks')
+    def build_chunks(self, load_stored=True):
+        # chunks of a pregenerated world (see pregen.py) are loaded, the scheduler generates the rest;
+        # a remote world takes them all from the server
+        with startup_profiler.timed('world.load_chunks'):
+            stored = pregenerated_world.load(self.voxels) if load_stored else {}
         for x in range(WORLD_W):
             for y in range(WORLD_H):
                 for z in range(WORLD_D):
@@ -127,38 +325,65 @@ class World:
                     chunk_index = x + WORLD_W * z + WORLD_AREA * y
                     self.chunks[chunk_index] = chunk
 
-                    # put the chunk voxels in a separate array
-                    self.voxels[chunk_index] = chunk.build_voxels()
-
                     # get pointer to voxels
                     chunk.voxels = self.voxels[chunk_index]
+                    if chunk_index in stored:
+                        chunk.update_summary()
+                        chunk.stored_mesh = stored[chunk_index]
+                        chunk.is_generated = True
 
-    def build_chunk_mesh(self):
-        for chunk in self.chunks:
-            chunk.build_mesh()
+    def generate_chunk(self, chunk):
+        start = time.perf_counter()
+        chunk.voxels[:] = chunk.build_voxels()
+        chunk.is_generated = True
+        startup_profiler.add_sample('chunk.generate', time.perf_counter() - start)
+
+    @startup_profiler.phase('world.run_jobs')
+    def run_jobs(self):
+        # the whole world, without a time budget
+        self.scheduler.run()
+
+    @startup_profiler.phase('world.build_water')
+    def build_water(self):
+        self.water_engine.build_water()
+        # headless apps (tools, benchmarks) have no GL context to upload meshes to
+        if self.app.ctx is not None:
+            for chunk_index in self.water_engine.pop_dirty_chunks():
+                self.chunks[chunk_index].build_water_mesh()
 
     def render(self):
         for chunk in self.chunks:
             chunk.render()
+        self.mesh_residency.end_frame()
+
+    def render_water(self):
+        for chunk in self.chunks:
+            chunk.render_water()
 
     def find_surface_height(self, x, z):
         """
         Encuentra la altura de la superficie en las coordenadas x, z dadas.
         Retorna la altura Y del primer bloque sólido desde arriba.
         """
-        max_height = WORLD_H * CHUNK_SIZE - 1
-        
-        # Buscar desde arriba hacia abajo
-        for y in range(max_height, -1, -1):
-            if self.is_voxel_solid(glm.vec3(x, y, z)):
-                print(f"DEBUG: Found surface at y={y+1} for position ({x}, {z})")
-                return y + 1  # Retornar la posición encima del bloque sólido
+        # Toda la columna en una sola consulta, el sólido más alto es la superficie
+        column = np.zeros((WORLD_Y, 3), dtype='int64')
+        column[:, 0], column[:, 1], column[:, 2] = int(x), np.arange(WORLD_Y), int(z)
+        solid = np.flatnonzero(self.are_voxels_solid(column))
+        if len(solid):
+            y = int(solid[-1])
+            print(f"DEBUG: Found surface at y={y+1} for position ({x}, {z})")
+            return y + 1  # Retornar la posición encima del bloque sólido
         
         # Si no se encuentra superficie, retornar nivel del mar o una altura por defecto
         default_height = CHUNK_SIZE // 2
         print(f"DEBUG: No surface found, using default height {default_height}")
         return default_height
 
+    def get_spawn_column(self, player):
+        x = min(max(int(player.feet_position.x) // CHUNK_SIZE, 0), WORLD_W - 1)
+        z = min(max(int(player.feet_position.z) // CHUNK_SIZE, 0), WORLD_D - 1)
+        return x + WORLD_W * z
+
     def spawn_player_on_surface(self, player):
         """
         Coloca al jugador en la superficie del terreno en su posición actual.
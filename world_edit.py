@@ -0,0 +1,136 @@
+from settings import *
+from lighting import get_location, encode, decode
+
+# Bulk edit kernels over World.voxels. Each one writes the region in place and returns
+# the encoded positions (see lighting.encode) of the voxels whose id actually changed and
+# their previous ids, which World.apply_edits journals and turns into summary, light and
+# remesh updates.
+
+
+@njit(cache=True)
+def clip_box(x0, y0, z0, x1, y1, z1):
+    # inclusive world voxel box -> half-open box clipped to the world
+    return (max(x0, 0), max(y0, 0), max(z0, 0),
+            min(x1 + 1, WORLD_X), min(y1 + 1, WORLD_Y), min(z1 + 1, WORLD_Z))
+
+
+@njit(cache=True)
+def get_box_volume(x0, y0, z0, x1, y1, z1):
+    return max(x1 - x0, 0) * max(y1 - y0, 0) * max(z1 - z0, 0)
+
+
+@njit(cache=True)
+def fill_box(voxels, x0, y0, z0, x1, y1, z1, voxel_id):
+    x0, y0, z0, x1, y1, z1 = clip_box(x0, y0, z0, x1, y1, z1)
+    changed = np.empty(get_box_volume(x0, y0, z0, x1, y1, z1), dtype='int64')
+    old_ids = np.empty(len(changed), dtype='uint8')
+    count = 0
+    for y in range(y0, y1):
+        for z in range(z0, z1):
+            for x in range(x0, x1):
+                chunk_index, voxel_index = get_location(x, y, z)
+                if voxels[chunk_index, voxel_index] != voxel_id:
+                    old_ids[count] = voxels[chunk_index, voxel_index]
+                    voxels[chunk_index, voxel_index] = voxel_id
+                    changed[count] = encode(x, y, z)
+                    count += 1
+    return changed[:count], old_ids[:count]
+
+
+@njit(cache=True)
+def fill_sphere(voxels, cx, cy, cz, radius, voxel_id):
+    r = int(radius)
+    x0, y0, z0, x1, y1, z1 = clip_box(cx - r, cy - r, cz - r, cx + r, cy + r, cz + r)
+    changed = np.empty(get_box_volume(x0, y0, z0, x1, y1, z1), dtype='int64')
+    old_ids = np.empty(len(changed), dtype='uint8')
+    count = 0
+    radius_sq = radius * radius
+    for y in range(y0, y1):
+        for z in range(z0, z1):
+            for x in range(x0, x1):
+                dx, dy, dz = x - cx, y - cy, z - cz
+                if dx * dx + dy * dy + dz * dz > radius_sq:
+                    continue
+                chunk_index, voxel_index = get_location(x, y, z)
+                if voxels[chunk_index, voxel_index] != voxel_id:
+                    old_ids[count] = voxels[chunk_index, voxel_index]
+                    voxels[chunk_index, voxel_index] = voxel_id
+                    changed[count] = encode(x, y, z)
+                    count += 1
+    return changed[:count], old_ids[:count]
+
+
+@njit(cache=True)
+def replace_voxels(voxels, x0, y0, z0, x1, y1, z1, old_id, new_id):
+    x0, y0, z0, x1, y1, z1 = clip_box(x0, y0, z0, x1, y1, z1)
+    changed = np.empty(get_box_volume(x0, y0, z0, x1, y1, z1), dtype='int64')
+    old_ids = np.empty(len(changed), dtype='uint8')
+    count = 0
+    if old_id == new_id:
+        return changed[:0], old_ids[:0]
+    for y in range(y0, y1):
+        for z in range(z0, z1):
+            for x in range(x0, x1):
+                chunk_index, voxel_index = get_location(x, y, z)
+                if voxels[chunk_index, voxel_index] == old_id:
+                    old_ids[count] = voxels[chunk_index, voxel_index]
+                    voxels[chunk_index, voxel_index] = new_id
+                    changed[count] = encode(x, y, z)
+                    count += 1
+    return changed[:count], old_ids[:count]
+
+
+@njit(cache=True)
+def paste_voxels(voxels, ox, oy, oz, data, skip_air):
+    # data is indexed [x, y, z]; with skip_air its zeros leave the world untouched
+    sx, sy, sz = data.shape
+    x0, y0, z0, x1, y1, z1 = clip_box(ox, oy, oz, ox + sx - 1, oy + sy - 1, oz + sz - 1)
+    changed = np.empty(get_box_volume(x0, y0, z0, x1, y1, z1), dtype='int64')
+    old_ids = np.empty(len(changed), dtype='uint8')
+    count = 0
+    for y in range(y0, y1):
+        for z in range(z0, z1):
+            for x in range(x0, x1):
+                voxel_id = data[x - ox, y - oy, z - oz]
+                if skip_air and not voxel_id:
+                    continue
+                chunk_index, voxel_index = get_location(x, y, z)
+                if voxels[chunk_index, voxel_index] != voxel_id:
+                    old_ids[count] = voxels[chunk_index, voxel_index]
+                    voxels[chunk_index, voxel_index] = voxel_id
+                    changed[count] = encode(x, y, z)
+                    count += 1
+    return changed[:count], old_ids[:count]
+
+
+@njit(cache=True)
+def place_voxels(voxels, positions, voxel_ids):
+    # sets the air voxels at positions ([n, 3] world voxel coords) to voxel_ids, the first one
+    # wins where several share a voxel; also returns whether each position was placed
+    changed = np.empty(len(positions), dtype='int64')
+    old_ids = np.empty(len(positions), dtype='uint8')
+    is_placed = np.zeros(len(positions), dtype='bool')
+    count = 0
+    for i in range(len(positions)):
+        x, y, z = positions[i, 0], positions[i, 1], positions[i, 2]
+        if not (0 <= x < WORLD_X and 0 <= y < WORLD_Y and 0 <= z < WORLD_Z):
+            continue
+        chunk_index, voxel_index = get_location(x, y, z)
+        if voxels[chunk_index, voxel_index]:
+            continue
+        old_ids[count] = 0
+        voxels[chunk_index, voxel_index] = voxel_ids[i]
+        changed[count] = encode(x, y, z)
+        is_placed[i] = True
+        count += 1
+    return changed[:count], old_ids[:count], is_placed
+
+
+@njit(cache=True)
+def get_edited_chunks(changed):
+    # chunk indices holding the changed voxels, their summaries must be refreshed
+    is_edited = np.zeros(WORLD_VOL, dtype='uint8')
+    for pos in changed:
+        x, y, z = decode(pos)
+        is_edited[x // CHUNK_SIZE + WORLD_W * (z // CHUNK_SIZE) + WORLD_AREA * (y // CHUNK_SIZE)] = 1
+    return np.flatnonzero(is_edited)
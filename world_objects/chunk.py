@@ -1,5 +1,6 @@
 from settings import *
 from meshes.chunk_mesh import ChunkMesh
+from meshes.water_mesh import WaterMesh
 import random
 from terrain_gen import *
 
@@ -9,10 +10,22 @@ class Chunk:
         self.app = world.app
         self.world = world
         self.position = position
+        x, y, z = position
+        self.index = x + WORLD_W * z + WORLD_AREA * y
         self.m_model = self.get_model_matrix()
         self.voxels: np.array = None
         self.mesh: ChunkMesh = None
+        # only chunks that ever held water get one
+        self.water_mesh: WaterMesh = None
+        # vertex data of a pregenerated world, uploaded instead of building the first mesh
+        self.stored_mesh = None
+
+        # set once the voxels are generated or loaded, see World.generate_chunk
+        self.is_generated = False
+        # summary metadata, filled in at generation time
         self.is_empty = True
+        self.is_solid = False
+        self.solid_faces = 0
 
         self.center = (glm.vec3(self.position) + 0.5) * CHUNK_SIZE
         self.is_on_frustum = self.app.player.frustum.is_on_frustum
@@ -22,28 +35,121 @@ class Chunk:
         return m_model
 
     def set_uniform(self):
-        self.mesh.program['m_model'].write(self.m_model)
+        self.app.shader_program.uniforms.set(self.mesh.program, 'm_model', self.m_model)
+
+    def build_mesh(self, vertex_data=None):
+        # vertex_data from build_vertex_data, e.g. a mesh job's, or built now
+        if self.mesh is None:
+            self.mesh = ChunkMesh(self, vertex_data)
+        else:
+            self.mesh.rebuild(vertex_data)
 
-    def build_mesh(self):
-        self.mesh = ChunkMesh(self)
+    def release_mesh(self):
+        # the chunk left a remote world's interest, see replica.py
+        if self.mesh is not None:
+            self.world.mesh_residency.remove(self.mesh)
+            self.mesh.release()
+            self.mesh = None
 
     def render(self):
-        if not self.is_empty and self.is_on_frustum(self):
+        # chunks the scheduler hasn't meshed yet have no mesh
+        if self.mesh is None or not self.is_on_frustum(self):
+            return
+        if self.mesh.is_evicted:
+            self.world.mesh_residency.restore(self.mesh)
+        if self.mesh.vao is not None:
+            self.world.mesh_residency.touch(self.mesh)
             self.set_uniform()
             self.mesh.render()
 
+    def build_water_mesh(self):
+        if self.water_mesh is None:
+            if self.world.water_engine.slots[self.index] == -1:
+                return
+            self.water_mesh = WaterMesh(self)
+        else:
+            self.water_mesh.rebuild()
+
+    def render_water(self):
+        if self.water_mesh is not None and self.water_mesh.vao is not None and self.is_on_frustum(self):
+            self.app.shader_program.uniforms.set(self.water_mesh.program, 'm_model', self.m_model)
+            self.water_mesh.render()
+
     def build_voxels(self):
         voxels = np.zeros(CHUNK_VOL, dtype='uint8')
 
         cx, cy, cz = glm.ivec3(self.position) * CHUNK_SIZE
+        seed_terrain(get_chunk_seed(self.position))
         self.generate_terrain(voxels, cx, cy, cz)
 
-        if np.any(voxels):
-            self.is_empty = False
+        self.update_summary(voxels)
         return voxels
 
+    def update_summary(self, voxels=None):
+        voxels = self.voxels if voxels is None else voxels
+        self.is_empty, self.is_solid, self.solid_faces = self.get_summary(voxels)
+
+    def is_sealed(self):
+        # a solid chunk produces no faces if every neighbour covers the shared face
+        if not self.is_solid:
+            return False
+
+        x, y, z = self.position
+        for face_id, (dx, dy, dz) in enumerate(FACE_NORMALS):
+            nx, ny, nz = x + dx, y + dy, z + dz
+            # the mesher treats everything outside the world as solid
+            if not (0 <= nx < WORLD_W and 0 <= ny < WORLD_H and 0 <= nz < WORLD_D):
+                continue
+
+            neighbour = self.world.chunks[nx + WORLD_W * nz + WORLD_AREA * ny]
+            if neighbour is None or not neighbour.solid_faces & (1 << (face_id ^ 1)):
+                return False
+        return True
+
+    @staticmethod
+    @njit(cache=True)
+    def get_summary(voxels):
+        # -> is_empty, is_solid, solid_faces (bit per face_id: top, bottom, right, left, back, front)
+        num_solid = 0
+        for i in range(CHUNK_VOL):
+            if voxels[i]:
+                num_solid += 1
+
+        if num_solid == 0:
+            return True, False, 0
+        if num_solid == CHUNK_VOL:
+            return False, True, 0b111111
+
+        solid_faces = 0
+        for face_id in range(6):
+            is_face_solid = True
+            for i in range(CHUNK_SIZE):
+                for j in range(CHUNK_SIZE):
+                    if face_id == 0:
+                        x, y, z = i, CHUNK_SIZE - 1, j
+                    elif face_id == 1:
+                        x, y, z = i, 0, j
+                    elif face_id == 2:
+                        x, y, z = CHUNK_SIZE - 1, i, j
+                    elif face_id == 3:
+                        x, y, z = 0, i, j
+                    elif face_id == 4:
+                        x, y, z = i, j, 0
+                    else:
+                        x, y, z = i, j, CHUNK_SIZE - 1
+
+                    if not voxels[x + CHUNK_SIZE * z + CHUNK_AREA * y]:
+                        is_face_solid = False
+                        break
+                if not is_face_solid:
+                    break
+
+            if is_face_solid:
+                solid_faces |= 1 << face_id
+        return False, False, solid_faces
+
     @staticmethod
-    @njit
+    @njit(cache=True, nogil=True)
     def generate_terrain(voxels, cx, cy, cz):
         for x in range(CHUNK_SIZE):
             wx = x + cx
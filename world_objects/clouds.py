@@ -1,14 +1,55 @@
 from settings import *
 from meshes.cloud_mesh import CloudMesh
+from profiler import startup_profiler
 
 
 class Clouds:
     def __init__(self, app):
         self.app = app
-        self.mesh = CloudMesh(app)
+        self.program = app.shader_program.clouds
+
+        # scratch buffers shared by every tile build: bitmap, visited bitmap and vertex data
+        self.cloud_data = np.zeros(CLOUD_TILE_AREA, dtype='uint8')
+        self.visited = np.zeros(CLOUD_TILE_AREA, dtype='uint8')
+        self.mesh_data = np.empty(CLOUD_TILE_AREA * 6 * 2, dtype='uint8')
+
+        # (tile_x, tile_z) -> CloudMesh, tiles without clouds are not kept
+        self.tiles = {}
+        self.visible_tiles = []
+        self.offset = 0.0
+        self.build_tiles()
+
+    @startup_profiler.phase('clouds.mesh')
+    def build_tiles(self):
+        for tile_x in range(CLOUD_TILES_W):
+            for tile_z in range(CLOUD_TILES_W):
+                self.add_tile((tile_x, tile_z))
+
+    def add_tile(self, tile_pos):
+        tile = CloudMesh(self, tile_pos)
+        if tile.vao is not None:
+            self.tiles[tile_pos] = tile
 
     def update(self):
-        self.mesh.program['u_time'] = self.app.time
+        self.offset = 300 * math.sin(0.01 * self.app.time)
+        self.app.shader_program.uniforms.set(self.program, 'cloud_offset', self.offset)
+
+        is_on_frustum = self.app.player.frustum.is_sphere_on_frustum
+        self.visible_tiles.clear()
+        for tile in self.tiles.values():
+            set_tile_center(tile.center, tile.origin, self.offset)
+            if is_on_frustum(tile.center, CLOUD_TILE_RADIUS):
+                self.visible_tiles.append(tile)
 
     def render(self):
-        self.mesh.render()
+        uniforms = self.app.shader_program.uniforms
+        for tile in self.visible_tiles:
+            uniforms.set(self.program, 'tile_origin', tuple(tile.origin))
+            tile.render()
+
+
+def set_tile_center(center, origin, offset):
+    # world space center of a tile, same transform as clouds.vert
+    center.x = (origin.x + CLOUD_TILE_SIZE / 2 - CENTER_XZ) * CLOUD_SCALE + CENTER_XZ + offset
+    center.y = CLOUD_HEIGHT
+    center.z = (origin.y + CLOUD_TILE_SIZE / 2 - CENTER_XZ) * CLOUD_SCALE + CENTER_XZ + offset
@@ -13,13 +13,18 @@ class VoxelMarker:
     def update(self):
         if self.handler.voxel_id:
             if self.handler.interaction_mode:
-                self.position = self.handler.voxel_world_pos + self.handler.voxel_normal
+                position = glm.vec3(self.handler.voxel_world_pos + self.handler.voxel_normal)
             else:
-                self.position = self.handler.voxel_world_pos
+                position = glm.vec3(self.handler.voxel_world_pos)
+            # the model matrix only changes when the marker moves to another voxel
+            if position != self.position:
+                self.position = position
+                self.m_model = self.get_model_matrix()
 
     def set_uniform(self):
-        self.mesh.program['mode_id'] = self.handler.interaction_mode
-        self.mesh.program['m_model'].write(self.get_model_matrix())
+        uniforms = self.app.shader_program.uniforms
+        uniforms.set(self.mesh.program, 'mode_id', int(self.handler.interaction_mode))
+        uniforms.set(self.mesh.program, 'm_model', self.m_model)
 
     def get_model_matrix(self):
         m_model = glm.translate(glm.mat4(), glm.vec3(self.position))